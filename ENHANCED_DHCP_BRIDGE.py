@@ -17,6 +17,17 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import logging
 
+from pxe.dhcp import (
+    DHCPBatcher, DHCPOptions, ReplyTemplate, ReplyTemplates, StormGuard, reply_buffer, parse_options,
+    BROADCAST_FLAG, DHCPOFFER
+)
+from pxe.dhcp.leases import LeasePool
+from pxe.dhcp.journal import LeaseJournal
+from pxe.dhcp.bootfile import BootFileSelector, is_http_boot
+from pxe.dhcp.proxy import proxy_vendor_options
+from config.settings import config_directory
+from pxe.buffers import BufferPool, DHCP_BUFFER_SIZE, DHCP_BUFFERS
+
 @dataclass
 class DHCPClient:
     """Represents a DHCP client"""
@@ -49,6 +60,11 @@ class EnhancedDHCPBridge:
         self.dhcp_sockets: Dict[str, socket.socket] = {}
         self.clients: Dict[str, DHCPClient] = {}
         self.interfaces: Dict[str, NetworkInterface] = {}
+        # Requests from every interface are received into shared reusable buffers
+        self.dhcp_buffers = BufferPool(DHCP_BUFFER_SIZE, DHCP_BUFFERS)
+        self.dhcp_batchers: Dict[str, DHCPBatcher] = {}
+        # Per-interface rate limits and recent replies, screened before parsing
+        self.dhcp_guards: Dict[str, StormGuard] = {}
         
         # Configuration
         self.server_ip = self._get_primary_ip()
@@ -58,6 +74,13 @@ class EnhancedDHCPBridge:
         self.dhcp_range_end = "192.168.1.200"
         self.lease_time = 86400
         self.boot_file = "pxelinux.0"
+        self.lease_pool = LeasePool(self.dhcp_range_start, self.dhcp_range_end, self.lease_time,
+                                    exclude=(self.server_ip,))
+        self.lease_journal: Optional[LeaseJournal] = None
+        # Offers prebuilt per interface; replies patch in the client
+        self.offer_templates = ReplyTemplates(self._build_offer_template)
+        # Loader per client architecture (option 93), cached per MAC
+        self.boot_files = BootFileSelector(default=self.boot_file, server_ip=self.server_ip)
         
         # UDP Tunnel ports for cross-interface communication
         self.tunnel_base_port = 9000
@@ -233,6 +256,12 @@ LABEL local
         for iface in self.interfaces.values():
             self.logger.info(f"📡 Detected {iface.name}: {iface.type} - {iface.ip_address}")
         
+        # Gateway lookups and option packing happen here, not per DISCOVER
+        self._prepare_offer_templates()
+        
+        # Leases from the last run must be back before the first OFFER
+        self._open_lease_journal()
+        
         # Create DHCP sockets for each interface
         self._create_dhcp_sockets()
         
@@ -264,8 +293,31 @@ LABEL local
                 pass
         self.dhcp_sockets.clear()
         
+        for batcher in self.dhcp_batchers.values():
+            batcher.stop()
+        self.dhcp_batchers.clear()
+        self.dhcp_guards.clear()
+        
+        if self.lease_journal:
+            self.lease_journal.close()
+            self.lease_journal = None
+        
         self.logger.info("✅ DHCP Bridge stopped")
     
+    def _open_lease_journal(self):
+        """Restore saved leases and journal every change from now on"""
+        if self.lease_journal:
+            return
+        # Separate from the PXE server's journal, which has its own pool
+        journal = LeaseJournal(os.path.join(config_directory(), 'leases', 'dhcp-bridge'))
+        try:
+            restored = self.lease_pool.attach(journal)
+        except OSError as e:
+            self.logger.warning(f"⚠️ Lease journal unavailable, leases will not survive a restart: {e}")
+            return
+        self.lease_journal = journal
+        self.logger.info(f"📒 Restored {restored} DHCP leases in {journal.get_stats()['replay_ms']} ms")
+    
     def _create_dhcp_sockets(self):
         """Create DHCP sockets for each active interface"""
         for iface_name, interface in self.interfaces.items():
@@ -412,16 +464,19 @@ LABEL local
     
     def _dhcp_server_thread(self, interface_name: str, socket_obj: socket.socket):
         """DHCP server thread for specific interface"""
+        # Each wakeup drains every queued request to a fixed worker pool,
+        # after floods and retransmits are screened out
+        guard = self.dhcp_guards.setdefault(interface_name, StormGuard())
+        batcher = DHCPBatcher(
+            socket_obj,
+            lambda data, addr: self._handle_dhcp_request(data, addr, interface_name),
+            self.dhcp_buffers,
+            guard=guard
+        )
+        self.dhcp_batchers[interface_name] = batcher
         while self.running:
             try:
-                data, addr = socket_obj.recvfrom(1024)
-                threading.Thread(
-                    target=self._handle_dhcp_request,
-                    args=(data, addr, interface_name),
-                    daemon=True
-                ).start()
-            except socket.timeout:
-                continue
+                batcher.poll()
             except Exception as e:
                 if self.running:
                     self.logger.error(f"DHCP server error for {interface_name}: {e}")
@@ -442,14 +497,16 @@ LABEL local
                 if hlen > 16:
                     hlen = 16
                 mac = ':'.join([f'{b:02x}' for b in data[28:28+hlen]])
+                options = parse_options(data)
+                kind = "PXE DHCP" if options.is_pxe else "DHCP"
                 
-                self.logger.info(f"→ DHCP Request from {addr[0]} (MAC: {mac}) on {interface_name}")
+                self.logger.info(f"→ {kind} message {options.message_type} from {addr[0]} (MAC: {mac}) on {interface_name}")
                 
                 # Determine if this is an ethernet-connected client
                 client_interface_type = self.interfaces.get(interface_name, NetworkInterface("", "", "", "", "", "", False)).type
                 
                 # Send interface-specific DHCP offer
-                self._send_enhanced_dhcp_offer(data, addr, mac, interface_name, client_interface_type)
+                self._send_enhanced_dhcp_offer(data, addr, mac, interface_name, client_interface_type, options)
                 
                 # Forward to other interfaces via tunnel if needed
                 if len(self.interfaces) > 1:
@@ -473,137 +530,111 @@ LABEL local
             self.logger.debug(f"DHCP request forwarding failed: {e}")
     
     def _send_enhanced_dhcp_offer(self, request_data: bytes, addr: Tuple[str, int], 
-                                mac: str, interface_name: str, client_type: str):
+                                mac: str, interface_name: str, client_type: str, options: DHCPOptions):
         """Send enhanced DHCP offer with interface-specific configuration"""
         try:
-            # Build DHCP offer packet
-            response = bytearray(1024)  # Larger packet for enhanced options
-            
-            # DHCP header
-            response[0] = 2  # BOOTREPLY
-            response[1] = 1  # Ethernet
-            response[2] = 6  # MAC length
-            response[3] = 0  # Hops
-            
-            # Transaction ID (copy from request)
-            response[4:8] = request_data[4:8]
-            
-            # Seconds, flags
-            response[8:12] = b'\x00' * 4
-            
-            # Client IP (0.0.0.0)
-            response[12:16] = b'\x00' * 4
-            
-            # Your IP (offered IP)
-            offered_ip = self._get_available_ip(mac, interface_name)
-            response[16:20] = socket.inet_aton(offered_ip)
-            
-            # Server IP (siaddr field) - CRITICAL for PXE
-            response[20:24] = socket.inet_aton(self.server_ip)
-            
-            # Gateway IP
-            response[24:28] = socket.inet_aton(self._get_gateway())
-            
-            # Client MAC address
+            # Build DHCP offer packet in this thread's reusable reply buffer
+            offered_ip = self._get_available_ip(mac, interface_name, options.address(50))
+            if offered_ip is None:
+                self.logger.warning(f"✗ No free address for {mac} - DHCP pool exhausted")
+                return
             hlen = min(len(mac.split(':')), 6)
             mac_bytes = bytes.fromhex(mac.replace(':', ''))[:hlen]
-            response[28:28+hlen] = mac_bytes
-            
-            # CRITICAL: Boot filename at fixed position
-            boot_file = self.boot_file.encode('ascii')
-            response[108:108+len(boot_file)] = boot_file
-            response[108+len(boot_file)] = 0  # Null terminator
-            
-            # Magic cookie
-            response[236:240] = b'\x63\x82\x53\x63'
-            
-            # DHCP options
-            idx = 240
-            
-            # Option 53: DHCP Message Type (Offer = 2)
-            response[idx:idx+3] = b'\x35\x01\x02'
-            idx += 3
-            
-            # Option 54: Server Identifier
-            response[idx:idx+6] = b'\x36\x04' + socket.inet_aton(self.server_ip)
-            idx += 6
-            
+
+            # Header, PXE and interface-specific options come from the template
+            boot_file = self.boot_files.select(mac, options)
+            template = self.offer_templates.get(interface_name, boot_file, DHCPOFFER)
+            reply = reply_buffer().begin_template(
+                template, bytes(request_data[4:8]), mac_bytes,
+                yiaddr=socket.inet_aton(offered_ip),
+                flags=(request_data[10] << 8) & BROADCAST_FLAG, hlen=hlen)
             # Option 51: Lease Time
-            response[idx:idx+6] = b'\x33\x04' + struct.pack('>I', self.lease_time)
-            idx += 6
-            
-            # Option 1: Subnet Mask
-            response[idx:idx+6] = b'\x01\x04' + socket.inet_aton(self.subnet_mask)
-            idx += 6
-            
-            # Option 3: Router/Gateway
-            response[idx:idx+6] = b'\x03\x04' + socket.inet_aton(self._get_gateway())
-            idx += 6
-            
-            # Option 6: DNS Server
-            response[idx:idx+6] = b'\x06\x04' + socket.inet_aton(self.server_ip)
-            idx += 6
-            
-            # CRITICAL OPTION 66: TFTP Server Name
-            server_ip_bytes = self.server_ip.encode('ascii')
-            response[idx] = 0x42  # Option 66
-            response[idx+1] = len(server_ip_bytes)
-            response[idx+2:idx+2+len(server_ip_bytes)] = server_ip_bytes
-            idx += 2 + len(server_ip_bytes)
-            
-            # CRITICAL OPTION 67: Bootfile Name
-            response[idx] = 0x43  # Option 67
-            response[idx+1] = len(boot_file)
-            response[idx+2:idx+2+len(boot_file)] = boot_file
-            idx += 2 + len(boot_file)
-            
-            # Option 60: Vendor Class Identifier
-            vendor_class = b'PXEClient'
-            response[idx] = 0x3c
-            response[idx+1] = len(vendor_class)
-            response[idx+2:idx+2+len(vendor_class)] = vendor_class
-            idx += 2 + len(vendor_class)
-            
-            # Interface-specific options
-            if client_type == 'ethernet':
-                # Ethernet-specific options
-                response[idx] = 0x2b  # Option 43 - Vendor Specific
-                response[idx+1] = 4  # Length
-                response[idx+2:idx+4] = b'\x00\x01\x04'  # Sub-option for PXE
-                idx += 4
-                
-                # Add direct ethernet forwarding flag
-                response[idx] = 0x2c  # Option 44
-                response[idx+1] = 1
-                response[idx+2] = 0x01  # Enable direct forwarding
-                idx += 3
-            
-            # End option
-            response[idx] = 0xff
-            idx += 1
-            
+            reply.option_u32(51, self.lease_time)
+
+            packet = reply.finish()
+            destination = None
+
             # Send response based on interface type
             if client_type == 'ethernet':
                 # Send to specific interface broadcast and local address
                 interface = self.interfaces.get(interface_name)
                 if interface:
-                    self.dhcp_sockets[interface_name].sendto(bytes(response[:idx]), (interface.broadcast_address, 68))
-                    self.dhcp_sockets[interface_name].sendto(bytes(response[:idx]), (offered_ip, 68))
+                    self.dhcp_sockets[interface_name].sendto(packet, (interface.broadcast_address, 68))
+                    self.dhcp_sockets[interface_name].sendto(packet, (offered_ip, 68))
+                    destination = (interface.broadcast_address, 68)
                 
                 # Also send via UDP tunnel for cross-interface communication
-                self._send_via_tunnel(interface_name, bytes(response[:idx]))
+                self._send_via_tunnel(interface_name, bytes(packet))
             else:
                 # Standard broadcast for wireless/USB
-                self.dhcp_sockets[interface_name].sendto(bytes(response[:idx]), ('255.255.255.255', 68))
+                self.dhcp_sockets[interface_name].sendto(packet, ('255.255.255.255', 68))
+                destination = ('255.255.255.255', 68)
+            
+            # Retransmits of this request are answered from the cache
+            guard = self.dhcp_guards.get(interface_name)
+            if guard and destination:
+                guard.remember(request_data, packet, destination)
             
             self.logger.info(f"← Enhanced DHCP Offer sent: IP={offered_ip}, Interface={interface_name}, Type={client_type}")
             self.logger.info(f"   ✓ Option 66 (TFTP Server): {self.server_ip}")
-            self.logger.info(f"   ✓ Option 67 (Boot File): {self.boot_file}")
+            self.logger.info(f"   ✓ Option 67 (Boot File): {boot_file}")
             self.logger.info(f"   ✓ Direct Ethernet Response: {client_type == 'ethernet'}")
             
         except Exception as e:
             self.logger.error(f"Enhanced DHCP offer error: {e}")
     
+    def _build_offer_template(self, interface_name: str, boot_name: str,
+                              message_type: int) -> ReplyTemplate:
+        """Everything in an offer on this interface that does not depend on the client"""
+        server_ip = socket.inet_aton(self.server_ip)
+        gateway = socket.inet_aton(self._get_gateway())
+        # CRITICAL: siaddr and the boot filename field for PXE
+        boot_file = boot_name.encode('ascii')
+        if is_http_boot(boot_name):
+            # UEFI HTTP boot: the URL is the boot file and the vendor class must say HTTPClient
+            return ReplyTemplate(message_type, siaddr=server_ip, giaddr=gateway, options=[
+                (54, server_ip),
+                (1, socket.inet_aton(self.subnet_mask)),
+                (3, gateway),
+                (6, server_ip),
+                (67, boot_file),
+                (60, b'HTTPClient')
+            ])
+        options = [
+            # Option 54: Server Identifier
+            (54, server_ip),
+            # Option 1: Subnet Mask
+            (1, socket.inet_aton(self.subnet_mask)),
+            # Option 3: Router/Gateway
+            (3, gateway),
+            # Option 6: DNS Server
+            (6, server_ip),
+            # CRITICAL OPTION 66: TFTP Server Name
+            (66, self.server_ip.encode('ascii')),
+            # CRITICAL OPTION 67: Bootfile Name
+            (67, boot_file),
+            # Option 60: Vendor Class Identifier
+            (60, b'PXEClient')
+        ]
+        
+        # Interface-specific options
+        interface = self.interfaces.get(interface_name)
+        if interface and interface.type == 'ethernet':
+            # Option 43: PXE discovery control - boot the file in this offer directly
+            options.append((43, proxy_vendor_options()))
+            # Option 44: enable direct ethernet forwarding
+            options.append((44, b'\x01'))
+        return ReplyTemplate(message_type, siaddr=server_ip, giaddr=gateway, file=boot_file,
+                             options=options)
+    
+    def _prepare_offer_templates(self):
+        """(Re)build the boot file table and the offer templates for the detected interfaces"""
+        self.boot_files = BootFileSelector(default=self.boot_file, server_ip=self.server_ip)
+        boot_names = sorted(set(self.boot_files.boot_files.values()) | {self.boot_files.default})
+        self.offer_templates.clear()
+        self.offer_templates.prepare([(name, boot_name, DHCPOFFER)
+                                      for name in self.interfaces for boot_name in boot_names])
+    
     def _send_via_tunnel(self, source_interface: str, data: bytes):
         """Send data via UDP tunnel"""
         try:
@@ -617,13 +648,11 @@ LABEL local
         except Exception as e:
             self.logger.debug(f"Tunnel send failed: {e}")
     
-    def _get_available_ip(self, mac: str, interface_name: str) -> str:
-        """Get available IP address for client"""
-        # Simple IP allocation - in production, use proper DHCP pool management
-        client_count = len(self.clients)
-        ip_parts = [int(x) for x in self.dhcp_range_start.split('.')]
-        ip_parts[3] += (client_count % 50) + 10  # Offset to avoid conflicts
-        return '.'.join(map(str, ip_parts))
+    def _get_available_ip(self, mac: str, interface_name: str,
+                          requested: Optional[str] = None) -> Optional[str]:
+        """Get available IP address for client (None when the pool is exhausted)"""
+        # Each MAC keeps its address; different clients never share one
+        return self.lease_pool.offer(mac, requested)
 
 def main():
     """Main entry point"""
@@ -8,7 +8,6 @@ Autonomous - just run and boot PC
 import socket
 import threading
 import os
-import struct
 import time
 import json
 from datetime import datetime
@@ -16,6 +15,10 @@ import sys
 import signal
 import subprocess
 
+from pxe.tftp import TFTPEngine
+from pxe.dhcp import DHCPBatcher, StormGuard, reply_buffer
+from pxe.buffers import BufferPool, DHCP_BUFFER_SIZE, DHCP_BUFFERS
+
 class FixedPXEServer:
     """Fixed PXE Boot Server with guaranteed boot filename delivery"""
     
@@ -25,6 +28,12 @@ class FixedPXEServer:
         self.tftp_socket = None
         self.dhcp_thread = None
         self.tftp_thread = None
+        self.tftp_engine = None
+        # Pooled receive buffers and a fixed worker pool instead of a thread per datagram;
+        # floods and retransmits are screened out before a worker sees them
+        self.dhcp_buffers = BufferPool(DHCP_BUFFER_SIZE, DHCP_BUFFERS)
+        self.dhcp_batcher = None
+        self.dhcp_guard = StormGuard()
         
         # Get real local IP
         self.server_ip = self._get_local_ip()
@@ -184,12 +193,18 @@ LABEL local
         self.log("Stopping PXE server...")
         self.running = False
         
+        if self.dhcp_batcher:
+            self.dhcp_batcher.stop()
+            
         if self.dhcp_socket:
             try:
                 self.dhcp_socket.close()
             except:
                 pass
                 
+        if self.tftp_engine:
+            self.tftp_engine.stop()
+            
         if self.tftp_socket:
             try:
                 self.tftp_socket.close()
@@ -223,14 +238,12 @@ LABEL local
                 self.log("✗ Cannot bind to any DHCP port")
                 return
                 
-            self.dhcp_socket.settimeout(1.0)
+            self.dhcp_batcher = DHCPBatcher(self.dhcp_socket, self._handle_dhcp, self.dhcp_buffers,
+                                            guard=self.dhcp_guard)
             
             while self.running:
                 try:
-                    data, addr = self.dhcp_socket.recvfrom(1024)
-                    threading.Thread(target=self._handle_dhcp, args=(data, addr), daemon=True).start()
-                except socket.timeout:
-                    continue
+                    self.dhcp_batcher.poll()
                 except Exception as e:
                     if self.running:
                         self.log(f"DHCP error: {e}")
@@ -264,102 +277,49 @@ LABEL local
     def _send_fixed_dhcp_offer(self, request_data, addr, mac):
         """Send DHCP offer with GUARANTEED boot filename (fixes PXE-E53)"""
         try:
-            # Build DHCP offer packet
-            response = bytearray(576)  # Larger packet for all options
-            
-            # DHCP header
-            response[0] = 2  # BOOTREPLY
-            response[1] = 1  # Ethernet
-            response[2] = 6  # MAC length
-            response[3] = 0  # Hops
-            
-            # Transaction ID (copy from request)
-            response[4:8] = request_data[4:8]
-            
-            # Seconds, flags
-            response[8:12] = b'\x00' * 4
-            
-            # Client IP (0.0.0.0)
-            response[12:16] = b'\x00' * 4
-            
-            # Your IP (offered IP)
+            # Reuse this thread's reply buffer instead of zeroing a new packet
             offered_ip = '192.168.1.150'
-            response[16:20] = socket.inet_aton(offered_ip)
-            
-            # Server IP (siaddr field) - CRITICAL for PXE
-            response[20:24] = socket.inet_aton(self.config['server_ip'])
-            
-            # Gateway IP
-            response[24:28] = socket.inet_aton(self.config['gateway'])
-            
-            # Client MAC address
-            response[28:34] = request_data[28:34]
-            
-            # CRITICAL: Boot filename at fixed position 108-236
-            # This is the FIRST place PXE clients look for boot filename
+            server_ip = socket.inet_aton(self.config['server_ip'])
+            gateway = socket.inet_aton(self.config['gateway'])
             boot_file = self.config['boot_file'].encode('ascii')
-            response[108:108+len(boot_file)] = boot_file
-            response[108+len(boot_file)] = 0  # Null terminator
-            
-            # Magic cookie
-            response[236:240] = b'\x63\x82\x53\x63'
-            
-            # DHCP options
-            idx = 240
-            
+
+            # CRITICAL: siaddr and the boot filename field (108-236) are the
+            # FIRST place PXE clients look for the server and boot file
+            reply = reply_buffer().begin(
+                bytes(request_data[4:8]), bytes(request_data[28:34]),
+                yiaddr=socket.inet_aton(offered_ip), siaddr=server_ip, giaddr=gateway,
+                file=boot_file)
+
             # Option 53: DHCP Message Type (Offer = 2)
-            response[idx:idx+3] = b'\x35\x01\x02'
-            idx += 3
-            
+            reply.option_byte(53, 2)
             # Option 54: Server Identifier
-            response[idx:idx+6] = b'\x36\x04' + socket.inet_aton(self.config['server_ip'])
-            idx += 6
-            
+            reply.option(54, server_ip)
             # Option 51: Lease Time
-            response[idx:idx+6] = b'\x33\x04' + struct.pack('>I', self.config['lease_time'])
-            idx += 6
-            
+            reply.option_u32(51, self.config['lease_time'])
             # Option 1: Subnet Mask
-            response[idx:idx+6] = b'\x01\x04' + socket.inet_aton(self.config['subnet_mask'])
-            idx += 6
-            
+            reply.option(1, socket.inet_aton(self.config['subnet_mask']))
             # Option 3: Router/Gateway
-            response[idx:idx+6] = b'\x03\x04' + socket.inet_aton(self.config['gateway'])
-            idx += 6
-            
+            reply.option(3, gateway)
             # Option 6: DNS Server
-            response[idx:idx+6] = b'\x06\x04' + socket.inet_aton(self.config['dns_server'])
-            idx += 6
-            
+            reply.option(6, socket.inet_aton(self.config['dns_server']))
+
             # CRITICAL OPTION 66: TFTP Server Name (next-server)
             # This tells the client WHERE to get the boot file
-            server_ip_bytes = self.config['server_ip'].encode('ascii')
-            response[idx] = 0x42  # Option 66
-            response[idx+1] = len(server_ip_bytes)
-            response[idx+2:idx+2+len(server_ip_bytes)] = server_ip_bytes
-            idx += 2 + len(server_ip_bytes)
-            
+            reply.option(66, self.config['server_ip'].encode('ascii'))
+
             # CRITICAL OPTION 67: Bootfile Name
             # This is the MOST IMPORTANT option - fixes PXE-E53
-            response[idx] = 0x43  # Option 67
-            response[idx+1] = len(boot_file)
-            response[idx+2:idx+2+len(boot_file)] = boot_file
-            idx += 2 + len(boot_file)
-            
+            reply.option(67, boot_file)
+
             # Option 60: Vendor Class Identifier
-            vendor_class = b'PXEClient'
-            response[idx] = 0x3c
-            response[idx+1] = len(vendor_class)
-            response[idx+2:idx+2+len(vendor_class)] = vendor_class
-            idx += 2 + len(vendor_class)
-            
-            # End option
-            response[idx] = 0xff
-            idx += 1
-            
+            reply.option(60, b'PXEClient')
+
             # Send response to broadcast address
             broadcast_addr = '255.255.255.255'
-            self.dhcp_socket.sendto(bytes(response[:idx]), (broadcast_addr, 68))
+            packet = reply.finish()
+            self.dhcp_socket.sendto(packet, (broadcast_addr, 68))
+            # Retransmits of this request get the same packet without reaching a worker
+            self.dhcp_guard.remember(request_data, packet, (broadcast_addr, 68))
             
             self.log(f"← DHCP Offer sent: IP={offered_ip}, Boot={self.config['boot_file']}, TFTP={self.config['server_ip']}")
             self.log(f"   ✓ Option 66 (TFTP Server): {self.config['server_ip']}")
@@ -392,119 +352,12 @@ LABEL local
                 self.log("✗ Cannot bind to any TFTP port")
                 return
                 
-            self.tftp_socket.settimeout(1.0)
-            
-            while self.running:
-                try:
-                    data, addr = self.tftp_socket.recvfrom(516)
-                    threading.Thread(target=self._handle_tftp, args=(data, addr), daemon=True).start()
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if self.running:
-                        self.log(f"TFTP error: {e}")
+            # All transfers are multiplexed on this thread
+            self.tftp_engine = TFTPEngine.from_config(self.tftp_socket, [self.tftp_dir], self.config, log=self.log)
+            self.tftp_engine.run()
                         
         except Exception as e:
             self.log(f"Failed to start TFTP server: {e}")
-            
-    def _handle_tftp(self, data, addr):
-        """Handle TFTP request"""
-        try:
-            if len(data) < 4:
-                return
-                
-            opcode = struct.unpack('>H', data[0:2])[0]
-            
-            if opcode == 1:  # Read Request (RRQ)
-                # Parse filename
-                filename_end = data.index(b'\x00', 2)
-                filename = data[2:filename_end].decode('utf-8', errors='ignore')
-                
-                self.log(f"→ TFTP Request: {filename} from {addr[0]}:{addr[1]}")
-                
-                # Send file
-                self._send_tftp_file(filename, addr)
-                
-        except Exception as e:
-            self.log(f"TFTP handler error: {e}")
-            
-    def _send_tftp_file(self, filename, addr):
-        """Send file via TFTP"""
-        try:
-            # Sanitize filename
-            filename = filename.lstrip('/')
-            filepath = os.path.join(self.tftp_dir, filename)
-            
-            # Check if file exists
-            if not os.path.exists(filepath):
-                # Send error packet
-                error_msg = f"File not found: {filename}".encode()
-                error_packet = struct.pack('>H', 5) + struct.pack('>H', 1) + error_msg + b'\x00'
-                
-                transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                transfer_socket.sendto(error_packet, addr)
-                transfer_socket.close()
-                
-                self.log(f"✗ File not found: {filename}")
-                return
-                
-            # Read file
-            with open(filepath, 'rb') as f:
-                file_data = f.read()
-                
-            # Create new socket for this transfer
-            transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            transfer_socket.settimeout(5.0)
-            
-            # Send file in blocks
-            block_size = 512
-            block_num = 1
-            offset = 0
-            
-            while offset < len(file_data):
-                # Get block data
-                block_data = file_data[offset:offset + block_size]
-                
-                # Create DATA packet
-                data_packet = struct.pack('>H', 3) + struct.pack('>H', block_num) + block_data
-                
-                # Send with retry
-                retries = 3
-                acked = False
-                
-                for retry in range(retries):
-                    transfer_socket.sendto(data_packet, addr)
-                    
-                    try:
-                        # Wait for ACK
-                        ack_data, _ = transfer_socket.recvfrom(4)
-                        ack_opcode = struct.unpack('>H', ack_data[0:2])[0]
-                        ack_block = struct.unpack('>H', ack_data[2:4])[0]
-                        
-                        if ack_opcode == 4 and ack_block == block_num:
-                            acked = True
-                            break
-                    except socket.timeout:
-                        if retry == retries - 1:
-                            self.log(f"✗ TFTP timeout sending block {block_num}")
-                            
-                if not acked:
-                    break
-                    
-                offset += block_size
-                block_num += 1
-                
-                # Last block
-                if len(block_data) < block_size:
-                    break
-                    
-            transfer_socket.close()
-            
-            if acked or offset >= len(file_data):
-                self.log(f"← TFTP Transfer complete: {filename} ({len(file_data)} bytes)")
-            
-        except Exception as e:
-            self.log(f"TFTP send error: {e}")
 
 def show_banner():
     """Display startup banner"""
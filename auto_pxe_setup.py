@@ -384,6 +384,7 @@ class AutonomousPXE:
             # Import the main server
             sys.path.append(os.path.dirname(os.path.abspath(__file__)))
             from termux_pxe_boot import TermuxPXEServer
+            from pxe.dhcp.proxy import MODE_PROXY
             
             # Create and configure server
             server = TermuxPXEServer()
@@ -392,7 +393,12 @@ class AutonomousPXE:
             if self.current_method == 'USB_Tethering':
                 server.config['server_ip'] = '192.168.42.2'
                 server.config['gateway'] = '192.168.42.1'
-            
+
+            # Another DHCP server owns the network: only add the PXE boot information
+            if self.network_tests.get('dhcp_competition'):
+                server.config['dhcp_mode'] = MODE_PROXY
+                self.log("   Existing DHCP server found - using proxyDHCP mode")
+
             # Start server
             server.start()
             self.setup_success = True
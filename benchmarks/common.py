@@ -0,0 +1,45 @@
+"""
+Benchmark helpers for Termux PXE Boot
+Command line options, percentiles and the JSON results file shared by every benchmark
+"""
+import json
+import math
+import os
+import platform
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def add_output_arguments(parser, name):
+    """Add the --label and --output options of a benchmark named name"""
+    parser.add_argument('--label', default='', help="free-form label stored with the results")
+    parser.add_argument('--output', help=f"JSON file to write (default: benchmarks/results/{name}-<time>.json)")
+
+
+def save_results(name, args, params, results):
+    """Write params and results with the run's metadata as JSON; returns the file path"""
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump({
+            'benchmark': name,
+            'label': args.label,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': params,
+            'results': results
+        }, f, indent=2)
+    return output
+
+
+def percentile(values, fraction, digits=4):
+    """Nearest-rank percentile of a list of numbers, rounded to digits"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return round(ordered[index], digits)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+DHCP DORA benchmark for Termux PXE Boot
+Measures the time simulated PXE ROMs need from their first DISCOVER until they can send
+the first TFTP RRQ, with the server's real DHCP receive path on loopback
+"""
+import argparse
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from termux_pxe_boot import TermuxPXEServer
+from pxe.dhcp import (
+    DHCPBatcher, MAGIC_COOKIE, message_type,
+    DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPACK
+)
+from benchmarks.common import add_output_arguments, save_results, percentile
+
+# PXE ROM retransmission timers (PXE 2.1: 4, 8, 16 and 32 seconds)
+ROM_TIMEOUTS = (4, 8, 16, 32)
+
+
+class ReplyRouter:
+    """Stands in for the server's broadcast socket and hands replies to clients by xid
+
+    Broadcast replies cannot be received on loopback without root, so
+    the server's sends are routed in-process; requests still travel
+    over a real UDP socket through the server's receive path.
+    """
+
+    def __init__(self):
+        self.clients = {}
+
+    def sendto(self, data, addr):
+        inbox = self.clients.get(bytes(data[4:8]))
+        if inbox is not None:
+            inbox.put(bytes(data))
+
+
+class LegacyServer(TermuxPXEServer):
+    """The server as it behaved before DORA: every request is answered with an OFFER"""
+
+    def _answer_dhcp_request(self, request_data, mac, options):
+        self._send_dhcp_offer(request_data, ('0.0.0.0', 68), mac, options)
+
+
+def _client_message(msg_type, mac, xid, options=b''):
+    """Build a PXE client message"""
+    packet = bytearray(240)
+    packet[0:4] = b'\x01\x01\x06\x00'
+    packet[4:8] = xid
+    packet[28:34] = mac
+    packet[236:240] = MAGIC_COOKIE
+    return bytes(packet) + bytes([53, 1, msg_type]) + b'\x3c\x09PXEClient' + options + b'\xff'
+
+
+def _wait_for(inbox, wanted, timeout):
+    """Return the first reply of the wanted type within timeout, or None"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        try:
+            reply = inbox.get(timeout=remaining)
+        except queue.Empty:
+            return None
+        if message_type(reply) == wanted:
+            return reply
+
+
+def run_client(sock, server_addr, router, index, server_id, reply_timeout):
+    """One PXE ROM: DISCOVER until OFFER, REQUEST until ACK
+
+    Real waits are capped at reply_timeout; a missed reply adds the ROM
+    timer it would have waited for to the simulated time instead.
+    Returns (seconds until the RRQ could be sent, simulated ROM wait, booted).
+    """
+    mac = b'\x52\x54\x00' + index.to_bytes(3, 'big')
+    xid = random.Random(index).getrandbits(32).to_bytes(4, 'big')
+    inbox = queue.Queue()
+    router.clients[xid] = inbox
+    started = time.perf_counter()
+    waited = 0.0
+
+    try:
+        offer = None
+        for rom_timeout in ROM_TIMEOUTS:
+            sock.sendto(_client_message(DHCPDISCOVER, mac, xid), server_addr)
+            offer = _wait_for(inbox, DHCPOFFER, reply_timeout)
+            if offer:
+                break
+            waited += rom_timeout
+        if offer is None:
+            return time.perf_counter() - started, waited, False
+
+        options = b'\x32\x04' + offer[16:20] + b'\x36\x04' + socket.inet_aton(server_id)
+        for rom_timeout in ROM_TIMEOUTS:
+            sock.sendto(_client_message(DHCPREQUEST, mac, xid, options), server_addr)
+            if _wait_for(inbox, DHCPACK, reply_timeout):
+                # The RRQ for the boot file goes out right after the ACK
+                return time.perf_counter() - started, waited, True
+            waited += rom_timeout
+        return time.perf_counter() - started, waited, False
+    finally:
+        del router.clients[xid]
+
+
+def run_benchmark(clients=50, legacy=False, reply_timeout=0.5):
+    """Boot N simulated ROMs at once against the DHCP receive path"""
+    server = (LegacyServer if legacy else TermuxPXEServer)()
+    server.log = lambda message: None
+    router = ReplyRouter()
+    server.dhcp_socket = router
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    batcher = DHCPBatcher(listen_socket, server._handle_dhcp, server.dhcp_buffers)
+    running = True
+
+    def serve():
+        while running:
+            batcher.poll(timeout=0.1)
+
+    server_thread = threading.Thread(target=serve, daemon=True)
+    server_thread.start()
+
+    results = []
+    lock = threading.Lock()
+
+    def client(index):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            outcome = run_client(sock, listen_socket.getsockname(), router, index,
+                                 server.config['server_ip'], reply_timeout)
+        finally:
+            sock.close()
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    running = False
+    server_thread.join(timeout=2)
+    batcher.stop()
+    listen_socket.close()
+
+    booted = [seconds + waited for seconds, waited, ok in results if ok]
+    measured = [seconds for seconds, waited, ok in results if ok]
+    return {
+        'clients_booted': len(booted),
+        'clients_gave_up': len(results) - len(booted),
+        'wall_seconds': round(wall, 4),
+        'measured_p50_seconds': percentile(measured, 0.50, 6),
+        'measured_p99_seconds': percentile(measured, 0.99, 6),
+        'discover_to_rrq_p50_seconds': percentile(booted, 0.50, 6),
+        'discover_to_rrq_p99_seconds': percentile(booted, 0.99, 6),
+        'simulated_rom_wait_seconds': round(sum(waited for _, waited, _ in results), 1),
+        'dhcp': server.dhcp_transactions.get_stats()
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="DHCP DISCOVER-to-RRQ benchmark")
+    parser.add_argument('--clients', type=int, default=50, help="simulated PXE ROMs booting at once")
+    parser.add_argument('--legacy', action='store_true', help="answer REQUESTs with OFFERs like the old server")
+    parser.add_argument('--reply-timeout', type=float, default=0.5,
+                        help="real seconds to wait for a reply before counting a ROM timeout")
+    add_output_arguments(parser, 'dora')
+    args = parser.parse_args()
+
+    params = {'clients': args.clients, 'legacy': args.legacy, 'reply_timeout': args.reply_timeout}
+    print(f"DORA benchmark: {args.clients} clients, {'legacy' if args.legacy else 'DORA'} server")
+    results = run_benchmark(**params)
+
+    print(f"  Booted/gave up:        {results['clients_booted']}/{results['clients_gave_up']}")
+    print(f"  DISCOVER->RRQ p50:     {results['discover_to_rrq_p50_seconds']} s")
+    print(f"  DISCOVER->RRQ p99:     {results['discover_to_rrq_p99_seconds']} s")
+    print(f"  Simulated ROM waiting: {results['simulated_rom_wait_seconds']} s")
+
+    output = save_results('dora', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
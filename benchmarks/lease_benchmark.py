@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+DHCP lease pool benchmark for Termux PXE Boot
+Fills, renews, releases and expires a /16-sized LeasePool and records per-operation cost as JSON
+"""
+import argparse
+import ipaddress
+import os
+import sys
+import time
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pxe.dhcp.leases import LeasePool
+from benchmarks.common import add_output_arguments, save_results
+
+
+def _mac(index):
+    """A distinct client MAC for every index"""
+    return '52:54:' + ':'.join(f'{b:02x}' for b in index.to_bytes(4, 'big'))
+
+
+def _timed(operation, count):
+    """Run operation(i) for i in range(count); return microseconds per call"""
+    started = time.perf_counter()
+    for i in range(count):
+        operation(i)
+    return round((time.perf_counter() - started) / count * 1e6, 3)
+
+
+def run_benchmark(prefix=16, network='10.0.0.0'):
+    """Measure every pool operation across a whole /prefix range"""
+    hosts = ipaddress.IPv4Network(f'{network}/{prefix}').hosts()
+    first = next(hosts)
+    last = first + (2 ** (32 - prefix) - 3)
+    now = [0.0]
+    pool = LeasePool(str(first), str(last), lease_time=3600, clock=lambda: now[0])
+    size = pool.size
+    macs = [_mac(i) for i in range(size)]
+    addresses = [None] * size
+
+    def offer(i):
+        addresses[i] = pool.offer(macs[i])
+
+    def bind(i):
+        pool.bind(macs[i], addresses[i])
+
+    results = {'pool_size': size}
+    results['offer_us'] = _timed(offer, size)
+    results['bind_us'] = _timed(bind, size)
+    assert len(set(addresses)) == size and None not in addresses
+
+    results['lookup_us'] = _timed(lambda i: pool.lookup(macs[i]), size)
+    results['renew_us'] = _timed(bind, size)
+    results['exhausted_offer_us'] = _timed(lambda i: pool.offer(_mac(size + i)), 1000)
+
+    results['release_us'] = _timed(lambda i: pool.release(macs[i], addresses[i]), size // 2)
+    # Released clients come back to their sticky addresses
+    results['sticky_reoffer_us'] = _timed(offer, size // 2)
+
+    # Every lease runs out at once; the first call after that sweeps the heap
+    now[0] += 7200
+    started = time.perf_counter()
+    stats = pool.get_stats()
+    results['sweep_all_ms'] = round((time.perf_counter() - started) * 1e3, 3)
+    results['expired'] = stats['expired']
+    results['reoffer_after_expiry_us'] = _timed(lambda i: pool.offer(_mac(2 * size + i)), size)
+    results['expiry_heap_entries'] = len(pool.expiries)
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="DHCP lease pool benchmark")
+    parser.add_argument('--prefix', type=int, default=16, help="pool size as a network prefix length")
+    add_output_arguments(parser, 'leases')
+    args = parser.parse_args()
+
+    params = {'prefix': args.prefix}
+    print(f"Lease pool benchmark: /{args.prefix} range")
+    results = run_benchmark(**params)
+    for name, value in results.items():
+        print(f"  {name + ':':26} {value}")
+
+    output = save_results('leases', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
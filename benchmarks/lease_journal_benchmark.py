@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+DHCP lease journal benchmark for Termux PXE Boot
+Writes a long lease history to a journal, then times the startup replay before and after compaction
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pxe.dhcp.leases import LeasePool
+from pxe.dhcp.journal import LeaseJournal
+from benchmarks.common import add_output_arguments, save_results
+
+
+def _mac(index):
+    """A distinct client MAC for every index"""
+    return '52:54:' + ':'.join(f'{b:02x}' for b in index.to_bytes(4, 'big'))
+
+
+def _pool(clock):
+    """A /16-sized pool"""
+    return LeasePool('10.0.0.1', '10.0.255.254', lease_time=86400, clock=clock)
+
+
+def _replay(directory, clock):
+    """Start a fresh pool on the saved leases; returns (ms, leases restored, records read)"""
+    pool = _pool(clock)
+    journal = LeaseJournal(directory, flush_interval=3600)
+    started = time.perf_counter()
+    restored = pool.attach(journal)
+    elapsed = (time.perf_counter() - started) * 1e3
+    journal.close()
+    return round(elapsed, 3), restored, journal.get_stats()['replayed']
+
+
+def run_benchmark(clients=50000, renewals=2):
+    """Bind every client, renew each a few times, release a tenth, then restart"""
+    now = [1000.0]
+    clock = lambda: now[0]
+    results = {'clients': clients}
+    with tempfile.TemporaryDirectory() as directory:
+        pool = _pool(clock)
+        # Compaction is left to the end so the first replay reads the whole history
+        journal = LeaseJournal(directory, flush_interval=3600, compact_records=float('inf'))
+        pool.attach(journal)
+        macs = [_mac(i) for i in range(clients)]
+
+        started = time.perf_counter()
+        for mac in macs:
+            pool.bind(mac, pool.offer(mac))
+        for _ in range(renewals):
+            now[0] += 60
+            for mac in macs:
+                pool.bind(mac, pool.lookup(mac))
+        for mac in macs[::10]:
+            pool.release(mac, pool.lookup(mac))
+        results['record_us'] = round((time.perf_counter() - started) / journal.get_stats()['records'] * 1e6, 3)
+
+        started = time.perf_counter()
+        journal.flush()
+        results['flush_ms'] = round((time.perf_counter() - started) * 1e3, 3)
+        results['journal_bytes'] = os.path.getsize(journal.journal_path)
+
+        ms, restored, replayed = _replay(directory, clock)
+        results.update(replay_journal_ms=ms, replay_journal_records=replayed, restored=restored)
+
+        started = time.perf_counter()
+        journal.compact(pool.checkpoint())
+        results['compact_ms'] = round((time.perf_counter() - started) * 1e3, 3)
+        journal.close()
+        results['snapshot_bytes'] = os.path.getsize(journal.snapshot_path)
+
+        ms, restored, replayed = _replay(directory, clock)
+        results.update(replay_snapshot_ms=ms, replay_snapshot_records=replayed)
+        assert restored == results['restored']
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="DHCP lease journal replay benchmark")
+    parser.add_argument('--clients', type=int, default=50000, help="historical leases in the journal")
+    parser.add_argument('--renewals', type=int, default=2, help="renewals journaled per client")
+    add_output_arguments(parser, 'lease-journal')
+    args = parser.parse_args()
+
+    params = {'clients': args.clients, 'renewals': args.renewals}
+    print(f"Lease journal benchmark: {args.clients} clients, {args.renewals} renewals each")
+    results = run_benchmark(**params)
+    for name, value in results.items():
+        print(f"  {name + ':':26} {value}")
+
+    output = save_results('lease-journal', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
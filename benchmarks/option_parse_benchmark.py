@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+DHCP option parsing microbenchmark for Termux PXE Boot
+Measures requests parsed per second by the single-pass option map against the old
+byte-by-byte PXEClient scan plus one option walk per lookup
+"""
+import argparse
+import os
+import socket
+import sys
+import timeit
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pxe.dhcp import MAGIC_COOKIE, parse_options
+from benchmarks.common import add_output_arguments, save_results
+
+
+def _header():
+    """BOOTREQUEST header of a PXE ROM"""
+    packet = bytearray(240)
+    packet[0:4] = b'\x01\x01\x06\x00'
+    packet[4:8] = b'\x12\x34\x56\x78'
+    packet[28:34] = b'\x52\x54\x00\x12\x34\x56'
+    packet[236:240] = MAGIC_COOKIE
+    return packet
+
+
+def rom_discover():
+    """DISCOVER with the options a UEFI PXE ROM sends"""
+    return bytes(_header()) + (
+        b'\x35\x01\x01'
+        + b'\x39\x02\x05\xc0'
+        + b'\x37\x23' + bytes(range(1, 36))
+        + b'\x61\x11\x00' + bytes(16)
+        + b'\x5e\x03\x01\x03\x10'
+        + b'\x5d\x02\x00\x07'
+        + b'\x3c\x20PXEClient:Arch:00007:UNDI:003016'
+        + b'\xff')
+
+
+def rom_request():
+    """REQUEST in SELECTING state, with requested address and server id"""
+    return rom_discover()[:-1].replace(b'\x35\x01\x01', b'\x35\x01\x03', 1) + (
+        b'\x32\x04' + socket.inet_aton('192.168.1.150')
+        + b'\x36\x04' + socket.inet_aton('192.168.1.10') + b'\xff')
+
+
+def overloaded_request():
+    """REQUEST whose options continue in the file and sname fields"""
+    packet = _header()
+    packet[108:120] = b'\x3c\x09PXEClient\xff'
+    packet[44:51] = b'\x36\x04' + socket.inet_aton('192.168.1.10') + b'\xff'
+    return bytes(packet) + b'\x35\x01\x03\x34\x01\x03\x32\x04' + socket.inet_aton('192.168.1.150') + b'\xff'
+
+
+def legacy_find_option(data, code):
+    """One option walk per lookup, as the servers did before"""
+    idx = 240
+    end = len(data)
+    while idx < end:
+        option = data[idx]
+        if option == 255:
+            break
+        if option == 0:
+            idx += 1
+            continue
+        if idx + 1 >= end:
+            break
+        length = data[idx + 1]
+        if option == code:
+            return data[idx + 2:min(idx + 2 + length, end)]
+        idx += 2 + length
+    return None
+
+
+def legacy_parse(data):
+    """The old _handle_dhcp: byte-by-byte PXEClient scan, then a walk per option"""
+    pxe_detected = data[236:240] == MAGIC_COOKIE
+    if len(data) > 300:
+        options_section = data[240:]
+        for i in range(0, len(options_section), 1):
+            if i + 1 >= len(options_section):
+                break
+            if options_section[i] == 0x3c:
+                option_len = options_section[i+1] if i+1 < len(options_section) else 0
+                if option_len > 0 and i+2+option_len <= len(options_section):
+                    if options_section[i+2:i+2+option_len] == b'PXEClient':
+                        pxe_detected = True
+                        break
+    return (pxe_detected, legacy_find_option(data, 53),
+            legacy_find_option(data, 50), legacy_find_option(data, 54))
+
+
+def option_map(data):
+    """The shared parser, answering the same questions"""
+    options = parse_options(data)
+    return options.is_pxe, options.message_type, options.address(50), options.address(54)
+
+
+def run_benchmark(iterations=20000):
+    """Parse rate of each request shape with both parsers"""
+    results = {}
+    packets = {
+        'rom_discover': rom_discover(),
+        'rom_request': rom_request(),
+        'overloaded_request': overloaded_request()
+    }
+    for name, packet in packets.items():
+        view = memoryview(bytearray(packet))
+        for label, parser in (('legacy', legacy_parse), ('option_map', option_map)):
+            seconds = min(timeit.repeat(lambda: parser(view), number=iterations, repeat=3))
+            results[f'{name}_{label}_per_second'] = round(iterations / seconds)
+            results[f'{name}_{label}_us'] = round(seconds / iterations * 1e6, 3)
+        results[f'{name}_bytes'] = len(packet)
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="DHCP option parsing microbenchmark")
+    parser.add_argument('--iterations', type=int, default=20000, help="parses per measurement")
+    add_output_arguments(parser, 'options')
+    args = parser.parse_args()
+
+    params = {'iterations': args.iterations}
+    print(f"Option parsing microbenchmark: {args.iterations} parses per measurement")
+    results = run_benchmark(**params)
+    for name, value in results.items():
+        print(f"  {name + ':':40} {value}")
+
+    output = save_results('options', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
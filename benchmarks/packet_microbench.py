@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Packet building microbenchmark for Termux PXE Boot
+Compares per-packet allocations and time of the old concatenating TFTP DATA and
+fresh-bytearray DHCP offer builders with the precompiled struct/reused buffer paths,
+and DHCP offers patched into a prebuilt reply template
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import timeit
+import tracemalloc
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pxe.tftp import ReadTransfer
+from pxe.dhcp import ReplyBuffer, ReplyTemplate
+from benchmarks.common import add_output_arguments, save_results
+
+
+SERVER_IP = '192.168.1.10'
+OFFERED_IP = '192.168.1.150'
+GATEWAY = '192.168.1.1'
+SUBNET_MASK = '255.255.255.0'
+DNS_SERVER = '8.8.8.8'
+
+
+def legacy_data(block_num, block_data):
+    """DATA packet the way the servers built it before: three objects concatenated"""
+    return struct.pack('>H', 3) + struct.pack('>H', block_num) + block_data
+
+
+def legacy_offer(request):
+    """DHCP offer the way the servers built it before: a fresh zeroed bytearray"""
+    response = bytearray(548)
+    response[0:4] = b'\x02\x01\x06\x00'
+    response[4:8] = request[4:8]
+    response[16:20] = socket.inet_aton(OFFERED_IP)
+    response[20:24] = socket.inet_aton(SERVER_IP)
+    response[24:28] = socket.inet_aton(GATEWAY)
+    response[28:34] = request[28:34]
+    response[108:118] = b'pxelinux.0'
+    response[236:240] = b'\x63\x82\x53\x63'
+    idx = 240
+    response[idx:idx + 3] = b'\x35\x01\x02'
+    idx += 3
+    response[idx:idx + 6] = b'\x36\x04' + socket.inet_aton(SERVER_IP)
+    idx += 6
+    response[idx:idx + 6] = b'\x33\x04' + struct.pack('>I', 86400)
+    idx += 6
+    response[idx:idx + 6] = b'\x01\x04' + socket.inet_aton(SUBNET_MASK)
+    idx += 6
+    response[idx:idx + 6] = b'\x03\x04' + socket.inet_aton(GATEWAY)
+    idx += 6
+    response[idx:idx + 6] = b'\x06\x04' + socket.inet_aton(DNS_SERVER)
+    idx += 6
+    response[idx:idx + 2 + len(b'pxelinux.0')] = b'\x43\x0a' + b'pxelinux.0'
+    idx += 12
+    response[idx] = 0xff
+    return bytes(response[:idx + 1])
+
+
+def pooled_offer(reply, request):
+    """The same offer built in a reused ReplyBuffer"""
+    reply.begin(request[4:8], request[28:34], yiaddr=socket.inet_aton(OFFERED_IP),
+                siaddr=socket.inet_aton(SERVER_IP), giaddr=socket.inet_aton(GATEWAY),
+                file=b'pxelinux.0')
+    reply.option_byte(53, 2)
+    reply.option(54, socket.inet_aton(SERVER_IP))
+    reply.option_u32(51, 86400)
+    reply.option(1, socket.inet_aton(SUBNET_MASK))
+    reply.option(3, socket.inet_aton(GATEWAY))
+    reply.option(6, socket.inet_aton(DNS_SERVER))
+    reply.option(67, b'pxelinux.0')
+    return reply.finish()
+
+
+def offer_template():
+    """The client-independent part of the offer, packed once"""
+    return ReplyTemplate(2, siaddr=socket.inet_aton(SERVER_IP), giaddr=socket.inet_aton(GATEWAY),
+                         file=b'pxelinux.0', options=(
+                             (54, socket.inet_aton(SERVER_IP)),
+                             (1, socket.inet_aton(SUBNET_MASK)),
+                             (3, socket.inet_aton(GATEWAY)),
+                             (6, socket.inet_aton(DNS_SERVER)),
+                             (67, b'pxelinux.0')))
+
+
+def templated_offer(reply, template, yiaddr, request):
+    """The same offer patched into a template: client fields and the lease time only"""
+    reply.begin_template(template, request[4:8], request[28:34], yiaddr=yiaddr)
+    reply.option_u32(51, 86400)
+    return reply.finish()
+
+
+def measure(build, iterations):
+    """Return (ns per packet, peak bytes allocated while building one packet)"""
+    build()
+    seconds = min(timeit.repeat(build, number=iterations, repeat=3))
+
+    tracemalloc.start()
+    build()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(100):
+        build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return round(seconds / iterations * 1e9, 1), max(0, peak - baseline)
+
+
+def run_benchmark(blksize=1432, iterations=200000):
+    """Measure both builders for TFTP DATA and DHCP offers"""
+    payload = os.urandom(blksize * 64)
+    transfer = ReadTransfer(payload, blksize=blksize)
+    counter = iter(range(10 ** 9))
+
+    def old_data():
+        # The old servers read every block into a new bytes object
+        offset = (next(counter) & 63) * blksize
+        return legacy_data(offset // blksize + 1, payload[offset:offset + blksize])
+
+    def new_data():
+        return transfer.block_packet(next(counter) & 63)
+
+    request = bytearray(240)
+    request[0:4] = b'\x01\x01\x06\x00'
+    request[4:8] = b'\xde\xad\xbe\xef'
+    request[28:34] = b'\x52\x54\x00\x12\x34\x56'
+    request = bytes(request)
+    reply = ReplyBuffer()
+    assert bytes(pooled_offer(reply, request)) == legacy_offer(request)
+    template = offer_template()
+    yiaddr = socket.inet_aton(OFFERED_IP)
+    assert len(templated_offer(reply, template, yiaddr, request)) == len(legacy_offer(request))
+
+    results = {}
+    for name, old, new in (('tftp_data', old_data, new_data),
+                           ('dhcp_offer', lambda: legacy_offer(request),
+                            lambda: pooled_offer(reply, request))):
+        old_ns, old_bytes = measure(old, iterations)
+        new_ns, new_bytes = measure(new, iterations)
+        results[name] = {
+            'legacy_ns_per_packet': old_ns,
+            'pooled_ns_per_packet': new_ns,
+            'legacy_bytes_allocated_per_packet': old_bytes,
+            'pooled_bytes_allocated_per_packet': new_bytes
+        }
+    template_ns, template_bytes = measure(lambda: templated_offer(reply, template, yiaddr, request), iterations)
+    results['dhcp_offer']['template_ns_per_packet'] = template_ns
+    results['dhcp_offer']['template_bytes_allocated_per_packet'] = template_bytes
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Packet building microbenchmark")
+    parser.add_argument('--blksize', type=int, default=1432, help="TFTP block size")
+    parser.add_argument('--iterations', type=int, default=200000, help="packets per timing run")
+    add_output_arguments(parser, 'packets')
+    args = parser.parse_args()
+
+    params = {'blksize': args.blksize, 'iterations': args.iterations}
+    results = run_benchmark(**params)
+
+    for name, values in results.items():
+        print(f"{name}:")
+        print(f"  legacy: {values['legacy_ns_per_packet']} ns, "
+              f"{values['legacy_bytes_allocated_per_packet']} bytes allocated per packet")
+        print(f"  pooled: {values['pooled_ns_per_packet']} ns, "
+              f"{values['pooled_bytes_allocated_per_packet']} bytes allocated per packet")
+        if 'template_ns_per_packet' in values:
+            print(f"  template: {values['template_ns_per_packet']} ns, "
+                  f"{values['template_bytes_allocated_per_packet']} bytes allocated per packet")
+
+    output = save_results('packets', args, params, results)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+DHCP storm benchmark for Termux PXE Boot
+Compares what one flooded or retransmitted request costs with and without the StormGuard, as JSON
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from termux_pxe_boot import TermuxPXEServer
+from pxe.dhcp import MAGIC_COOKIE, DHCPDISCOVER
+from pxe.dhcp.storm import StormGuard
+from benchmarks.common import add_output_arguments, save_results
+
+
+class NullSocket:
+    """Stands in for the DHCP socket and counts replies"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def sendto(self, data, addr):
+        self.sent += 1
+
+
+def _discover(index):
+    """A PXE DISCOVER from a distinct client"""
+    packet = bytearray(240)
+    packet[0:4] = b'\x01\x01\x06\x00'
+    packet[4:8] = index.to_bytes(4, 'big')
+    packet[28:34] = b'\x52\x54' + index.to_bytes(4, 'big')
+    packet[236:240] = MAGIC_COOKIE
+    return memoryview(bytes(packet) + bytes([53, 1, DHCPDISCOVER]) + b'\x3c\x09PXEClient\xff')
+
+
+def _timed(operation, count):
+    """Run operation(i) for i in range(count); return microseconds per call"""
+    started = time.perf_counter()
+    for i in range(count):
+        operation(i)
+    return round((time.perf_counter() - started) / count * 1e6, 3)
+
+
+def run_benchmark(requests=20000, clients=200):
+    """Time the handler against the guard's drop, cached-reply and pass paths"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = NullSocket()
+    discovers = [_discover(i) for i in range(clients)]
+    results = {}
+
+    # Without the guard every copy runs the handler and its logging (to a scratch directory)
+    with tempfile.TemporaryDirectory() as logs, open(os.devnull, 'w') as devnull:
+        server.logs_dir = logs
+        with contextlib.redirect_stdout(devnull):
+            results['handler_us'] = _timed(lambda i: server._handle_dhcp(discovers[i % clients],
+                                                                        ('0.0.0.0', 68)), requests // 10)
+
+    # Generous limits, so every retransmit is answered from the cache
+    guard = StormGuard(rate=1e9, burst=1e9, global_rate=1e9, global_burst=1e9)
+    results['pass_us'] = _timed(lambda i: guard.screen(discovers[i], server.dhcp_socket), clients)
+    for discover in discovers:
+        guard.remember(discover, bytes(300), ('255.255.255.255', 68))
+    results['cached_reply_us'] = _timed(lambda i: guard.screen(discovers[i % clients], server.dhcp_socket),
+                                        requests)
+
+    # One looping client with the default limits: everything past its burst is dropped
+    guard = StormGuard()
+    flood = discovers[0]
+    results['flood_drop_us'] = _timed(lambda i: guard.screen(flood, server.dhcp_socket), requests)
+    stats = guard.get_stats()
+    results['flood_passed'] = stats['screened'] - stats['client_drops'] - stats['global_drops']
+    results['flood_dropped'] = stats['client_drops'] + stats['global_drops']
+    return results
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="DHCP storm suppression benchmark")
+    parser.add_argument('--requests', type=int, default=20000, help="datagrams per measurement")
+    parser.add_argument('--clients', type=int, default=200, help="distinct client MACs")
+    add_output_arguments(parser, 'storm')
+    args = parser.parse_args()
+
+    params = {'requests': args.requests, 'clients': args.clients}
+    print(f"DHCP storm benchmark: {args.requests} datagrams, {args.clients} clients")
+    results = run_benchmark(**params)
+    for name, value in results.items():
+        print(f"  {name + ':':26} {value}")
+
+    output = save_results('storm', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+TFTP throughput benchmark for Termux PXE Boot
+Runs the shared TFTP engine on loopback against N simulated PXE clients
+and records MB/s, transfer time percentiles, retransmits and server CPU as JSON
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+# Run from a checkout without installing
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pxe.tftp import TFTPEngine
+from benchmarks.common import add_output_arguments, save_results, percentile
+
+# Client-side ACK timer and how many silent periods it tolerates
+CLIENT_TIMEOUT = 1.0
+CLIENT_RETRIES = 10
+
+
+def _ack(block):
+    """Build an ACK packet"""
+    return struct.pack('>HH', 4, block & 0xFFFF)
+
+
+def _rrq(filename, options):
+    """Build an RRQ packet with RFC 2347 options"""
+    packet = struct.pack('>H', 1) + filename.encode() + b'\x00octet\x00'
+    for name, value in options.items():
+        packet += name.encode() + b'\x00' + str(value).encode() + b'\x00'
+    return packet
+
+
+def run_client(port, filename, blksize, windowsize, loss, rng):
+    """Download one file the way a PXE ROM does
+
+    Incoming DATA is dropped with probability loss. The client ACKs at
+    the end of each window and re-ACKs its last in-order block as soon
+    as it sees a gap; an RRQ that goes unanswered is sent again, as
+    PXE ROMs do. Returns (bytes, seconds).
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(CLIENT_TIMEOUT)
+    options = {'blksize': blksize, 'tsize': 0}
+    if windowsize > 1:
+        options['windowsize'] = windowsize
+
+    started = time.perf_counter()
+    server = None
+    expected = 1
+    since_ack = 0
+    size = 0
+    timeouts = 0
+
+    request = _rrq(filename, options)
+    try:
+        sock.sendto(request, ('127.0.0.1', port))
+        while True:
+            try:
+                packet, addr = sock.recvfrom(65536)
+            except socket.timeout:
+                timeouts += 1
+                if timeouts > CLIENT_RETRIES:
+                    raise IOError("transfer timed out")
+                if server is None:
+                    # No OACK or DATA yet: the request itself may be queued or lost
+                    sock.sendto(request, ('127.0.0.1', port))
+                else:
+                    sock.sendto(_ack(expected - 1), server)
+                continue
+
+            opcode = struct.unpack('>H', packet[:2])[0]
+            if opcode == 5:
+                raise IOError(packet[4:-1].decode(errors='ignore'))
+            if opcode == 6:
+                server = addr
+                sock.sendto(_ack(0), server)
+                continue
+            if opcode != 3:
+                continue
+
+            server = addr
+            if loss and rng.random() < loss:
+                continue
+            timeouts = 0
+
+            block = struct.unpack('>H', packet[2:4])[0]
+            if block != expected & 0xFFFF:
+                # Gap or duplicate: tell the server where we are
+                sock.sendto(_ack(expected - 1), server)
+                since_ack = 0
+                continue
+
+            size += len(packet) - 4
+            expected += 1
+            since_ack += 1
+            last = len(packet) - 4 < blksize
+            if last or since_ack >= windowsize:
+                sock.sendto(_ack(block), server)
+                since_ack = 0
+            if last:
+                return size, time.perf_counter() - started
+    finally:
+        sock.close()
+
+
+def run_benchmark(clients=10, size_kb=1024, blksize=1432, windowsize=8, loss=0.0,
+                  rate_limit_kb=0, seed=1):
+    """Serve one file to N concurrent clients and return the measurements"""
+    root = tempfile.mkdtemp(prefix='tftp_bench_')
+    with open(os.path.join(root, 'bench.bin'), 'wb') as f:
+        f.write(os.urandom(size_kb * 1024))
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    port = listen_socket.getsockname()[1]
+
+    retransmits = []
+    engine = TFTPEngine.from_config(listen_socket, [root], {
+        'tftp_rate_limit_kb': rate_limit_kb,
+        'tftp_max_transfers': max(clients, 1)
+    }, hooks={
+        'complete': lambda stats: retransmits.append(stats['retransmits']),
+        'abort': lambda stats, reason: retransmits.append(stats['retransmits'])
+    })
+
+    server_cpu = {}
+
+    def serve():
+        cpu_started = time.thread_time()
+        engine.run()
+        server_cpu['seconds'] = time.thread_time() - cpu_started
+
+    server_thread = threading.Thread(target=serve, daemon=True)
+    server_thread.start()
+
+    durations = []
+    failures = []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed + index)
+        try:
+            size, seconds = run_client(port, 'bench.bin', blksize, windowsize, loss, rng)
+            with lock:
+                durations.append(seconds)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    # Let the engine account the last final ACKs before stopping it
+    for _ in range(100):
+        if len(retransmits) >= clients:
+            break
+        time.sleep(0.01)
+    engine.stop()
+    server_thread.join(timeout=5)
+    listen_socket.close()
+    shutil.rmtree(root)
+
+    total_bytes = len(durations) * size_kb * 1024
+    return {
+        'clients_completed': len(durations),
+        'clients_failed': len(failures),
+        'failures': failures[:10],
+        'wall_seconds': round(wall, 4),
+        'throughput_mb_s': round(total_bytes / wall / 1e6, 3) if wall else None,
+        'transfer_p50_seconds': percentile(durations, 0.50),
+        'transfer_p99_seconds': percentile(durations, 0.99),
+        'retransmits': sum(retransmits),
+        'server_cpu_seconds': round(server_cpu.get('seconds', 0.0), 4),
+        'server_cpu_percent': round(100 * server_cpu.get('seconds', 0.0) / wall, 1) if wall else None
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Loopback TFTP throughput benchmark")
+    parser.add_argument('--clients', type=int, default=10, help="concurrent simulated clients")
+    parser.add_argument('--size-kb', type=int, default=1024, help="size of the served file in KiB")
+    parser.add_argument('--blksize', type=int, default=1432, help="requested blksize")
+    parser.add_argument('--windowsize', type=int, default=8, help="requested windowsize (1 = lockstep)")
+    parser.add_argument('--loss', type=float, default=0.0, help="fraction of DATA packets each client drops")
+    parser.add_argument('--rate-limit-kb', type=int, default=0, help="server rate cap in KiB/s (0 = none)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for simulated loss")
+    add_output_arguments(parser, 'tftp')
+    args = parser.parse_args()
+
+    params = {
+        'clients': args.clients,
+        'size_kb': args.size_kb,
+        'blksize': args.blksize,
+        'windowsize': args.windowsize,
+        'loss': args.loss,
+        'rate_limit_kb': args.rate_limit_kb,
+        'seed': args.seed
+    }
+
+    print(f"TFTP benchmark: {args.clients} clients x {args.size_kb} KiB, "
+          f"blksize {args.blksize}, window {args.windowsize}, loss {args.loss:.1%}")
+    results = run_benchmark(**params)
+
+    print(f"  Throughput:      {results['throughput_mb_s']} MB/s")
+    print(f"  Transfer p50:    {results['transfer_p50_seconds']} s")
+    print(f"  Transfer p99:    {results['transfer_p99_seconds']} s")
+    print(f"  Retransmits:     {results['retransmits']}")
+    print(f"  Server CPU:      {results['server_cpu_seconds']} s ({results['server_cpu_percent']}%)")
+    print(f"  Completed/failed: {results['clients_completed']}/{results['clients_failed']}")
+
+    output = save_results('tftp', args, params, results)
+    print(f"  Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
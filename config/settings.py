@@ -6,21 +6,25 @@ import json
 import os
 from pathlib import Path
 
+def config_directory():
+    """Per-user directory for the configuration and server state"""
+    import platform
+    system = platform.system()
+    
+    if system == "Linux" and os.path.exists("/data/data/com.termux/files/home"):
+        # Termux on Android
+        return os.path.expanduser("~/.termux_pxe_boot")
+    elif system == "Darwin":  # macOS
+        return os.path.expanduser("~/Library/Application Support/termux-pxe-boot")
+    elif system == "Windows":
+        return os.path.join(os.path.expandvars("%APPDATA%"), "termux-pxe-boot")
+    else:  # Default Linux/Unix
+        return os.path.expanduser("~/.config/termux-pxe-boot")
+
 class Settings:
     def __init__(self):
         # Cross-platform config directory detection
-        import platform
-        system = platform.system()
-        
-        if system == "Linux" and os.path.exists("/data/data/com.termux/files/home"):
-            # Termux on Android
-            self.config_dir = os.path.expanduser("~/.termux_pxe_boot")
-        elif system == "Darwin":  # macOS
-            self.config_dir = os.path.expanduser("~/Library/Application Support/termux-pxe-boot")
-        elif system == "Windows":
-            self.config_dir = os.path.join(os.path.expandvars("%APPDATA%"), "termux-pxe-boot")
-        else:  # Default Linux/Unix
-            self.config_dir = os.path.expanduser("~/.config/termux-pxe-boot")
+        self.config_dir = config_directory()
             
         self.config_file = os.path.join(self.config_dir, "config.json")
         self.default_config = {
@@ -62,6 +66,12 @@ class Settings:
             "tftp_port": 69,
             "dhcp_port": 67,
             "boot_timeout": 30,
+            "tftp_cache_mb": 128,
+            "tftp_multicast": False,
+            "tftp_rate_limit_kb": 0,
+            "tftp_max_transfers": 32,
+            "tftp_max_queued": 64,
+            "tftp_prewarm": True,
             "auto_install": True,
             
             # Development tools
@@ -272,6 +282,8 @@ class Settings:
             errors.append("TFTP port must be between 1024 and 65535")
         if config.get('dhcp_port', 67) < 1024 or config.get('dhcp_port', 67) > 65535:
             errors.append("DHCP port must be between 1024 and 65535")
+        if any(not weight > 0 for weight in config.get('tftp_client_weights', {}).values()):
+            errors.append("TFTP client weights must be positive")
             
         return errors
         
@@ -0,0 +1,81 @@
+"""
+Receive buffer pool for Termux PXE Boot
+Fixed-size reusable buffers filled with recvfrom_into instead of a new bytes per datagram
+"""
+import threading
+
+# A full Ethernet frame: DHCP requests with long option lists are never cut short
+DHCP_BUFFER_SIZE = 1500
+# Buffers kept for DHCP handlers running at the same time
+DHCP_BUFFERS = 32
+
+
+class BufferPool:
+    """Reusable receive buffers shared by one socket's handlers
+
+    recvfrom() fills a free buffer with recvfrom_into and returns a
+    memoryview of just the received bytes; parsers read it in place.
+    The handler hands it back with release() once it no longer needs
+    the data. A buffer that slices of the view still point into is
+    left to them rather than pooled, so a later datagram can never
+    overwrite what a handler kept; copy with bytes() to avoid that.
+    When every buffer is in use a temporary one is allocated, so a
+    burst never blocks the receive loop; it is dropped instead of
+    pooled on release.
+    """
+
+    def __init__(self, size, count):
+        self.size = size
+        self.count = count
+        self.free = [bytearray(size) for _ in range(count)]
+        self.lock = threading.Lock()
+
+        self.received = 0
+        self.overflows = 0
+        self.retained = 0
+
+    def recvfrom(self, sock):
+        """Receive one datagram; returns (memoryview, addr)"""
+        with self.lock:
+            if self.free:
+                buffer = self.free.pop()
+            else:
+                buffer = bytearray(self.size)
+                self.overflows += 1
+        try:
+            nbytes, addr = sock.recvfrom_into(buffer)
+        except BaseException:
+            self._put(buffer)
+            raise
+        self.received += 1
+        return memoryview(buffer)[:nbytes], addr
+
+    def release(self, data):
+        """Return the buffer behind a view from recvfrom()"""
+        buffer = data.obj
+        data.release()
+        try:
+            # A bytearray refuses to resize while any view of it is alive
+            buffer.append(0)
+        except BufferError:
+            self.retained += 1
+            return
+        del buffer[-1]
+        self._put(buffer)
+
+    def get_stats(self):
+        """Return pool counters"""
+        return {
+            'buffer_size': self.size,
+            'buffers': self.count,
+            'free': len(self.free),
+            'received': self.received,
+            'overflows': self.overflows,
+            'retained': self.retained
+        }
+
+    def _put(self, buffer):
+        """Put a buffer back unless the pool is already full"""
+        with self.lock:
+            if len(self.free) < self.count:
+                self.free.append(buffer)
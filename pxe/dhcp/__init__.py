@@ -0,0 +1,17 @@
+"""
+DHCP components for Termux PXE Boot
+Packet layouts and helpers shared by the DHCP servers
+"""
+from pxe.dhcp.packet import (
+    BOOTREQUEST, BOOTREPLY, BROADCAST_FLAG, MAGIC_COOKIE, BOOTP_HEADER, ZERO_IP,
+    DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPDECLINE, DHCPACK, DHCPNAK, DHCPRELEASE, DHCPINFORM,
+    ReplyBuffer, reply_buffer
+)
+from pxe.dhcp.options import DHCPOptions, parse_options, find_option, message_type, peek_message_type
+from pxe.dhcp.batch import DHCPBatcher
+from pxe.dhcp.dora import TransactionTable
+from pxe.dhcp.leases import LeasePool
+from pxe.dhcp.journal import LeaseJournal
+from pxe.dhcp.templates import ReplyTemplate, ReplyTemplates
+from pxe.dhcp.bootfile import BootFileSelector
+from pxe.dhcp.storm import StormGuard
@@ -0,0 +1,103 @@
+"""
+DHCP receive batching for Termux PXE Boot
+Drains every queued request per wakeup and hands the batch to a fixed worker pool
+"""
+import select
+from concurrent.futures import ThreadPoolExecutor
+
+from pxe.dhcp.packet import DHCPDISCOVER
+from pxe.dhcp.options import peek_message_type
+
+# Threads answering requests; a boot storm queues work instead of adding threads
+DHCP_WORKERS = 4
+# Most datagrams taken from the socket in one wakeup
+DHCP_BATCH_LIMIT = 32
+# Longest wait for a request, so the server loop can notice a stop
+POLL_TIMEOUT = 1.0
+
+
+class DHCPBatcher:
+    """Receive loop step that drains the socket and fans requests out
+
+    The socket is switched to non-blocking mode. poll() sleeps in select
+    until a datagram is queued, then reads until the socket is empty or
+    limit is hit, so a storm costs one wakeup per batch.
+
+    Retransmitted DISCOVERs with the same chaddr and xid in one batch
+    are answered once. With a StormGuard, every datagram is screened
+    first and only what it lets through is queued for a worker. handler(data, addr) runs on the worker pool with
+    a pooled memoryview; the buffer goes back to the pool afterwards.
+    """
+
+    def __init__(self, sock, handler, pool, workers=DHCP_WORKERS, limit=DHCP_BATCH_LIMIT, guard=None):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.handler = handler
+        self.pool = pool
+        self.limit = limit
+        self.guard = guard
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dhcp')
+
+        self.batches = 0
+        self.datagrams = 0
+        self.duplicates = 0
+        self.screened_out = 0
+        self.largest_batch = 0
+
+    def poll(self, timeout=POLL_TIMEOUT):
+        """Receive and dispatch one batch; returns the number of datagrams read"""
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return 0
+
+        batch = []
+        while len(batch) < self.limit:
+            try:
+                batch.append(self.pool.recvfrom(self.sock))
+            except OSError:
+                # Empty (EAGAIN) or a stray ICMP error; either way the batch ends
+                break
+        if not batch:
+            return 0
+
+        self.batches += 1
+        self.datagrams += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        seen = set()
+        guard = self.guard
+        for data, addr in batch:
+            if guard is not None and guard.screen(data, self.sock):
+                # Dropped by a rate limit or answered from the reply cache
+                self.screened_out += 1
+                self.pool.release(data)
+                continue
+            if len(data) >= 240 and peek_message_type(data) == DHCPDISCOVER:
+                key = (bytes(data[4:8]), bytes(data[28:44]))
+                if key in seen:
+                    self.duplicates += 1
+                    self.pool.release(data)
+                    continue
+                seen.add(key)
+            self.executor.submit(self._run, data, addr)
+        return len(batch)
+
+    def stop(self):
+        """Stop the workers once queued requests are handled"""
+        self.executor.shutdown(wait=False)
+
+    def get_stats(self):
+        """Return batching counters"""
+        return {
+            'batches': self.batches,
+            'datagrams': self.datagrams,
+            'duplicates_collapsed': self.duplicates,
+            'screened_out': self.screened_out,
+            'largest_batch': self.largest_batch
+        }
+
+    def _run(self, data, addr):
+        """Run the handler on a worker and return the buffer"""
+        try:
+            self.handler(data, addr)
+        finally:
+            self.pool.release(data)
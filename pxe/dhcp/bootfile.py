@@ -0,0 +1,147 @@
+"""
+DHCP boot file selection for Termux PXE Boot
+Picks each client's loader from its architecture (option 93), network interface (94) and UUID (97)
+"""
+import threading
+import uuid
+
+from pxe.dhcp.options import OPTION_VENDOR_CLASS, OPTION_CLIENT_ARCH
+
+OPTION_CLIENT_NDI = 94
+OPTION_USER_CLASS = 77
+OPTION_CLIENT_UUID = 97
+
+# Client system architectures (RFC 4578, IANA "Processor Architecture Types")
+ARCH_BIOS = 0
+ARCH_EFI_IA32 = 6
+ARCH_EFI_BC = 7
+ARCH_EFI_X64 = 9
+ARCH_EFI_ARM64 = 11
+ARCH_HTTP_IA32 = 15
+ARCH_HTTP_X64 = 16
+ARCH_HTTP_ARM64 = 19
+HTTP_ARCHES = (ARCH_HTTP_IA32, ARCH_HTTP_X64, ARCH_HTTP_ARM64)
+
+DEFAULT_BOOT_FILE = 'pxelinux.0'
+# Port of the server's HTTP file server
+DEFAULT_HTTP_PORT = 8080
+# Loader per architecture; '{server_ip}' and '{http_port}' are filled in for HTTP boot URLs
+DEFAULT_BOOT_FILES = {
+    ARCH_BIOS: 'pxelinux.0',
+    ARCH_EFI_IA32: 'ipxe-i386.efi',
+    ARCH_EFI_BC: 'snponly.efi',
+    ARCH_EFI_X64: 'ipxe.efi',
+    ARCH_EFI_ARM64: 'ipxe-arm64.efi',
+    ARCH_HTTP_IA32: 'http://{server_ip}:{http_port}/ipxe-i386.efi',
+    ARCH_HTTP_X64: 'http://{server_ip}:{http_port}/ipxe.efi',
+    ARCH_HTTP_ARM64: 'http://{server_ip}:{http_port}/ipxe-arm64.efi'
+}
+# iPXE identifies itself with user class "iPXE"; it gets the menu, not the loader again
+IPXE_USER_CLASS = b'iPXE'
+DEFAULT_IPXE_SCRIPT = 'ipxe.cfg'
+# Clients whose decision is remembered
+BOOT_CACHE_SIZE = 4096
+
+_ARCH_VENDOR_PREFIX = b'PXEClient:Arch:'
+
+
+class BootFileSelector:
+    """The boot file for each client, from a configurable architecture table
+
+    The architecture comes from option 93; ROMs that leave it out are
+    recognised by the Arch field of their vendor class or, failing
+    that, a UNDI 3.x interface in option 94 (UEFI). overrides map a
+    client's MAC or SMBIOS UUID (option 97) to a boot file for that one
+    machine; iPXE, once loaded, is sent the script instead of being
+    chainloaded again. HTTP boot architectures missing from the table
+    get the x64 HTTP entry rather than a TFTP loader. Decisions are cached
+    per MAC together with the raw options they were made from, so a
+    repeat boot is a dict lookup and a compare, with no option decoding.
+    """
+
+    def __init__(self, boot_files=None, default=DEFAULT_BOOT_FILE, overrides=None,
+                 ipxe_script=DEFAULT_IPXE_SCRIPT, server_ip='', http_port=DEFAULT_HTTP_PORT,
+                 cache_size=BOOT_CACHE_SIZE):
+        table = DEFAULT_BOOT_FILES if boot_files is None else boot_files
+        fields = {'server_ip': server_ip, 'http_port': http_port}
+        self.boot_files = {int(arch): name.format(**fields) for arch, name in table.items()}
+        self.default = default.format(**fields)
+        self.http_default = self.boot_files.get(ARCH_HTTP_X64, self.default)
+        self.overrides = {key.lower(): name.format(**fields) for key, name in (overrides or {}).items()}
+        self.ipxe_script = ipxe_script.format(**fields)
+        self.cache_size = cache_size
+        self.cache = {}     # mac -> (options 93/60/94/77 as bytes, boot file)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def select(self, mac, options):
+        """Boot file name or URL for a client's request"""
+        # Everything the decision depends on besides the MAC and UUID (memoryview
+        # slices compare equal to the bytes kept in the cache)
+        user_class = options.get(OPTION_USER_CLASS)
+        signature = (options.get(OPTION_CLIENT_ARCH), options.get(OPTION_VENDOR_CLASS),
+                     options.get(OPTION_CLIENT_NDI), user_class)
+        cached = self.cache.get(mac)
+        if cached is not None and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+
+        self.lookups += 1
+        arch = client_arch(options)
+        ipxe = user_class is not None and bytes(user_class) == IPXE_USER_CLASS
+        boot_file = self.overrides.get(mac.lower())
+        if boot_file is None:
+            boot_file = self.overrides.get(client_uuid(options) or '')
+        if boot_file is None:
+            if ipxe:
+                boot_file = self.ipxe_script
+            else:
+                boot_file = self.boot_files.get(arch)
+                if boot_file is None:
+                    boot_file = self.http_default if arch in HTTP_ARCHES else self.default
+
+        with self.lock:
+            if len(self.cache) >= self.cache_size and mac not in self.cache:
+                # Oldest decision out first
+                del self.cache[next(iter(self.cache))]
+            self.cache[mac] = (tuple(None if value is None else bytes(value) for value in signature),
+                               boot_file)
+        return boot_file
+
+    def get_stats(self):
+        """Return selection counters"""
+        return {'cached_clients': len(self.cache), 'cache_hits': self.hits, 'lookups': self.lookups}
+
+
+def client_arch(options):
+    """Client architecture from option 93, the vendor class or option 94"""
+    arch = options.client_arch
+    if arch is not None:
+        return arch
+    vendor = options.get(OPTION_VENDOR_CLASS)
+    if vendor is not None:
+        vendor = bytes(vendor)
+        if vendor.startswith(_ARCH_VENDOR_PREFIX):
+            digits = vendor[len(_ARCH_VENDOR_PREFIX):len(_ARCH_VENDOR_PREFIX) + 5]
+            if digits.isdigit():
+                return int(digits)
+    ndi = options.get(OPTION_CLIENT_NDI)
+    if ndi is not None and len(ndi) == 3 and ndi[0] == 1 and ndi[1] >= 3:
+        # UNDI 3.x only exists in UEFI firmware
+        return ARCH_EFI_BC
+    return ARCH_BIOS
+
+
+def client_uuid(options):
+    """SMBIOS UUID from option 97 in the form dmidecode prints, or None"""
+    value = options.get(OPTION_CLIENT_UUID)
+    if value is None or len(value) != 17 or value[0] != 0:
+        return None
+    # The first three fields are little-endian on the wire, as in SMBIOS
+    return str(uuid.UUID(bytes_le=bytes(value[1:])))
+
+
+def is_http_boot(boot_file):
+    """Whether a boot file is a UEFI HTTP boot URL"""
+    return boot_file.startswith(('http://', 'https://'))
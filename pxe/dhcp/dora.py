@@ -0,0 +1,151 @@
+"""
+DHCP transactions for Termux PXE Boot
+Per-xid DISCOVER/OFFER/REQUEST/ACK state and the server's answer to each message (RFC 2131)
+"""
+import threading
+import time
+
+from pxe.dhcp.leases import BOUND
+
+# Seconds an OFFER is held for the client's REQUEST
+OFFER_TIMEOUT = 60.0
+
+# Answers to a REQUEST
+ACK = 'ack'
+NAK = 'nak'
+
+
+class Transaction:
+    """One client exchange, keyed by (xid, chaddr)"""
+
+    def __init__(self, xid, mac, address):
+        self.xid = xid
+        self.mac = mac
+        self.address = address
+        self.created = time.monotonic()
+
+
+class TransactionTable:
+    """Exchange state for every client between DISCOVER and ACK
+
+    discover() reserves an address in the lease pool and records it for
+    the xid; request() decides whether a REQUEST gets an ACK, a NAK or
+    no answer, following the client states of RFC 2131 section 4.3.2
+    (SELECTING, INIT-REBOOT, RENEWING/REBINDING). Acknowledged addresses
+    are bound in the pool; RELEASE and DECLINE hand them back. Safe to
+    call from several handler threads.
+    """
+
+    def __init__(self, pool, timeout=OFFER_TIMEOUT):
+        self.pool = pool
+        self.timeout = timeout
+        self.transactions = {}
+        self.lock = threading.Lock()
+
+        self.counters = {
+            'discovers': 0, 'requests': 0, 'acks': 0, 'naks': 0,
+            'ignored': 0, 'releases': 0, 'declines': 0, 'expired': 0
+        }
+
+    def discover(self, xid, mac, requested=None):
+        """Pick the address to OFFER the client; None when the pool is full"""
+        address = self.pool.offer(mac, requested)
+        with self.lock:
+            self._expire()
+            self.counters['discovers'] += 1
+            # Re-insert so the table stays in creation order for _expire()
+            self.transactions.pop((xid, mac), None)
+            if address is not None:
+                self.transactions[(xid, mac)] = Transaction(xid, mac, address)
+        return address
+
+    def request(self, xid, mac, requested, server_id, ciaddr, our_id):
+        """Decide the answer to a REQUEST; returns (ACK or NAK or None, address)
+
+        requested is option 50, server_id option 54 and ciaddr the
+        client's current address, all as dotted strings or None.
+        """
+        with self.lock:
+            self._expire()
+            self.counters['requests'] += 1
+            transaction = self.transactions.get((xid, mac))
+            binding = self.pool.lookup(mac)
+
+            if server_id is not None:
+                # SELECTING: the client picked one of the offers it got
+                if server_id != our_id:
+                    self.transactions.pop((xid, mac), None)
+                    if transaction:
+                        self.pool.release(mac, transaction.address)
+                    return self._answer(None, None)
+                offered = transaction.address if transaction else binding
+                if requested is not None and requested == offered:
+                    return self._bind(xid, mac, offered)
+                # The client restarts from DISCOVER with a new xid
+                self.transactions.pop((xid, mac), None)
+                return self._answer(NAK, None)
+
+            if requested is not None:
+                # INIT-REBOOT: the client wants to keep a remembered address
+                if binding is None:
+                    return self._answer(None, None)
+                if requested == binding:
+                    return self._bind(xid, mac, binding)
+                return self._answer(NAK, None)
+
+            if ciaddr is not None:
+                # RENEWING/REBINDING: extend the address in ciaddr
+                if binding is None:
+                    return self._answer(None, None)
+                if ciaddr == binding:
+                    return self._bind(xid, mac, binding)
+                return self._answer(NAK, None)
+
+            return self._answer(None, None)
+
+    def release(self, mac, address):
+        """The client gave its address back (DHCPRELEASE)"""
+        with self.lock:
+            self.counters['releases'] += 1
+        self.pool.release(mac, address)
+
+    def decline(self, mac, address):
+        """The client found address already in use (DHCPDECLINE)"""
+        with self.lock:
+            self.counters['declines'] += 1
+        self.pool.decline(mac, address)
+
+    def binding(self, mac):
+        """The address bound to a client, or None"""
+        return self.pool.lookup(mac, BOUND)
+
+    def get_stats(self):
+        """Return transaction counters"""
+        with self.lock:
+            stats = dict(self.counters)
+            stats['pending'] = len(self.transactions)
+        return stats
+
+    def _bind(self, xid, mac, address):
+        """ACK an address if the pool lets the client have it, else NAK"""
+        self.transactions.pop((xid, mac), None)
+        if not self.pool.bind(mac, address):
+            return self._answer(NAK, None)
+        return self._answer(ACK, address)
+
+    def _answer(self, verdict, address):
+        """Count a verdict and return it"""
+        self.counters['acks' if verdict == ACK else 'naks' if verdict == NAK else 'ignored'] += 1
+        return verdict, address
+
+    def _expire(self):
+        """Drop OFFERs the client never followed up"""
+        cutoff = time.monotonic() - self.timeout
+        stale = []
+        for key, transaction in self.transactions.items():
+            if transaction.created >= cutoff:
+                break
+            stale.append(key)
+        for key in stale:
+            del self.transactions[key]
+        self.counters['expired'] += len(stale)
@@ -0,0 +1,237 @@
+"""
+DHCP lease journal for Termux PXE Boot
+Append-only binary log of lease changes with batched fsync, compacted into a snapshot
+"""
+import os
+import struct
+import threading
+import time
+
+from pxe.dhcp.leases import OFFERED, BOUND
+
+SNAPSHOT_FILE = 'leases.snapshot'
+JOURNAL_FILE = 'leases.journal'
+# Every file starts with this; a different format is ignored instead of misread
+FILE_MAGIC = b'PXELEAS1'
+
+# op, MAC length, MAC text, IPv4 address, expiry (epoch seconds)
+RECORD = struct.Struct('!BB48sId')
+OP_OFFER = 1
+OP_BIND = 2
+OP_FREE = 3
+
+# Seconds between fsyncs, and queued records that force one sooner
+FLUSH_INTERVAL = 1.0
+FLUSH_RECORDS = 256
+# Journal records before it is folded into a fresh snapshot
+COMPACT_RECORDS = 20000
+
+STATE_OPS = {OFFERED: OP_OFFER, BOUND: OP_BIND}
+OP_STATES = {OP_OFFER: OFFERED, OP_BIND: BOUND}
+
+
+class LeaseJournal:
+    """Lease changes kept on disk so a restart remembers every assignment
+
+    The pool calls save() and drop() under its own lock; they only queue
+    a fixed-size record in memory. A background thread appends the queue
+    to the journal and fsyncs once per interval (or as soon as enough
+    records are waiting), so a burst of DORA exchanges costs one fsync,
+    not one per packet. When the journal grows past a limit the live
+    leases are written to a snapshot, renamed into place, and the journal
+    starts over. load() reads the snapshot and then the journal with
+    struct.iter_unpack; a torn record at the end of the journal from a
+    crash is ignored.
+    """
+
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL, flush_records=FLUSH_RECORDS,
+                 compact_records=COMPACT_RECORDS):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.compact_records = compact_records
+
+        self.pending = bytearray()
+        self.pending_records = 0
+        self.journal_records = 0
+        self.fd = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.checkpoint = None
+
+        self.stats = {
+            'replayed': 0, 'replay_ms': 0.0, 'records': 0,
+            'flushes': 0, 'compactions': 0, 'errors': 0
+        }
+
+    def load(self):
+        """Replay the snapshot and journal; returns [(mac, state, address, expires)]
+
+        address is the IPv4 address as an integer. Opens the journal for
+        appending, so call it once before the first save().
+        """
+        started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        latest = {}
+        replayed = 0
+        for path in (self.snapshot_path, self.journal_path):
+            records = _read_records(path)
+            replayed += len(records) // RECORD.size
+            # Keyed by the raw MAC field; only the survivors are decoded
+            for op, length, mac, address, expires in RECORD.iter_unpack(records):
+                if op == OP_FREE:
+                    if mac in latest and latest[mac][2] == address:
+                        del latest[mac]
+                elif op in OP_STATES:
+                    latest[mac] = (length, op, address, expires)
+
+        self.journal_records = len(records) // RECORD.size
+        self._open_journal(truncate=not records and not _has_magic(self.journal_path))
+        # Appending after a torn record would misalign everything behind it
+        os.ftruncate(self.fd, len(FILE_MAGIC) + len(records))
+        self.stats['replayed'] = replayed
+        self.stats['replay_ms'] = round((time.perf_counter() - started) * 1e3, 3)
+        return [(mac[:length].decode('ascii'), OP_STATES[op], address, expires)
+                for mac, (length, op, address, expires) in latest.items()]
+
+    def save(self, mac, address, state, expires):
+        """Queue a lease the client now holds"""
+        self._queue(STATE_OPS[state], mac, address, expires)
+
+    def drop(self, mac, address):
+        """Queue a lease that ended"""
+        self._queue(OP_FREE, mac, address, 0.0)
+
+    def start(self, checkpoint):
+        """Flush in the background; checkpoint() returns the live leases for compaction
+
+        checkpoint must flush() this journal in the same critical section
+        that collects the leases, so the snapshot and journal agree.
+        """
+        self.checkpoint = checkpoint
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='lease-journal', daemon=True)
+        self.thread.start()
+
+    def flush(self):
+        """Append queued records to the journal and fsync it"""
+        with self.lock:
+            self._flush()
+
+    def compact(self, leases):
+        """Write leases as the new snapshot and empty the journal"""
+        data = bytearray(FILE_MAGIC)
+        for mac, state, address, expires in leases:
+            data += _pack(STATE_OPS[state], mac, address, expires)
+        temporary = self.snapshot_path + '.tmp'
+        with self.lock:
+            with open(temporary, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.snapshot_path)
+            self._open_journal(truncate=True)
+            self.journal_records = 0
+            self.stats['compactions'] += 1
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        if self.thread:
+            self.stopping.set()
+            self.wake.set()
+            self.thread.join(timeout=5)
+            self.thread = None
+        with self.lock:
+            self._flush()
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def get_stats(self):
+        """Return journal counters"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['journal_records'] = self.journal_records
+            stats['pending'] = self.pending_records
+        return stats
+
+    def _queue(self, op, mac, address, expires):
+        with self.lock:
+            self.pending += _pack(op, mac, address, expires)
+            self.pending_records += 1
+            self.stats['records'] += 1
+            due = self.pending_records >= self.flush_records
+        if due:
+            self.wake.set()
+
+    def _flush(self):
+        """Write and fsync the queue; caller holds the lock"""
+        if not self.pending or self.fd is None:
+            return
+        try:
+            os.write(self.fd, self.pending)
+            os.fsync(self.fd)
+        except OSError:
+            self.stats['errors'] += 1
+            return
+        self.journal_records += self.pending_records
+        self.pending.clear()
+        self.pending_records = 0
+        self.stats['flushes'] += 1
+
+    def _open_journal(self, truncate):
+        """(Re)open the journal for appending, optionally starting it over"""
+        if self.fd is not None:
+            os.close(self.fd)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if truncate:
+            flags |= os.O_TRUNC
+        self.fd = os.open(self.journal_path, flags, 0o600)
+        if truncate:
+            os.write(self.fd, FILE_MAGIC)
+            os.fsync(self.fd)
+
+    def _run(self):
+        """Background flusher; compacts once the journal is long enough"""
+        while not self.stopping.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+            if self.checkpoint and self.journal_records >= self.compact_records:
+                try:
+                    self.compact(self.checkpoint())
+                except OSError:
+                    self.stats['errors'] += 1
+
+
+def _pack(op, mac, address, expires):
+    """One journal record"""
+    encoded = mac.encode('ascii')
+    return RECORD.pack(op, len(encoded), encoded, address, expires)
+
+
+def _read_records(path):
+    """Whole records of a journal or snapshot file (empty if missing or foreign)"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return memoryview(b'')
+    if not data.startswith(FILE_MAGIC):
+        return memoryview(b'')
+    body = memoryview(data)[len(FILE_MAGIC):]
+    # A crash can leave half a record at the end
+    return body[:len(body) - len(body) % RECORD.size]
+
+
+def _has_magic(path):
+    """Whether a file exists and starts with FILE_MAGIC"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(FILE_MAGIC)) == FILE_MAGIC
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,313 @@
+"""
+DHCP lease pool for Termux PXE Boot
+Bitmap address allocation over the configured range, sticky MAC bindings and an expiry heap
+"""
+import heapq
+import ipaddress
+import threading
+import time
+
+DEFAULT_LEASE_TIME = 86400
+# Seconds an offered address is held for the client's REQUEST
+OFFER_HOLD = 60
+# Seconds an address a client DECLINEd stays out of the pool
+DECLINE_HOLD = 600
+
+OFFERED = 'offered'
+BOUND = 'bound'
+DECLINED = 'declined'
+
+
+class Lease:
+    """One address held for a client (or quarantined after a DECLINE)"""
+
+    __slots__ = ('mac', 'offset', 'state', 'expires')
+
+    def __init__(self, mac, offset, state, expires):
+        self.mac = mac
+        self.offset = offset
+        self.state = state
+        self.expires = expires
+
+
+class LeasePool:
+    """Addresses start..end as a bitmap of integer offsets
+
+    A set bit means the offset is held by a lease. Free offsets come
+    from a stack of released offsets or, failing that, a high-water mark
+    that walks the never-used part of the range, so allocation and
+    release are O(1) (amortized: offsets taken out of order by a sticky
+    or requested address are skipped when reached). Each MAC keeps the
+    offset it last held and gets it back while nobody else has taken
+    it. Expiries sit in a min-heap that is swept lazily whenever the
+    pool is used; renewed leases leave stale heap entries that are
+    skipped on the way out. Safe to call from several handler threads.
+    With a LeaseJournal attached every client lease change is also
+    queued to disk, and attach() brings back the leases of the last run.
+    """
+
+    def __init__(self, start, end, lease_time=DEFAULT_LEASE_TIME, offer_hold=OFFER_HOLD,
+                 exclude=(), clock=time.time):
+        self.base = int(ipaddress.IPv4Address(start))
+        self.size = int(ipaddress.IPv4Address(end)) - self.base + 1
+        if self.size <= 0:
+            raise ValueError(f"empty DHCP range {start} - {end}")
+        self.lease_time = lease_time
+        self.offer_hold = offer_hold
+        self.clock = clock
+
+        self.bitmap = bytearray((self.size + 7) // 8)
+        self.released = []
+        self.high_water = 0
+        self.in_use = 0
+
+        self.leases = {}        # offset -> Lease
+        self.by_mac = {}        # mac -> Lease
+        self.sticky = {}        # mac -> offset last held
+        self.expiries = []      # heap of (expires, offset)
+        self.lock = threading.Lock()
+
+        self.journal = None
+
+        self.expired = 0
+        self.exhausted = 0
+
+        # Addresses inside the range that must never be handed out
+        for address in exclude:
+            offset = self._offset(address)
+            if offset is not None and not self._is_set(offset):
+                self._set(offset)
+
+    def offer(self, mac, requested=None):
+        """Reserve an address for a client; returns it, or None if the pool is full
+
+        A client that holds a lease gets the same address again; otherwise
+        the requested address (option 50), then its sticky address, then
+        any free one.
+        """
+        with self.lock:
+            now = self.clock()
+            self._sweep(now)
+
+            lease = self.by_mac.get(mac)
+            if lease is not None:
+                if lease.state == OFFERED:
+                    self._schedule(lease, now + self.offer_hold)
+                return self._address(lease.offset)
+
+            offset = None
+            for candidate in (self._offset(requested), self.sticky.get(mac)):
+                if candidate is not None and not self._is_set(candidate):
+                    offset = candidate
+                    break
+            if offset is None:
+                offset = self._take_free()
+                if offset is None:
+                    self.exhausted += 1
+                    return None
+
+            self._set(offset)
+            self._add(Lease(mac, offset, OFFERED, 0), now + self.offer_hold)
+            return self._address(offset)
+
+    def bind(self, mac, address):
+        """Commit address to the client for a lease time; False if someone else holds it"""
+        offset = self._offset(address)
+        if offset is None:
+            return False
+        with self.lock:
+            now = self.clock()
+            self._sweep(now)
+
+            lease = self.leases.get(offset)
+            if lease is None:
+                if self._is_set(offset):
+                    # Excluded address
+                    return False
+                current = self.by_mac.get(mac)
+                if current is not None:
+                    self._free(current)
+                self._set(offset)
+                lease = Lease(mac, offset, BOUND, 0)
+                self._add(lease, now + self.lease_time)
+                return True
+            if lease.mac != mac:
+                return False
+            lease.state = BOUND
+            self._schedule(lease, now + self.lease_time)
+            return True
+
+    def release(self, mac, address):
+        """Give an address back early (DHCPRELEASE)"""
+        offset = self._offset(address)
+        with self.lock:
+            lease = self.leases.get(offset)
+            if lease is not None and lease.mac == mac:
+                self._free(lease)
+
+    def decline(self, mac, address):
+        """Quarantine an address the client found in use (DHCPDECLINE)"""
+        offset = self._offset(address)
+        if offset is None:
+            return
+        with self.lock:
+            now = self.clock()
+            lease = self.leases.get(offset)
+            if lease is not None:
+                if lease.mac != mac:
+                    return
+                self._free(lease)
+            elif self._is_set(offset):
+                return
+            if self.sticky.get(mac) == offset:
+                del self.sticky[mac]
+            self._set(offset)
+            self._add(Lease(None, offset, DECLINED, 0), now + DECLINE_HOLD)
+
+    def attach(self, journal):
+        """Restore the leases a LeaseJournal saved and record every change to it
+
+        Leases that ran out while the server was down are not restored,
+        but their clients keep their sticky addresses. Returns how many
+        leases are live again.
+        """
+        saved = journal.load()
+        restored = 0
+        with self.lock:
+            now = self.clock()
+            # Tens of thousands of leases: the bit and dict updates are inlined
+            bitmap, leases, by_mac, sticky = self.bitmap, self.leases, self.by_mac, self.sticky
+            expiries = self.expiries
+            for mac, state, address, expires in saved:
+                offset = address - self.base
+                if not 0 <= offset < self.size or mac in by_mac:
+                    continue
+                if bitmap[offset >> 3] & (1 << (offset & 7)):
+                    continue
+                sticky[mac] = offset
+                if expires > now:
+                    bitmap[offset >> 3] |= 1 << (offset & 7)
+                    by_mac[mac] = leases[offset] = Lease(mac, offset, state, expires)
+                    expiries.append((expires, offset))
+                    restored += 1
+            self.in_use += restored
+            heapq.heapify(expiries)
+            self.journal = journal
+        journal.start(self.checkpoint)
+        return restored
+
+    def checkpoint(self):
+        """Flush the journal and return every client lease, for its snapshot"""
+        with self.lock:
+            self.journal.flush()
+            return [(lease.mac, lease.state, self.base + lease.offset, lease.expires)
+                    for lease in self.leases.values() if lease.mac is not None]
+
+    def lookup(self, mac, state=None):
+        """Address the client holds (optionally only in the given state), or None"""
+        with self.lock:
+            self._sweep(self.clock())
+            lease = self.by_mac.get(mac)
+            if lease is None or (state is not None and lease.state != state):
+                return None
+            return self._address(lease.offset)
+
+    def holder(self, address):
+        """MAC holding an address and the lease state, or (None, None)"""
+        lease = self.leases.get(self._offset(address))
+        if lease is None:
+            return None, None
+        return lease.mac, lease.state
+
+    def __contains__(self, address):
+        return self._offset(address) is not None
+
+    def get_stats(self):
+        """Return pool counters"""
+        with self.lock:
+            self._sweep(self.clock())
+            states = {OFFERED: 0, BOUND: 0, DECLINED: 0}
+            for lease in self.leases.values():
+                states[lease.state] += 1
+            return {
+                'size': self.size,
+                'free': self.size - self.in_use,
+                'offered': states[OFFERED],
+                'bound': states[BOUND],
+                'declined': states[DECLINED],
+                'expired': self.expired,
+                'exhausted': self.exhausted
+            }
+
+    def _address(self, offset):
+        """Dotted-quad address of an offset"""
+        return str(ipaddress.IPv4Address(self.base + offset))
+
+    def _offset(self, address):
+        """Offset of an address inside the range, or None"""
+        if not address:
+            return None
+        try:
+            offset = int(ipaddress.IPv4Address(address)) - self.base
+        except ValueError:
+            return None
+        return offset if 0 <= offset < self.size else None
+
+    def _is_set(self, offset):
+        return self.bitmap[offset >> 3] & (1 << (offset & 7))
+
+    def _set(self, offset):
+        self.bitmap[offset >> 3] |= 1 << (offset & 7)
+        self.in_use += 1
+
+    def _clear(self, offset):
+        self.bitmap[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+        self.in_use -= 1
+
+    def _take_free(self):
+        """Pop a free offset, or None when every address is held"""
+        while self.released:
+            offset = self.released.pop()
+            if not self._is_set(offset):
+                return offset
+        while self.high_water < self.size:
+            offset = self.high_water
+            self.high_water += 1
+            if not self._is_set(offset):
+                return offset
+        return None
+
+    def _add(self, lease, expires):
+        """Track a new lease whose offset bit is already set"""
+        self.leases[lease.offset] = lease
+        if lease.mac is not None:
+            self.by_mac[lease.mac] = lease
+            self.sticky[lease.mac] = lease.offset
+        self._schedule(lease, expires)
+
+    def _schedule(self, lease, expires):
+        """Set a lease's expiry; the old heap entry becomes stale"""
+        lease.expires = expires
+        heapq.heappush(self.expiries, (expires, lease.offset))
+        if self.journal is not None and lease.mac is not None:
+            self.journal.save(lease.mac, self.base + lease.offset, lease.state, expires)
+
+    def _free(self, lease):
+        """Return a lease's offset to the pool"""
+        del self.leases[lease.offset]
+        if lease.mac is not None and self.by_mac.get(lease.mac) is lease:
+            del self.by_mac[lease.mac]
+        if self.journal is not None and lease.mac is not None:
+            self.journal.drop(lease.mac, self.base + lease.offset)
+        self._clear(lease.offset)
+        self.released.append(lease.offset)
+
+    def _sweep(self, now):
+        """Expire every lease whose time is up"""
+        expiries = self.expiries
+        while expiries and expiries[0][0] <= now:
+            expires, offset = heapq.heappop(expiries)
+            lease = self.leases.get(offset)
+            if lease is not None and lease.expires == expires:
+                self._free(lease)
+                self.expired += 1
@@ -0,0 +1,139 @@
+"""
+DHCP option parsing for Termux PXE Boot
+Single-pass TLV walk over a request into an option map shared by every DHCP server
+"""
+import socket
+
+from pxe.dhcp.packet import BOOTP_HEADER, OPTION_PAD, OPTION_END, OPTION_MESSAGE_TYPE
+
+OPTION_OVERLOAD = 52
+OPTION_VENDOR_CLASS = 60
+OPTION_CLIENT_ARCH = 93
+# Option 52 values: which BOOTP header fields hold more options
+OVERLOAD_FILE = 1
+OVERLOAD_SNAME = 2
+
+SNAME_FIELD = (44, 108)
+FILE_FIELD = (108, 236)
+PXE_VENDOR_CLASS = b'PXEClient'
+
+
+class DHCPOptions:
+    """The options of one DHCP message, indexed by code
+
+    Values are memoryview slices of the request (no copies) except for
+    options the client split into several parts, which are joined into
+    bytes (RFC 3396). Slices point into the receive buffer, so use the
+    map only while handling the request.
+    """
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def get(self, code, default=None):
+        """Value of an option, or default"""
+        return self.index.get(code, default)
+
+    def __getitem__(self, code):
+        return self.index[code]
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def message_type(self):
+        """Option 53, or None for plain BOOTP"""
+        value = self.index.get(OPTION_MESSAGE_TYPE)
+        return value[0] if value else None
+
+    @property
+    def is_pxe(self):
+        """Whether the vendor class (option 60) says PXEClient"""
+        value = self.index.get(OPTION_VENDOR_CLASS)
+        return value is not None and bytes(value[:len(PXE_VENDOR_CLASS)]) == PXE_VENDOR_CLASS
+
+    @property
+    def client_arch(self):
+        """First client system architecture in option 93 (RFC 4578), or None"""
+        value = self.index.get(OPTION_CLIENT_ARCH)
+        if value is None or len(value) < 2:
+            return None
+        return (value[0] << 8) | value[1]
+
+    def address(self, code):
+        """Dotted-quad value of an IPv4 address option, or None"""
+        value = self.index.get(code)
+        if value is None or len(value) != 4:
+            return None
+        return socket.inet_ntoa(bytes(value))
+
+
+def parse_options(data):
+    """Walk a request's options once and return a DHCPOptions
+
+    Pad bytes are skipped, END stops a field, and an option cut short by
+    the end of the packet is dropped. When option 52 is present the file
+    and then the sname header fields are walked as well (RFC 2131 4.1).
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    index = {}
+    start = BOOTP_HEADER.size
+    if len(view) > start:
+        _walk(view, start, len(view), index)
+        overload = index.get(OPTION_OVERLOAD)
+        if overload is not None and len(overload) == 1:
+            flags = overload[0]
+            if flags & OVERLOAD_FILE:
+                _walk(view, FILE_FIELD[0], FILE_FIELD[1], index)
+            if flags & OVERLOAD_SNAME:
+                _walk(view, SNAME_FIELD[0], SNAME_FIELD[1], index)
+    return DHCPOptions(index)
+
+
+def find_option(data, code):
+    """Return the value of an option in a request, or None"""
+    return parse_options(data).get(code)
+
+
+def message_type(data):
+    """Return the option 53 value of a request, or None for plain BOOTP"""
+    return parse_options(data).message_type
+
+
+def peek_message_type(data):
+    """Option 53 of a request without walking its options when it comes first
+
+    Clients put option 53 first, so this is usually three byte reads;
+    anything else falls back to message_type().
+    """
+    if len(data) > 242 and data[240] == OPTION_MESSAGE_TYPE and data[241] == 1:
+        return data[242]
+    return message_type(data)
+
+
+def _walk(view, idx, end, index):
+    """Add the options in view[idx:end] to index"""
+    while idx < end:
+        code = view[idx]
+        if code == OPTION_PAD:
+            idx += 1
+            continue
+        if code == OPTION_END or idx + 1 >= end:
+            break
+        length = view[idx + 1]
+        idx += 2
+        if idx + length > end:
+            break
+        value = view[idx:idx + length]
+        previous = index.get(code)
+        # Long options arrive as several instances of the same code
+        index[code] = value if previous is None else bytes(previous) + value
+        idx += length
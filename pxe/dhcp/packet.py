@@ -0,0 +1,119 @@
+"""
+DHCP packet layout for Termux PXE Boot
+Precompiled BOOTP/DHCP structures and a reusable reply buffer
+"""
+import struct
+import threading
+
+BOOTREQUEST = 1
+BOOTREPLY = 2
+HTYPE_ETHERNET = 1
+# The only defined bit of the flags field: the client wants broadcast replies
+BROADCAST_FLAG = 0x8000
+
+MAGIC_COOKIE = b'\x63\x82\x53\x63'
+OPTION_PAD = 0
+OPTION_END = 255
+OPTION_MESSAGE_TYPE = 53
+
+# DHCP message types (option 53, RFC 2132)
+DHCPDISCOVER = 1
+DHCPOFFER = 2
+DHCPREQUEST = 3
+DHCPDECLINE = 4
+DHCPACK = 5
+DHCPNAK = 6
+DHCPRELEASE = 7
+DHCPINFORM = 8
+
+# op, htype, hlen, hops, xid, secs, flags, ciaddr, yiaddr, siaddr, giaddr,
+# chaddr, sname, file, magic cookie (RFC 2131 section 2)
+BOOTP_HEADER = struct.Struct('!BBBB4sHH4s4s4s4s16s64s128s4s')
+# Option code + length, and the fixed-size option bodies used in replies
+OPTION_HEADER = struct.Struct('!BB')
+OPTION_BYTE = struct.Struct('!BBB')
+OPTION_U32 = struct.Struct('!BBI')
+# Per-client header fields patched into a template: xid, secs, flags, ciaddr, yiaddr
+CLIENT_FIELDS = struct.Struct('!4sHH4s4s')
+CLIENT_FIELDS_OFFSET = 4
+CHADDR = struct.Struct('16s')
+CHADDR_OFFSET = 28
+
+ZERO_IP = b'\x00\x00\x00\x00'
+# Largest reply we build; RFC 2131 clients accept at least 576-byte messages
+MAX_REPLY_SIZE = 1024
+
+
+class ReplyBuffer:
+    """One preallocated DHCP reply, rewritten in place for every packet
+
+    begin() packs the fixed BOOTP header with a single precompiled
+    struct, the option methods pack_into the bytes after it and finish()
+    returns a memoryview of the packet. Only the bytes the previous
+    reply used beyond the new end are zeroed again, so nothing is
+    allocated per reply. The view is valid until the next begin().
+    """
+
+    def __init__(self, size=MAX_REPLY_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.zeros = memoryview(bytes(size))
+        self.offset = 0
+        self.used = 0
+
+    def begin(self, xid, chaddr, yiaddr=ZERO_IP, siaddr=ZERO_IP, giaddr=ZERO_IP,
+              file=b'', flags=0, ciaddr=ZERO_IP, hlen=6):
+        """Start a BOOTREPLY; addresses are packed 4-byte values"""
+        BOOTP_HEADER.pack_into(self.buffer, 0, BOOTREPLY, HTYPE_ETHERNET, hlen, 0,
+                               xid, 0, flags, ciaddr, yiaddr, siaddr, giaddr,
+                               chaddr, b'', file, MAGIC_COOKIE)
+        self.offset = BOOTP_HEADER.size
+        return self
+
+    def begin_template(self, template, xid, chaddr, yiaddr=ZERO_IP, flags=0, ciaddr=ZERO_IP, hlen=6):
+        """Start a reply from a ReplyTemplate, patching in the client's fields"""
+        packet = template.packet
+        size = len(packet)
+        self.view[:size] = packet
+        self.buffer[2] = hlen
+        CLIENT_FIELDS.pack_into(self.buffer, CLIENT_FIELDS_OFFSET, xid, 0, flags, ciaddr, yiaddr)
+        CHADDR.pack_into(self.buffer, CHADDR_OFFSET, chaddr)
+        self.offset = size
+        return self
+
+    def option(self, code, data):
+        """Append an option with a variable-length value"""
+        end = self.offset + 2 + len(data)
+        OPTION_HEADER.pack_into(self.buffer, self.offset, code, len(data))
+        self.view[self.offset + 2:end] = data
+        self.offset = end
+
+    def option_byte(self, code, value):
+        """Append a one-byte option (message type, flags)"""
+        OPTION_BYTE.pack_into(self.buffer, self.offset, code, 1, value)
+        self.offset += OPTION_BYTE.size
+
+    def option_u32(self, code, value):
+        """Append a 32-bit integer option (lease and renewal times)"""
+        OPTION_U32.pack_into(self.buffer, self.offset, code, 4, value)
+        self.offset += OPTION_U32.size
+
+    def finish(self):
+        """Terminate the options and return the packet"""
+        self.buffer[self.offset] = OPTION_END
+        end = self.offset + 1
+        if self.used > end:
+            self.view[end:self.used] = self.zeros[end:self.used]
+        self.used = end
+        return self.view[:end]
+
+
+_local = threading.local()
+
+
+def reply_buffer():
+    """The calling thread's reply buffer"""
+    buffer = getattr(_local, 'reply', None)
+    if buffer is None:
+        buffer = _local.reply = ReplyBuffer()
+    return buffer
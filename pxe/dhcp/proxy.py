@@ -0,0 +1,65 @@
+"""
+proxyDHCP for Termux PXE Boot
+PXE boot information next to another DHCP server, on port 67 and the port 4011 boot server
+"""
+from pxe.dhcp.options import OPTION_VENDOR_CLASS, PXE_VENDOR_CLASS
+
+# Full DHCP server, or PXE information only while the router hands out addresses
+MODE_FULL = 'full'
+MODE_PROXY = 'proxy'
+DHCP_MODES = (MODE_FULL, MODE_PROXY)
+
+# PXE boot server discovery port (PXE 2.1 section 2.2.5)
+PROXY_PORT = 4011
+
+# Vendor class of UEFI HTTP boot firmware
+HTTP_VENDOR_CLASS = b'HTTPClient'
+
+OPTION_VENDOR_SPECIFIC = 43
+# PXE vendor sub-options carried in option 43
+PXE_DISCOVERY_CONTROL = 6
+PXE_BOOT_ITEM = 71
+PXE_END = 255
+# Discovery control bit 3: boot the file named in this offer, skip menus and discovery
+DISCOVERY_USE_BOOT_FILE = 0x08
+
+
+def proxy_vendor_options(boot_item=None):
+    """Option 43 for a proxy offer or boot server ACK
+
+    boot_item is the client's PXE_BOOT_ITEM sub-option, echoed in the ACK
+    on port 4011 as the PXE specification requires.
+    """
+    value = bytes((PXE_DISCOVERY_CONTROL, 1, DISCOVERY_USE_BOOT_FILE))
+    if boot_item is not None:
+        value += bytes((PXE_BOOT_ITEM, len(boot_item))) + bytes(boot_item)
+    return value + bytes((PXE_END,))
+
+
+def boot_item(options):
+    """The PXE_BOOT_ITEM sub-option of a client's option 43, or None"""
+    value = options.get(OPTION_VENDOR_SPECIFIC)
+    if value is None:
+        return None
+    idx = 0
+    while idx + 1 < len(value):
+        code = value[idx]
+        if code == PXE_END:
+            break
+        if code == 0:
+            idx += 1
+            continue
+        length = value[idx + 1]
+        if code == PXE_BOOT_ITEM:
+            return value[idx + 2:idx + 2 + length]
+        idx += 2 + length
+    return None
+
+
+def is_boot_client(options):
+    """Whether a request comes from PXE or UEFI HTTP boot firmware"""
+    vendor = options.get(OPTION_VENDOR_CLASS)
+    if vendor is None:
+        return False
+    return (bytes(vendor[:len(PXE_VENDOR_CLASS)]) == PXE_VENDOR_CLASS
+            or bytes(vendor[:len(HTTP_VENDOR_CLASS)]) == HTTP_VENDOR_CLASS)
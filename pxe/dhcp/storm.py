@@ -0,0 +1,116 @@
+"""
+DHCP storm suppression for Termux PXE Boot
+Per-client and global token buckets plus a cache of recent replies, checked before a request is parsed
+"""
+import threading
+import time
+
+from pxe.dhcp.packet import BOOTP_HEADER
+from pxe.dhcp.options import peek_message_type
+
+# Requests per second a single client MAC may send, and how many it may send at once
+CLIENT_RATE = 2.0
+CLIENT_BURST = 8
+# The same for the whole socket
+GLOBAL_RATE = 100.0
+GLOBAL_BURST = 200
+# Seconds a reply is resent for retransmits of its request (below the DORA offer timeout)
+REPLY_TTL = 10.0
+# Clients and replies remembered; the oldest go first
+MAX_CLIENTS = 4096
+MAX_REPLIES = 1024
+
+
+class StormGuard:
+    """Rate limits and a reply cache in front of a DHCP handler
+
+    screen() runs in the receive loop on the raw datagram, before the
+    options are parsed or a worker is involved. Every client MAC has a
+    token bucket of burst requests refilled at rate per second, and one
+    global bucket caps the socket; a request without a token is dropped
+    and only counted, so a looping bridge or a stuck NIC costs a few
+    byte compares per datagram. Requests that get through are looked up
+    by (chaddr, xid, message type) among the replies of the last ttl
+    seconds, and a retransmit is answered with the stored packet instead
+    of running the handler again. Handlers store what they sent with
+    remember().
+    """
+
+    def __init__(self, rate=CLIENT_RATE, burst=CLIENT_BURST, global_rate=GLOBAL_RATE,
+                 global_burst=GLOBAL_BURST, ttl=REPLY_TTL, max_clients=MAX_CLIENTS,
+                 max_replies=MAX_REPLIES, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.ttl = ttl
+        self.max_clients = max_clients
+        self.max_replies = max_replies
+        self.clock = clock
+
+        self.buckets = {}   # chaddr -> [tokens, last refill]
+        self.tokens = float(global_burst)
+        self.refilled = clock()
+        self.replies = {}   # (chaddr, xid, message type) -> (expires, packet, destination)
+        self.lock = threading.Lock()
+
+        self.stats = {'screened': 0, 'client_drops': 0, 'global_drops': 0, 'cached_replies': 0}
+
+    def screen(self, data, sock):
+        """Drop a request or answer it from the cache; False passes it to the handler"""
+        if len(data) < BOOTP_HEADER.size:
+            # Too short to be DHCP; the handler discards it
+            return False
+        stats = self.stats
+        stats['screened'] += 1
+        now = self.clock()
+
+        chaddr = bytes(data[28:44])
+        bucket = self.buckets.get(chaddr)
+        if bucket is None:
+            if len(self.buckets) >= self.max_clients:
+                del self.buckets[next(iter(self.buckets))]
+            bucket = self.buckets[chaddr] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            stats['client_drops'] += 1
+            return True
+
+        self.tokens = min(self.global_burst, self.tokens + (now - self.refilled) * self.global_rate)
+        self.refilled = now
+        if self.tokens < 1:
+            stats['global_drops'] += 1
+            return True
+        bucket[0] -= 1
+        self.tokens -= 1
+
+        cached = self.replies.get((chaddr, bytes(data[4:8]), peek_message_type(data)))
+        if cached is not None and cached[0] > now:
+            stats['cached_replies'] += 1
+            sock.sendto(cached[1], cached[2])
+            return True
+        return False
+
+    def remember(self, request, packet, destination):
+        """Keep the reply sent for a request, for its retransmits"""
+        key = (bytes(request[28:44]), bytes(request[4:8]), peek_message_type(request))
+        now = self.clock()
+        with self.lock:
+            replies = self.replies
+            # Every entry lives for ttl, so the expired ones are at the front
+            while replies:
+                oldest = next(iter(replies))
+                if replies[oldest][0] > now and len(replies) < self.max_replies:
+                    break
+                del replies[oldest]
+            replies.pop(key, None)
+            replies[key] = (now + self.ttl, bytes(packet), destination)
+
+    def get_stats(self):
+        """Return screening and drop counters"""
+        stats = dict(self.stats)
+        stats['clients'] = len(self.buckets)
+        stats['cached'] = len(self.replies)
+        return stats
@@ -0,0 +1,74 @@
+"""
+DHCP reply templates for Termux PXE Boot
+Replies packed once per (interface, boot file, message type) and patched per client
+"""
+import threading
+
+from pxe.dhcp.packet import ReplyBuffer, ZERO_IP, OPTION_MESSAGE_TYPE
+
+
+class ReplyTemplate:
+    """The part of a reply that is the same for every client
+
+    Holds the BOOTP header (siaddr, giaddr, boot file) and the options
+    up to, but not including, END. ReplyBuffer.begin_template() copies
+    it with one slice assignment and patches xid, flags, ciaddr, yiaddr
+    and chaddr; lease options are appended after it.
+    """
+
+    __slots__ = ('packet', 'message_type')
+
+    def __init__(self, message_type, siaddr=ZERO_IP, giaddr=ZERO_IP, file=b'', options=()):
+        reply = ReplyBuffer()
+        reply.begin(ZERO_IP, b'', siaddr=siaddr, giaddr=giaddr, file=file)
+        reply.option_byte(OPTION_MESSAGE_TYPE, message_type)
+        for code, value in options:
+            reply.option(code, value)
+        self.packet = bytes(reply.view[:reply.offset])
+        self.message_type = message_type
+
+
+class ReplyTemplates:
+    """Templates keyed by (interface, boot file, message type)
+
+    The boot file stands for the client class: it is what the client's
+    architecture (option 93) selected. build(interface, boot_file,
+    message_type) returns the ReplyTemplate for a key. prepare() builds
+    the expected keys up front when the server starts or reloads its
+    config; a key seen for the first time later is built on that request
+    and kept. clear() drops everything after a config change.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.templates = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, interface, boot_file, message_type):
+        """The template for a reply, building it on first use"""
+        key = (interface, boot_file, message_type)
+        template = self.templates.get(key)
+        if template is None:
+            template = self.build(interface, boot_file, message_type)
+            with self.lock:
+                self.templates[key] = template
+                self.builds += 1
+        else:
+            self.hits += 1
+        return template
+
+    def prepare(self, keys):
+        """Build templates for (interface, boot_file, message_type) keys ahead of time"""
+        for key in keys:
+            self.get(*key)
+
+    def clear(self):
+        """Forget every template (the config they were built from changed)"""
+        with self.lock:
+            self.templates = {}
+
+    def get_stats(self):
+        """Return template counters"""
+        return {'templates': len(self.templates), 'hits': self.hits, 'builds': self.builds}
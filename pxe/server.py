@@ -4,13 +4,15 @@ Handles DHCP, TFTP, and PXE boot configuration without root privileges
 """
 import socket
 import threading
-import struct
 import os
 import subprocess
 import time
 import ipaddress
 from datetime import datetime
 
+from pxe.tftp import TFTPEngine, ASSET_CACHE
+from pxe.dhcp import parse_options, DHCPDISCOVER
+
 class PXEServer:
     def __init__(self, settings, logger, network_manager):
         self.settings = settings
@@ -22,6 +24,7 @@ class PXEServer:
         self.dhcp_socket = None
         self.tftp_socket = None
         self.threads = []
+        self.tftp_engine = None
         
         # Network configuration
         self.server_ip = "192.168.1.100"
@@ -371,6 +374,8 @@ reboot
             self.is_running = False
             
             # Close sockets
+            if self.tftp_engine:
+                self.tftp_engine.stop()
             if self.dhcp_socket:
                 self.dhcp_socket.close()
             if self.tftp_socket:
@@ -411,81 +416,25 @@ reboot
             self.logger.error(f"TFTP server error: {e}")
             
     def _create_simple_tftp_server(self):
-        """Create a simple TFTP server using Python"""
+        """Serve TFTP with the shared event-loop engine"""
         try:
             self.tftp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.tftp_socket.bind(('0.0.0.0', 69))
             
-            self.logger.info("Simple TFTP server started on port 69")
+            self.logger.info("TFTP engine started on port 69")
             
-            while self.is_running:
-                try:
-                    data, addr = self.tftp_socket.recvfrom(1024)
-                    self._handle_tftp_request(data, addr)
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if self.is_running:
-                        self.logger.error(f"TFTP error: {e}")
-                    break
+            # tftp_dir first, then assets_dir
+            self.tftp_engine = TFTPEngine.from_config(
+                self.tftp_socket, [self.tftp_dir, self.assets_dir], self.settings,
+                log=self.logger.info, hooks={'abort': self._on_tftp_abort})
+            self.tftp_engine.run()
                     
         except Exception as e:
             self.logger.error(f"Simple TFTP server error: {e}")
             
-    def _handle_tftp_request(self, data, addr):
-        """Handle TFTP request"""
-        try:
-            # Simple TFTP implementation
-            if len(data) < 4:
-                return
-                
-            opcode = struct.unpack('!H', data[:2])[0]
-            filename = data[2:].split(b'\x00')[0].decode('utf-8')
-            
-            if opcode == 1:  # Read request
-                self._send_tftp_file(filename, addr)
-            elif opcode == 2:  # Write request
-                # Not implemented for security
-                pass
-                
-        except Exception as e:
-            self.logger.error(f"TFTP request handling error: {e}")
-            
-    def _send_tftp_file(self, filename, addr):
-        """Send file via TFTP"""
-        try:
-            file_path = os.path.join(self.tftp_dir, filename)
-            if not os.path.exists(file_path):
-                # Try assets directory
-                file_path = os.path.join(self.assets_dir, filename)
-                
-            if os.path.exists(file_path):
-                with open(file_path, 'rb') as f:
-                    file_data = f.read()
-                    
-                # Send file in 512-byte blocks
-                block_size = 512
-                block_num = 1
-                offset = 0
-                
-                while offset < len(file_data):
-                    block_data = file_data[offset:offset + block_size]
-                    if len(block_data) < block_size:
-                        # Last block - send as DATA with special handling
-                        pass
-                        
-                    # Send DATA packet
-                    data_packet = struct.pack('!HH', 3, block_num) + block_data
-                    self.tftp_socket.sendto(data_packet, addr)
-                    
-                    offset += block_size
-                    block_num += 1
-                    
-                    # Wait for ACK (simplified)
-                    time.sleep(0.01)
-                    
-        except Exception as e:
-            self.logger.error(f"TFTP file send error: {e}")
+    def _on_tftp_abort(self, stats, reason):
+        """TFTP engine hook: a transfer was given up"""
+        self.logger.warning(f"TFTP transfer aborted: {stats['filename']} ({reason})")
             
     def _run_dhcp_server(self):
         """Run DHCP server for PXE clients"""
@@ -547,11 +496,12 @@ reboot
             self.logger.info(f"DHCP request from {addr}")
             
             # For demonstration, just log the request
-            if len(data) >= 4:
-                # Check if it's a DHCP request (boot request)
-                message_type = data[4:5]
-                if len(message_type) == 1 and ord(message_type) == 1:
-                    self.logger.info("DHCP Discover received")
+            if len(data) >= 240 and data[0] == 1:
+                # BOOTREQUEST: the message type is option 53
+                options = parse_options(data)
+                if options.message_type == DHCPDISCOVER:
+                    kind = "PXE " if options.is_pxe else ""
+                    self.logger.info(f"{kind}DHCP Discover received")
                     
         except Exception as e:
             self.logger.error(f"DHCP request handling error: {e}")
@@ -580,11 +530,15 @@ reboot
             
     def get_status(self):
         """Get current server status"""
-        return {
+        status = {
             'is_running': self.is_running,
             'server_ip': self.server_ip,
             'network': self.network,
             'boot_dir': self.boot_dir,
             'tftp_dir': self.tftp_dir,
-            'uptime': time.time() - getattr(self, 'start_time', time.time())
+            'uptime': time.time() - getattr(self, 'start_time', time.time()),
+            'tftp_cache': ASSET_CACHE.get_stats()
         }
+        if self.tftp_engine:
+            status['tftp'] = self.tftp_engine.get_stats()
+        return status
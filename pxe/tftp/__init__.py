@@ -0,0 +1,19 @@
+"""
+TFTP server components for Termux PXE Boot
+Every server entry point serves TFTP through TFTPEngine
+"""
+from pxe.tftp.protocol import (
+    OP_RRQ, OP_WRQ, OP_DATA, OP_ACK, OP_ERROR, OP_OACK,
+    ERR_NOT_DEFINED, ERR_FILE_NOT_FOUND, ERR_ACCESS_VIOLATION, ERR_ILLEGAL_OPERATION,
+    ERR_UNKNOWN_TID, ERR_OPTION_REFUSED,
+    DEFAULT_BLKSIZE, DEFAULT_TIMEOUT, DEFAULT_RETRIES,
+    parse_request, negotiate_options, build_oack, build_error, build_data, parse_ack
+)
+from pxe.tftp.transfer import ReadTransfer
+from pxe.tftp.engine import TFTPEngine
+from pxe.tftp.cache import AssetCache, ASSET_CACHE
+from pxe.tftp.rtt import RTTEstimator
+from pxe.tftp.multicast import MulticastGroup, DEFAULT_MULTICAST_GROUP
+from pxe.tftp.scheduler import FairScheduler
+from pxe.tftp.index import FileIndex
+from pxe.tftp.prewarm import prewarm
@@ -0,0 +1,164 @@
+"""
+Boot asset cache for the Termux PXE Boot TFTP server
+Process-wide in-memory copies of served files with byte-budget LRU eviction
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for
+
+from pxe.tftp.files import FileRegistry
+
+# Default budget; enough for pxelinux.0 plus a kernel and a typical initramfs
+DEFAULT_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class CachedAsset:
+    """A file's contents held in memory, shared by every transfer of it"""
+
+    def __init__(self, key, data):
+        self.key = key
+        self.path = key[0]
+        self.size = len(data)
+        self.data = data
+        self.view = memoryview(data)
+
+    def __len__(self):
+        return self.size
+
+
+class AssetCache:
+    """LRU cache of boot assets keyed by (path, mtime, size)
+
+    A miss is served from a shared mmap straight away while a background
+    thread reads the file into memory, so the TFTP event loop never waits
+    for a whole file to come off flash; later and concurrent transfers
+    share the same in-memory buffer. When the cached
+    total exceeds the byte budget the least recently used entries are
+    dropped; transfers still using a dropped entry keep their reference
+    until they finish. Files larger than the whole budget are not cached
+    and are served from a shared mmap instead.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.mapped = FileRegistry()
+        # Background reads by key, done by one thread so flash sees one reader
+        self.loading = {}
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asset-cache')
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def open(self, path):
+        """Return a buffer object (with .view) holding the file's contents
+
+        Never reads the whole file: a miss returns the shared mmap and
+        queues the file to be cached for the next transfer.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+
+        with self.lock:
+            asset = self.entries.get(key)
+            if asset is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return asset
+            self.misses += 1
+            if stat.st_size <= self.max_bytes and key not in self.loading:
+                self.loading[key] = self.loader.submit(self._fill, key)
+        return self.mapped.open(path)
+
+    def load(self, path):
+        """Read a file into the cache now; returns the CachedAsset, or None if it is too big
+
+        Blocks for the whole read, so call it from a worker thread.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        with self.lock:
+            asset = self.entries.get(key)
+            if asset is not None:
+                return asset
+        if stat.st_size > self.max_bytes:
+            return None
+
+        with open(path, 'rb') as f:
+            asset = CachedAsset(key, f.read())
+
+        with self.lock:
+            # Another transfer may have loaded it while we were reading
+            existing = self.entries.get(key)
+            if existing is not None:
+                return existing
+            self._drop_stale(path)
+            self.entries[key] = asset
+            self.current_bytes += asset.size
+            self._evict()
+        return asset
+
+    def wait(self):
+        """Block until queued background reads are cached"""
+        with self.lock:
+            pending = list(self.loading.values())
+        wait_for(pending)
+
+    def release(self, asset):
+        """Give back a buffer obtained from open()"""
+        if not isinstance(asset, CachedAsset):
+            self.mapped.release(asset)
+
+    def set_budget(self, max_bytes):
+        """Change the byte budget, evicting immediately if needed"""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        """Return cache counters"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'cached_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _fill(self, key):
+        """Background read of a file that missed (runs on the loader thread)"""
+        try:
+            self.load(key[0])
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.loading.pop(key, None)
+
+    def _drop_stale(self, path):
+        """Forget older versions of a file that changed on disk"""
+        for key in [key for key in self.entries if key[0] == path]:
+            self.current_bytes -= self.entries.pop(key).size
+
+    def _evict(self):
+        """Drop least recently used entries until within budget"""
+        while self.current_bytes > self.max_bytes and self.entries:
+            key, asset = self.entries.popitem(last=False)
+            self.current_bytes -= asset.size
+            self.evictions += 1
+
+
+# Shared by every server in the process
+ASSET_CACHE = AssetCache()
@@ -0,0 +1,745 @@
+"""
+Event-loop TFTP engine for Termux PXE Boot
+Multiplexes every transfer's ephemeral socket on one selector thread
+"""
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque, OrderedDict
+
+from pxe.tftp.protocol import (
+    OP_RRQ, OP_ACK, OP_ERROR,
+    ERR_NOT_DEFINED, ERR_FILE_NOT_FOUND, ERR_ACCESS_VIOLATION, ERR_ILLEGAL_OPERATION,
+    DEFAULT_BLKSIZE, DEFAULT_TIMEOUT, DEFAULT_RETRIES, MAX_BLKSIZE,
+    parse_request, negotiate_options, get_max_blksize, build_oack, build_error, parse_ack
+)
+from pxe.tftp.transfer import ReadTransfer
+from pxe.tftp.cache import ASSET_CACHE, DEFAULT_CACHE_BYTES
+from pxe.tftp.index import FileIndex
+from pxe.tftp.rtt import RTTEstimator
+from pxe.tftp.multicast import MulticastGroup, GroupAddresses, open_group_socket, DEFAULT_MULTICAST_GROUP
+from pxe.tftp.scheduler import FairScheduler
+from pxe.tftp.prewarm import prewarm
+
+# Longest the loop sleeps when no transfer timer is due
+IDLE_WAKEUP = 1.0
+# Finished transfers kept for get_transfer_stats()
+RECENT_TRANSFERS = 50
+# A session that hears nothing from its client for this long is expired
+SESSION_IDLE_TIMEOUT = 30.0
+# Admission control: concurrent transfers, and RRQs allowed to wait for a slot
+MAX_TRANSFERS = 32
+MAX_QUEUED_REQUESTS = 64
+# A queued RRQ older than this is dropped; the client has given up on it
+QUEUED_REQUEST_TIMEOUT = 10.0
+# Kinds of timer entries: a retransmission deadline and an idle check
+TIMER_RETRANSMIT = 0
+TIMER_IDLE = 1
+
+
+class Session:
+    """One client transfer: its socket, protocol state and retry timer"""
+
+    def __init__(self, sock, addr, filename, mapped, accepted, group=None):
+        self.sock = sock
+        self.addr = addr
+        self.filename = filename
+        # Set for an RFC 2090 multicast transfer; addr is then the group
+        self.group = group
+        # Session table key: one transfer per client TID and file
+        self.key = (addr, filename)
+        self.file = mapped
+        self.accepted = accepted
+        # A negotiated timeout caps the adaptive RTO
+        self.rtt = RTTEstimator(max_rto=accepted.get('timeout', DEFAULT_TIMEOUT))
+        self.transfer = ReadTransfer(mapped.view,
+                                     accepted.get('blksize', DEFAULT_BLKSIZE),
+                                     accepted.get('windowsize', 1))
+        # Waiting for ACK 0 of our OACK, or streaming DATA
+        self.state = 'oack' if accepted or group else 'data'
+        self.failures = 0
+        self.deadline = 0.0
+        self.started = time.time()
+        self.last_activity = self.started
+        # When the last batch went out, and whether it held a retransmission
+        self.sent_at = None
+        self.ambiguous = False
+        self.window_retransmits = 0
+
+    def get_stats(self, status='active'):
+        """Return this transfer's progress, RTT estimate and retransmit count"""
+        stats = {
+            'client': f"{self.addr[0]}:{self.addr[1]}",
+            'filename': self.filename,
+            'status': status,
+            'bytes': len(self.file),
+            'blksize': self.transfer.blksize,
+            'windowsize': self.transfer.windowsize,
+            'blocks_acked': self.transfer.acked,
+            'total_blocks': self.transfer.total_blocks,
+            'srtt_ms': round(self.rtt.srtt * 1000, 2) if self.rtt.srtt is not None else None,
+            'rto_ms': round(self.rtt.rto * 1000, 2),
+            'retransmits': self.transfer.retransmits,
+            'duration': round(time.time() - self.started, 3)
+        }
+        if self.group is not None:
+            stats['multicast_members'] = len(self.group.members)
+        return stats
+
+
+class TFTPEngine:
+    """Single-threaded TFTP read server
+
+    The listen socket only receives requests; each accepted RRQ gets its
+    own non-blocking ephemeral socket connected to the client. All of
+    them are registered on one selector, so a transfer waiting for an
+    ACK costs a dictionary entry instead of a blocked OS thread.
+
+    Passing multicast=(base_address, port) enables RFC 2090: clients that
+    ask for the multicast option and fetch the same file share one data
+    stream per group.
+
+    DATA goes out through a FairScheduler: rate_limit (bytes/s) caps the
+    total across transfers and client_weights maps client IPs to their
+    relative share.
+
+    At most max_transfers sessions run at once. Further RRQs wait in a
+    FIFO of max_queued entries and are started as slots free up; beyond
+    that the client gets a "server busy" error and retries later.
+
+    hooks maps event names to callbacks so a server can add its own
+    logging or accounting: 'request' (filename, addr, options),
+    'complete' (transfer stats) and 'abort' (transfer stats, reason).
+
+    With prewarm=True, run() first starts a background thread that loads
+    the kernels and initrds named in the boot menus into the cache.
+    """
+
+    def __init__(self, listen_socket, roots, log=None, retries=DEFAULT_RETRIES, cache=None,
+                 idle_timeout=SESSION_IDLE_TIMEOUT, multicast=None, multicast_interface=None,
+                 rate_limit=None, client_weights=None,
+                 max_transfers=MAX_TRANSFERS, max_queued=MAX_QUEUED_REQUESTS, hooks=None,
+                 prewarm=False):
+        self.listen_socket = listen_socket
+        self.index = FileIndex(roots)
+        self.log = log or (lambda message: None)
+        self.hooks = hooks or {}
+        self.prewarm = prewarm
+        self.prewarm_summary = None
+        self.retries = retries
+        self.idle_timeout = idle_timeout
+
+        self.multicast = GroupAddresses(*multicast) if multicast else None
+        if multicast_interface is None:
+            bound = listen_socket.getsockname()[0]
+            multicast_interface = bound if bound != '0.0.0.0' else None
+        self.multicast_interface = multicast_interface
+        # Resolved path -> multicast Session
+        self.groups = {}
+        self.scheduler = FairScheduler(rate_limit, client_weights,
+                                       packet_size=lambda session: session.transfer.blksize + 4)
+
+        self.max_transfers = max_transfers
+        self.max_queued = max_queued
+        # (client addr, filename) -> (path, options, queued_at)
+        self.queue = OrderedDict()
+
+        self.running = False
+        self.selector = None
+        self.sessions = {}
+        # Heap of (due, seq, kind, session); entries left behind by a newer
+        # deadline or a closed session are skipped when they come up
+        self.timers = []
+        self.timer_seq = itertools.count()
+        # Every datagram is read into this one buffer (the loop is single-threaded
+        # and nothing keeps a packet past its handler)
+        self.recv_buffer = bytearray(MAX_BLKSIZE + 4)
+        self.recv_view = memoryview(self.recv_buffer)
+        # (client addr, filename) -> Session, to catch resent RRQs
+        self.clients = {}
+        self.files = cache or ASSET_CACHE
+
+        self.transfers_completed = 0
+        self.transfers_aborted = 0
+        self.sessions_expired = 0
+        self.duplicate_rrqs = 0
+        self.duplicate_acks = 0
+        self.requests_queued = 0
+        self.requests_rejected = 0
+        self.requests_expired = 0
+        self.recent_transfers = deque(maxlen=RECENT_TRANSFERS)
+
+    @classmethod
+    def from_config(cls, listen_socket, roots, config, log=None, hooks=None):
+        """Create an engine from the tftp_* keys of a server configuration
+
+        config is anything with a dict-style get() (a server's config dict
+        or Settings); missing keys keep the defaults. The cache budget
+        applies to the process-wide ASSET_CACHE.
+        """
+        ASSET_CACHE.set_budget(config.get('tftp_cache_mb', DEFAULT_CACHE_BYTES // (1024 * 1024)) * 1024 * 1024)
+
+        multicast = None
+        if config.get('tftp_multicast', False):
+            multicast = (config.get('tftp_multicast_group', DEFAULT_MULTICAST_GROUP[0]),
+                         config.get('tftp_multicast_port', DEFAULT_MULTICAST_GROUP[1]))
+
+        return cls(listen_socket, roots, log=log, cache=ASSET_CACHE, hooks=hooks,
+                   multicast=multicast,
+                   rate_limit=config.get('tftp_rate_limit_kb', 0) * 1024,
+                   client_weights=config.get('tftp_client_weights'),
+                   max_transfers=config.get('tftp_max_transfers', MAX_TRANSFERS),
+                   max_queued=config.get('tftp_max_queued', MAX_QUEUED_REQUESTS),
+                   prewarm=config.get('tftp_prewarm', True))
+
+    def run(self):
+        """Serve requests until stop() is called"""
+        if self.prewarm:
+            threading.Thread(target=self._prewarm, daemon=True).start()
+        self.selector = selectors.DefaultSelector()
+        self.listen_socket.setblocking(False)
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, None)
+        self.running = True
+
+        try:
+            while self.running:
+                for key, _ in self.selector.select(self._next_wakeup()):
+                    if key.data is None:
+                        self._on_request()
+                    else:
+                        self._on_reply(key.data)
+                self._check_timers()
+                self._admit_queued()
+                self.scheduler.service(self._send_window)
+        finally:
+            for session in list(self.sessions.values()):
+                self._close(session)
+            try:
+                self.selector.unregister(self.listen_socket)
+            except (KeyError, ValueError, OSError):
+                pass
+            self.selector.close()
+
+    def stop(self):
+        """Ask the loop to exit at its next wakeup"""
+        self.running = False
+
+    def get_stats(self):
+        """Return transfer and asset cache counters"""
+        return {
+            'active_transfers': len(self.sessions),
+            'transfers_completed': self.transfers_completed,
+            'transfers_aborted': self.transfers_aborted,
+            'sessions_expired': self.sessions_expired,
+            'duplicate_rrqs': self.duplicate_rrqs,
+            'duplicate_acks': self.duplicate_acks,
+            'queue_depth': len(self.queue),
+            'requests_queued': self.requests_queued,
+            'requests_rejected': self.requests_rejected,
+            'requests_expired': self.requests_expired,
+            'scheduler': self.scheduler.get_stats(),
+            'index': self.index.get_stats(),
+            'prewarm': self.prewarm_summary,
+            'cache': self.files.get_stats()
+        }
+
+    def get_transfer_stats(self):
+        """Return per-transfer RTT/retransmit stats, active ones first"""
+        active = [session.get_stats() for session in list(self.sessions.values())]
+        return active + list(self.recent_transfers)
+
+    def _next_wakeup(self):
+        """Seconds until the earliest retransmission timer or scheduler refill"""
+        wakeup = IDLE_WAKEUP
+        timers = self.timers
+        while timers and not self._timer_is_current(timers[0]):
+            heapq.heappop(timers)
+        if timers:
+            wakeup = min(wakeup, timers[0][0] - time.time())
+        refill = self.scheduler.next_wakeup()
+        if refill is not None:
+            wakeup = min(wakeup, refill)
+        return max(0.0, wakeup)
+
+    def _send_error(self, addr, code, message):
+        """Send an ERROR packet from a fresh TID"""
+        error_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            error_socket.sendto(build_error(code, message), addr)
+        finally:
+            error_socket.close()
+
+    def _prewarm(self):
+        """Background pre-warm of the boot assets (runs off the loop thread)"""
+        try:
+            self.prewarm_summary = prewarm(self.index, self.files, self.log)
+        except Exception as e:
+            self.log(f"✗ Pre-warm failed: {e}")
+
+    def _hook(self, name, *args):
+        """Call a server-supplied hook; its errors never reach the loop"""
+        callback = self.hooks.get(name)
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            self.log(f"TFTP {name} hook error: {e}")
+
+    def _on_request(self):
+        """Handle one datagram on the listen socket"""
+        try:
+            nbytes, addr = self.listen_socket.recvfrom_into(self.recv_buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            if self.running:
+                self.log(f"TFTP error: {e}")
+            return
+
+        try:
+            if nbytes < 4:
+                return
+            opcode, filename, mode, options = parse_request(self.recv_view[:nbytes])
+            if opcode == OP_RRQ:
+                self._start_transfer(filename, addr, options)
+            else:
+                self._send_error(addr, ERR_ILLEGAL_OPERATION, "Only read requests are supported")
+        except Exception as e:
+            self.log(f"TFTP handler error: {e}")
+
+    def _start_transfer(self, filename, addr, options):
+        """Start, queue or refuse a read request"""
+        if (addr, filename) in self.queue:
+            self.duplicate_rrqs += 1
+            return
+        existing = self.clients.get((addr, filename))
+        if existing is not None:
+            if existing.group is not None:
+                # A group member lost its OACK; repeat it
+                self.duplicate_rrqs += 1
+                self._send_oack(existing, addr)
+                return
+            if existing.transfer.acked == 0:
+                # PXE ROMs resend the RRQ before the first reply arrives; the
+                # running session's own timer covers a lost OACK/DATA
+                self.duplicate_rrqs += 1
+                return
+            # The client got data and then started over: replace the session
+            self._abort(existing, "client restarted transfer")
+
+        if options:
+            self.log(f"→ TFTP Request: {filename} from {addr[0]}:{addr[1]} (options: {options})")
+        else:
+            self.log(f"→ TFTP Request: {filename} from {addr[0]}:{addr[1]}")
+        self._hook('request', filename, addr, options)
+
+        path = self.index.lookup(filename)
+        if path is None:
+            self._send_error(addr, ERR_FILE_NOT_FOUND, f"File not found: {filename}")
+            self.log(f"✗ File not found: {filename}")
+            return
+
+        # Joining a running multicast group costs no extra session
+        joining = 'multicast' in options and self.multicast is not None and path in self.groups
+        if not joining and self.max_transfers and len(self.sessions) >= self.max_transfers:
+            self._queue_request(path, filename, addr, options)
+            return
+
+        self._open_transfer(path, filename, addr, options)
+
+    def _queue_request(self, path, filename, addr, options):
+        """Park an RRQ until a slot frees up, or refuse it when the queue is full"""
+        if len(self.queue) >= self.max_queued:
+            self.requests_rejected += 1
+            self._send_error(addr, ERR_NOT_DEFINED, "Server busy, retry later")
+            self.log(f"✗ TFTP busy, rejected {filename} from {addr[0]}:{addr[1]}")
+            return
+        self.requests_queued += 1
+        self.queue[(addr, filename)] = (path, options, time.time())
+
+    def _admit_queued(self):
+        """Start queued requests while slots are free; drop abandoned ones"""
+        now = time.time()
+        while self.queue:
+            (addr, filename), (path, options, queued_at) = next(iter(self.queue.items()))
+            if now - queued_at > QUEUED_REQUEST_TIMEOUT:
+                del self.queue[(addr, filename)]
+                self.requests_expired += 1
+                continue
+            if self.max_transfers and len(self.sessions) >= self.max_transfers:
+                return
+            del self.queue[(addr, filename)]
+            try:
+                self._open_transfer(path, filename, addr, options)
+            except Exception as e:
+                # One broken request must not strand the rest of the queue
+                self.log(f"TFTP handler error: {e}")
+                try:
+                    self._send_error(addr, ERR_NOT_DEFINED, f"Cannot start transfer: {e}")
+                except OSError:
+                    pass
+
+    def _open_transfer(self, path, filename, addr, options):
+        """Open the file, negotiate options and send the first packet"""
+        try:
+            mapped = self.files.open(path)
+        except FileNotFoundError:
+            # Removed since the index was built
+            self.index.refresh()
+            self._send_error(addr, ERR_FILE_NOT_FOUND, f"File not found: {filename}")
+            self.log(f"✗ File not found: {filename}")
+            return
+        except (OSError, ValueError) as e:
+            self._send_error(addr, ERR_ACCESS_VIOLATION, str(e))
+            self.log(f"✗ Cannot read {filename}: {e}")
+            return
+
+        if 'multicast' in options and self.multicast is not None:
+            if self._join_group(path, filename, addr, options, mapped):
+                return
+
+        # Ephemeral socket bound to the client's TID
+        sock = None
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(addr)
+            sock.setblocking(False)
+            accepted = negotiate_options(options, len(mapped), get_max_blksize(sock))
+        except Exception:
+            # No session owns the file or the socket yet
+            if sock is not None:
+                sock.close()
+            self.files.release(mapped)
+            raise
+        session = Session(sock, addr, filename, mapped, accepted)
+        self.sessions[sock.fileno()] = session
+        self.clients[session.key] = session
+        self.selector.register(sock, selectors.EVENT_READ, session)
+        self._schedule(session, session.started + self.idle_timeout, TIMER_IDLE)
+
+        self._transmit(session)
+
+    def _join_group(self, path, filename, addr, options, mapped):
+        """Add a client to the multicast transfer of a file
+
+        Returns False when the transfer has to fall back to unicast.
+        """
+        session = self.groups.get(path)
+        if session is not None:
+            self.files.release(mapped)
+        else:
+            sock = open_group_socket(self.multicast_interface)
+            # RFC 2090 streams are lockstep: only the master ACKs
+            unicast_options = {name: value for name, value in options.items()
+                               if name not in ('multicast', 'windowsize')}
+            accepted = negotiate_options(unicast_options, len(mapped), get_max_blksize(sock))
+
+            # Block numbers must not roll over, a new master may restart anywhere
+            blocks = len(mapped) // accepted.get('blksize', DEFAULT_BLKSIZE) + 1
+            address = self.multicast.allocate() if blocks <= 0xFFFF else None
+            if address is None:
+                sock.close()
+                return False
+
+            group = MulticastGroup(path, address, self.multicast.port)
+            session = Session(sock, (address, group.port), filename, mapped, accepted, group)
+            self.groups[path] = session
+            self.sessions[sock.fileno()] = session
+            self.selector.register(sock, selectors.EVENT_READ, session)
+            self._schedule(session, session.started + self.idle_timeout, TIMER_IDLE)
+
+        group = session.group
+        group.join(addr)
+        self.clients[(addr, filename)] = session
+        self.log(f"→ TFTP multicast join: {filename} via {group.address}:{group.port} "
+                 f"({'master' if addr == group.master else 'listener'}, {len(group.members)} members)")
+
+        if addr == group.master:
+            self._transmit(session)
+        else:
+            self._send_oack(session, addr)
+        return True
+
+    def _send_oack(self, session, addr):
+        """Send the session's OACK; group members each get their own multicast option"""
+        if session.group is None:
+            session.sock.send(build_oack(session.accepted))
+            return
+        options = dict(session.accepted, multicast=session.group.option(addr))
+        try:
+            session.sock.sendto(build_oack(options), addr)
+        except BlockingIOError:
+            pass
+
+    def _transmit(self, session):
+        """(Re)send whatever the session owes the client and arm its timer
+
+        OACKs go out at once; DATA windows are queued on the scheduler,
+        with the retransmission timer held until the window is sent.
+        """
+        if session.state == 'data':
+            if session not in self.scheduler:
+                session.window_retransmits = session.transfer.retransmits
+                session.deadline = float('inf')
+                self.scheduler.add(session)
+            self.scheduler.service(self._send_window)
+            return
+
+        now = time.time()
+        try:
+            # Any OACK after the first one is a retransmission
+            session.ambiguous = session.sent_at is not None
+            self._send_oack(session, session.group.master if session.group else session.addr)
+        except OSError as e:
+            self._abort(session, f"send failed: {e}")
+            return
+        session.sent_at = now
+        self._schedule(session, now + session.rtt.rto)
+
+    def _send_window(self, session, budget):
+        """Send up to budget bytes of a session's window (scheduler callback)
+
+        Returns (bytes_sent, more).
+        """
+        transfer = session.transfer
+        destination = session.group.destination() if session.group else None
+        packets = transfer.next_window()
+        sent = 0
+        more = True
+
+        try:
+            while sent + transfer.blksize + 4 <= budget:
+                packet = next(packets, None)
+                if packet is None:
+                    break
+                if destination is None:
+                    session.sock.send(packet)
+                else:
+                    session.sock.sendto(packet, destination)
+                sent += len(packet)
+            more = transfer.window_pending
+        except BlockingIOError:
+            # Socket buffer full: the unsent block goes out when the timer fires
+            transfer.next_index -= 1
+            more = False
+        except OSError as e:
+            self._abort(session, f"send failed: {e}")
+            return sent, False
+        finally:
+            packets.close()
+
+        if not more:
+            now = time.time()
+            session.ambiguous = transfer.retransmits != session.window_retransmits
+            session.sent_at = now
+            self._schedule(session, now + session.rtt.rto)
+        return sent, more
+
+    def _sample_rtt(self, session):
+        """Measure the round trip of the last batch (Karn's rule)"""
+        if not session.ambiguous:
+            session.rtt.sample(time.time() - session.sent_at)
+
+    def _on_reply(self, session):
+        """Drain ACK/ERROR packets from a transfer socket"""
+        while session.sock.fileno() in self.sessions:
+            try:
+                nbytes, addr = session.sock.recvfrom_into(self.recv_buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if session.group is not None:
+                    # One member's ICMP error must not end the group
+                    continue
+                # ICMP port unreachable: the client has gone away
+                self._abort(session, f"client unreachable: {e}")
+                return
+
+            packet = self.recv_view[:nbytes]
+            if session.group is not None:
+                self._on_group_reply(session, addr, packet)
+                continue
+
+            opcode, block = parse_ack(packet)
+            session.last_activity = time.time()
+
+            if opcode == OP_ERROR:
+                if session.state == 'oack':
+                    # Refused options, or a tsize probe; not a failure
+                    self._close(session)
+                else:
+                    self._abort(session, "client sent error")
+                return
+
+            if opcode != OP_ACK:
+                continue
+
+            if session.state == 'oack':
+                if block == 0:
+                    self._sample_rtt(session)
+                    session.state = 'data'
+                    session.failures = 0
+                    self._transmit(session)
+                continue
+
+            if session.transfer.on_ack(block):
+                self._sample_rtt(session)
+                session.failures = 0
+                if session.transfer.done:
+                    self._finish(session)
+                    return
+                self._transmit(session)
+            else:
+                # Duplicate or stale ACK: never answered with a resend
+                self.duplicate_acks += 1
+
+    def _on_group_reply(self, session, addr, packet):
+        """Handle a packet from a multicast group member"""
+        group = session.group
+        if addr not in group.members:
+            return
+
+        opcode, block = parse_ack(packet)
+        if opcode == OP_ERROR:
+            self._leave_group(session, addr, "client sent error")
+            return
+        # Listeners stay quiet; only the master paces the stream
+        if opcode != OP_ACK or addr != group.master:
+            return
+
+        session.last_activity = time.time()
+        if session.state == 'oack':
+            # A new master ACKs the last block it already holds
+            self._sample_rtt(session)
+            session.state = 'data'
+            session.failures = 0
+            session.transfer.rewind(block)
+        elif session.transfer.on_ack(block):
+            self._sample_rtt(session)
+            session.failures = 0
+        else:
+            self.duplicate_acks += 1
+            return
+
+        if session.transfer.done:
+            self.transfers_completed += 1
+            self.log(f"← TFTP multicast transfer complete: {session.filename} to {addr[0]}:{addr[1]}")
+            self._hook('complete', dict(session.get_stats('complete'), client=f"{addr[0]}:{addr[1]}"))
+            self._leave_group(session, addr)
+        else:
+            self._transmit(session)
+
+    def _leave_group(self, session, addr, reason=None):
+        """Drop a member, then hand the stream to the next master or end the group"""
+        group = session.group
+        group.leave(addr)
+        self.clients.pop((addr, session.filename), None)
+        if reason:
+            self.transfers_aborted += 1
+            self.log(f"✗ TFTP multicast member dropped: {addr[0]}:{addr[1]} ({reason})")
+            self._hook('abort', dict(session.get_stats('aborted'), client=f"{addr[0]}:{addr[1]}"), reason)
+
+        if not group.members:
+            self.recent_transfers.append(session.get_stats('complete'))
+            self._close(session)
+            return
+
+        if group.master is None:
+            group.elect()
+            session.state = 'oack'
+            session.failures = 0
+            session.sent_at = None
+            self._transmit(session)
+
+    def _schedule(self, session, due, kind=TIMER_RETRANSMIT):
+        """Queue a session timer; a new deadline makes the old entry stale"""
+        if kind == TIMER_RETRANSMIT:
+            session.deadline = due
+        heapq.heappush(self.timers, (due, next(self.timer_seq), kind, session))
+
+    def _timer_is_current(self, entry):
+        """Whether a timer entry still belongs to an open session's schedule"""
+        due, _, kind, session = entry
+        if self.sessions.get(session.sock.fileno()) is not session:
+            return False
+        return kind == TIMER_IDLE or session.deadline == due
+
+    def _check_timers(self):
+        """Retransmit, give up on, or expire transfers whose timer is due
+
+        Only the due entries are popped off the timer heap, so the cost
+        does not grow with the number of sessions waiting on clients.
+        """
+        now = time.time()
+        timers = self.timers
+        while timers and timers[0][0] <= now:
+            entry = heapq.heappop(timers)
+            if not self._timer_is_current(entry):
+                continue
+            _, _, kind, session = entry
+            if kind == TIMER_IDLE:
+                # ACKs move last_activity without touching the heap
+                idle_until = session.last_activity + self.idle_timeout
+                if idle_until > now:
+                    self._schedule(session, idle_until, TIMER_IDLE)
+                else:
+                    self.sessions_expired += 1
+                    self._abort(session, "idle session expired")
+                continue
+            session.failures += 1
+            if session.failures >= self.retries:
+                if session.group is not None:
+                    self._leave_group(session, session.group.master, "timed out")
+                else:
+                    self._abort(session, "timed out")
+                continue
+            session.rtt.backoff()
+            session.transfer.on_timeout()
+            self._transmit(session)
+
+    def _finish(self, session):
+        """Log and tear down a completed transfer"""
+        transfer = session.transfer
+        stats = session.get_stats('complete')
+        self.transfers_completed += 1
+        self.recent_transfers.append(stats)
+        if session.accepted:
+            self.log(f"  TFTP options accepted: {session.accepted}")
+        self.log(f"← TFTP Transfer complete: {session.filename} ({len(session.file)} bytes, "
+                 f"{transfer.total_blocks} blocks of {transfer.blksize}, "
+                 f"window {transfer.windowsize}, {transfer.retransmits} retransmits, "
+                 f"srtt {stats['srtt_ms']} ms)")
+        self._close(session)
+        self._hook('complete', stats)
+
+    def _abort(self, session, reason):
+        """Tear down a failed transfer"""
+        stats = session.get_stats('aborted')
+        self.transfers_aborted += 1
+        self.recent_transfers.append(stats)
+        self.log(f"✗ TFTP transfer aborted: {session.filename} ({reason})")
+        self._close(session)
+        self._hook('abort', stats, reason)
+
+    def _close(self, session):
+        """Unregister and close a transfer socket"""
+        self.sessions.pop(session.sock.fileno(), None)
+        self.scheduler.remove(session)
+        if self.clients.get(session.key) is session:
+            del self.clients[session.key]
+        if session.group is not None:
+            for member in session.group.members:
+                self.clients.pop((member, session.filename), None)
+            self.groups.pop(session.group.path, None)
+            self.multicast.release(session.group.address)
+        try:
+            self.selector.unregister(session.sock)
+        except (KeyError, ValueError):
+            pass
+        session.sock.close()
+        session.transfer.release()
+        self.files.release(session.file)
@@ -0,0 +1,85 @@
+"""
+Boot file access for the Termux PXE Boot TFTP server
+Read-only mmaps shared by every transfer of the same file
+"""
+import mmap
+import os
+import threading
+
+
+class MappedFile:
+    """A served file mapped read-only into memory
+
+    Blocks are read through memoryview slices of the map, so the file is
+    never copied into a per-transfer bytes object. Pages are loaded by
+    the kernel on demand and are shared with every other transfer (and
+    the page cache).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.refcount = 0
+
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.size = stat.st_size
+            self.mtime = stat.st_mtime
+            # mmap refuses zero-length files
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+        self.view = memoryview(self._map) if self._map is not None else memoryview(b'')
+
+    @property
+    def key(self):
+        """Identity of the file contents this map was created from"""
+        return (self.path, self.mtime, self.size)
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        """Unmap the file; every view handed out must already be released"""
+        self.view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A stray slice is still alive; the map is freed with it
+                pass
+            self._map = None
+
+
+class FileRegistry:
+    """Reference-counted set of open MappedFiles keyed by (path, mtime, size)
+
+    Concurrent transfers of the same file share one map. A file replaced
+    on disk gets a new map while transfers still using the old one
+    finish from it; the old map is closed when its last user releases it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+
+    def open(self, path):
+        """Return a shared MappedFile for path, taking a reference"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+
+        with self.lock:
+            mapped = self.files.get(key)
+            if mapped is None:
+                mapped = MappedFile(path)
+                self.files[mapped.key] = mapped
+            mapped.refcount += 1
+            return mapped
+
+    def release(self, mapped):
+        """Drop a reference; unmap once nobody uses the file"""
+        with self.lock:
+            mapped.refcount -= 1
+            if mapped.refcount > 0:
+                return
+            if self.files.get(mapped.key) is mapped:
+                del self.files[mapped.key]
+        mapped.close()
@@ -0,0 +1,121 @@
+"""
+File index for the Termux PXE Boot TFTP server
+In-memory name lookup over the served directories, refreshed by directory mtime
+"""
+import os
+import posixpath
+import threading
+import time
+
+# Seconds between checks of the directory mtimes
+REFRESH_INTERVAL = 2.0
+
+
+class FileIndex:
+    """Map of every servable name under the TFTP roots
+
+    The roots are walked once and afterwards a lookup is a dictionary
+    access. A name that is not in the map is a miss, so the dozen
+    config names PXELINUX probes per boot (UUID, 01-<mac>, hex IP
+    prefixes) are refused without touching the filesystem. Every
+    refresh_interval seconds the recorded directory mtimes are checked
+    (one stat per directory) and the index is rebuilt if files were
+    added, removed or renamed. Earlier roots win on name clashes.
+    Lookups may come from several threads (the engine and prewarm); the
+    check and rebuild run under a lock and the new map is swapped in whole.
+    """
+
+    def __init__(self, roots, refresh_interval=REFRESH_INTERVAL):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.refresh_interval = refresh_interval
+        self.files = {}
+        self.dir_mtimes = {}
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.refresh()
+
+    @staticmethod
+    def normalize(filename):
+        """Canonical relative name for a requested file, or None if it escapes the root"""
+        name = posixpath.normpath(filename.replace('\\', '/').lstrip('/'))
+        if name == '.' or name == '..' or name.startswith('../'):
+            return None
+        return name
+
+    def lookup(self, filename, count=True):
+        """Return the absolute path served for a requested name, or None
+
+        count=False leaves the hit/miss counters alone, for lookups that
+        are not client requests.
+        """
+        now = time.monotonic()
+        if now - self.checked >= self.refresh_interval:
+            with self.lock:
+                # Another thread may have checked while this one waited
+                if now - self.checked >= self.refresh_interval:
+                    self.checked = now
+                    if self._changed():
+                        self._rebuild()
+
+        name = self.normalize(filename)
+        path = self.files.get(name) if name is not None else None
+        if count:
+            if path is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return path
+
+    def refresh(self):
+        """Rebuild the index from disk"""
+        with self.lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Walk the roots and swap in a new map; caller holds the lock"""
+        files = {}
+        dir_mtimes = {}
+        for root in self.roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                try:
+                    dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+                except OSError:
+                    continue
+                for filename in filenames:
+                    path = os.path.realpath(os.path.join(dirpath, filename))
+                    # Symlinks may not lead out of the root
+                    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+                        continue
+                    name = os.path.relpath(os.path.join(dirpath, filename), root)
+                    files.setdefault(name.replace(os.sep, '/'), path)
+
+        self.files = files
+        self.dir_mtimes = dir_mtimes
+        self.checked = time.monotonic()
+        self.rebuilds += 1
+
+    def get_stats(self):
+        """Return index counters"""
+        return {
+            'entries': len(self.files),
+            'hits': self.hits,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds
+        }
+
+    def _changed(self):
+        """True if any indexed directory (or a root) changed since the last build"""
+        for root in self.roots:
+            if root not in self.dir_mtimes and os.path.isdir(root):
+                return True
+        for dirpath, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
@@ -0,0 +1,94 @@
+"""
+Multicast TFTP for Termux PXE Boot
+RFC 2090 transfer groups: one shared data stream, acknowledged by a master client
+"""
+import socket
+import struct
+
+# Administratively scoped group range and the registered tftp-mcast port
+DEFAULT_MULTICAST_GROUP = ('239.255.69.1', 1758)
+# Concurrent groups (one per file being multicast)
+MAX_GROUPS = 32
+# Keep multicast on the local segment
+MULTICAST_TTL = 1
+
+
+class MulticastGroup:
+    """Members of one multicast transfer and which of them is the master
+
+    Only the master client ACKs; the server paces the shared stream by
+    its ACKs. When the master has the whole file the next member is
+    elected and its first ACK tells the server where to restart, which
+    is how late joiners catch up on the blocks they missed. While only
+    one member is left, data goes to it by unicast.
+    """
+
+    def __init__(self, path, address, port):
+        self.path = path
+        self.address = address
+        self.port = port
+        self.members = []
+        self.master = None
+
+    def join(self, addr):
+        """Add a client; the first member becomes the master"""
+        if addr not in self.members:
+            self.members.append(addr)
+        if self.master is None:
+            self.master = addr
+
+    def leave(self, addr):
+        """Remove a client (finished, failed or gone)"""
+        if addr in self.members:
+            self.members.remove(addr)
+        if self.master == addr:
+            self.master = None
+
+    def elect(self):
+        """Make the longest-waiting member the master"""
+        self.master = self.members[0] if self.members else None
+        return self.master
+
+    def option(self, addr):
+        """Value of the multicast option in the OACK sent to a member"""
+        return f"{self.address},{self.port},{1 if addr == self.master else 0}"
+
+    def destination(self):
+        """Where DATA goes: the group, or the master when it is alone"""
+        if len(self.members) > 1:
+            return (self.address, self.port)
+        return self.master
+
+
+class GroupAddresses:
+    """Hands out one multicast address per concurrent group"""
+
+    def __init__(self, base_address, port, count=MAX_GROUPS):
+        self.base = struct.unpack('>I', socket.inet_aton(base_address))[0]
+        self.port = port
+        self.count = count
+        self.in_use = set()
+
+    def allocate(self):
+        """Return a free group address, or None when all are taken"""
+        for offset in range(self.count):
+            address = socket.inet_ntoa(struct.pack('>I', self.base + offset))
+            if address not in self.in_use:
+                self.in_use.add(address)
+                return address
+        return None
+
+    def release(self, address):
+        """Return an address to the pool"""
+        self.in_use.discard(address)
+
+
+def open_group_socket(interface=None):
+    """Non-blocking socket that sends to multicast groups from a fresh TID"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+    if interface:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    sock.bind((interface or '', 0))
+    sock.setblocking(False)
+    return sock
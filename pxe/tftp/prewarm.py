@@ -0,0 +1,113 @@
+"""
+Boot asset pre-warming for the Termux PXE Boot TFTP server
+Reads the boot menus, finds the kernels/initrds they reference and pulls them
+into memory before the first client asks for them
+"""
+import os
+import re
+import time
+from urllib.parse import urlparse
+
+# Boot menus scanned for referenced files, relative to the TFTP roots
+BOOT_MENUS = ['pxelinux.cfg/default', 'ipxe.cfg', 'boot.ipxe']
+# Chunk size for sequential readahead of files too large for the cache
+READAHEAD_CHUNK = 1024 * 1024
+
+# PXELINUX: KERNEL/LINUX/INITRD/UI/COM32 <file>, plus initrd=a,b in APPEND lines
+_PXELINUX_DIRECTIVE = re.compile(r'^\s*(?:kernel|linux|initrd|ui|com32|fdt)\s+(\S+)', re.IGNORECASE)
+_INITRD_ARGUMENT = re.compile(r'\binitrd=(\S+)', re.IGNORECASE)
+# iPXE: kernel/initrd/chain/imgfetch/module <file> [args]
+_IPXE_COMMAND = re.compile(r'^\s*(?:kernel|initrd|chain|imgfetch|module)\s+(?:--\S+\s+)*(\S+)',
+                           re.IGNORECASE)
+
+
+def find_menu_references(text):
+    """Return the file names a PXELINUX or iPXE menu refers to, in order"""
+    names = []
+    for line in text.splitlines():
+        for pattern in (_PXELINUX_DIRECTIVE, _IPXE_COMMAND):
+            match = pattern.match(line)
+            if match:
+                names.append(match.group(1))
+        for match in _INITRD_ARGUMENT.finditer(line):
+            names.extend(match.group(1).split(','))
+
+    references = []
+    for name in names:
+        if '://' in name:
+            # Files the menu fetches over HTTP may also live under a TFTP root
+            name = urlparse(name).path
+        name = name.strip().strip('"\'')
+        if name and not name.startswith('$') and name not in references:
+            references.append(name)
+    return references
+
+
+def find_boot_assets(index):
+    """Resolve the boot menus and every file they reference to paths
+
+    Lookups are not counted, so the index stats only show client requests.
+    """
+    paths = []
+    for menu in BOOT_MENUS:
+        menu_path = index.lookup(menu, count=False)
+        if menu_path is None:
+            continue
+        paths.append(menu_path)
+        try:
+            with open(menu_path, 'r', errors='ignore') as f:
+                references = find_menu_references(f.read())
+        except OSError:
+            continue
+        for name in references:
+            path = index.lookup(name, count=False)
+            if path is not None and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _readahead(path):
+    """Ask the kernel to page a file in and read it through once"""
+    with open(path, 'rb') as f:
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        while f.read(READAHEAD_CHUNK):
+            pass
+
+
+def prewarm(index, cache, log=None):
+    """Load the warm set into the asset cache (or the page cache when too big)
+
+    Returns a summary dict; meant to run on a background thread.
+    """
+    log = log or (lambda message: None)
+    started = time.time()
+    paths = find_boot_assets(index)
+    warmed = 0
+    total_bytes = 0
+
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+            if size <= cache.max_bytes:
+                cache.load(path)
+            else:
+                _readahead(path)
+            warmed += 1
+            total_bytes += size
+        except OSError as e:
+            log(f"✗ Pre-warm skipped {path}: {e}")
+
+    summary = {
+        'files': warmed,
+        'bytes': total_bytes,
+        'seconds': round(time.time() - started, 3)
+    }
+    if warmed:
+        log(f"✓ Boot assets resident: {warmed} files, {total_bytes / (1024 * 1024):.1f} MB "
+            f"in {summary['seconds']} s")
+    return summary
@@ -0,0 +1,136 @@
+"""
+TFTP protocol helpers for Termux PXE Boot
+Packet parsing/building and option negotiation (RFC 1350, 2347, 2348, 2349, 7440)
+"""
+import socket
+import struct
+
+# Opcodes
+OP_RRQ = 1
+OP_WRQ = 2
+OP_DATA = 3
+OP_ACK = 4
+OP_ERROR = 5
+OP_OACK = 6
+
+# Error codes
+ERR_NOT_DEFINED = 0
+ERR_FILE_NOT_FOUND = 1
+ERR_ACCESS_VIOLATION = 2
+ERR_ILLEGAL_OPERATION = 4
+ERR_UNKNOWN_TID = 5
+ERR_OPTION_REFUSED = 8
+
+# Transfer parameters (RFC 1350 defaults, RFC 2348/2349/7440 limits)
+DEFAULT_BLKSIZE = 512
+MIN_BLKSIZE = 8
+MAX_BLKSIZE = 65464
+DEFAULT_TIMEOUT = 5
+# Consecutive timeouts (each with a doubled RTO) before a transfer is abandoned
+DEFAULT_RETRIES = 10
+MAX_WINDOWSIZE = 64
+
+# Path MTU fallback when the kernel cannot tell us
+DEFAULT_MTU = 1500
+
+# Precompiled layouts: the opcode, and opcode + block number/error code
+OPCODE = struct.Struct('>H')
+HEADER = struct.Struct('>HH')
+
+
+def parse_request(data):
+    """Parse an RRQ/WRQ packet
+
+    Returns (opcode, filename, mode, options); options maps lowercase
+    option names to their string values.
+    """
+    opcode = OPCODE.unpack_from(data)[0]
+    fields = bytes(data[2:]).split(b'\x00')
+
+    filename = fields[0].decode('utf-8', errors='ignore')
+    mode = fields[1].decode('ascii', errors='ignore').lower() if len(fields) > 2 else 'octet'
+
+    # RFC 2347 options follow the mode string
+    options = {}
+    for i in range(2, len(fields) - 1, 2):
+        name = fields[i].decode('ascii', errors='ignore').lower()
+        if not name:
+            break
+        options[name] = fields[i + 1].decode('ascii', errors='ignore')
+
+    return opcode, filename, mode, options
+
+
+def get_max_blksize(transfer_socket):
+    """Largest block size that fits in one datagram on the route to the client
+
+    The socket must already be connected to the client.
+    """
+    try:
+        mtu = transfer_socket.getsockopt(socket.IPPROTO_IP, getattr(socket, 'IP_MTU', 14))
+    except OSError:
+        mtu = DEFAULT_MTU
+
+    # IP header (20) + UDP header (8) + TFTP DATA header (4)
+    return max(DEFAULT_BLKSIZE, min(mtu - 32, MAX_BLKSIZE))
+
+
+def _int_option(options, name):
+    """Return an integer option value, or 0 when missing/malformed"""
+    try:
+        return int(options.get(name, 0))
+    except ValueError:
+        return 0
+
+
+def negotiate_options(options, file_size, max_blksize=MAX_BLKSIZE, max_windowsize=MAX_WINDOWSIZE):
+    """Select the option values the server accepts for a read request
+
+    Unknown or out-of-range options are dropped, as RFC 2347 requires.
+    Returns an ordered dict suitable for build_oack(); empty means the
+    client gets a plain RFC 1350 transfer.
+    """
+    accepted = {}
+
+    blksize = _int_option(options, 'blksize')
+    if blksize >= MIN_BLKSIZE:
+        accepted['blksize'] = min(blksize, max_blksize)
+
+    timeout = _int_option(options, 'timeout')
+    if 1 <= timeout <= 255:
+        accepted['timeout'] = timeout
+
+    if 'tsize' in options:
+        # A read request carries tsize=0, the reply carries the real size
+        accepted['tsize'] = file_size
+
+    windowsize = _int_option(options, 'windowsize')
+    if 1 <= windowsize <= 65535 and max_windowsize > 0:
+        accepted['windowsize'] = min(windowsize, max_windowsize)
+
+    return accepted
+
+
+def build_oack(accepted):
+    """Build an OACK packet for the accepted options"""
+    packet = OPCODE.pack(OP_OACK)
+    for name, value in accepted.items():
+        packet += name.encode('ascii') + b'\x00' + str(value).encode('ascii') + b'\x00'
+    return packet
+
+
+def build_error(code, message):
+    """Build an ERROR packet"""
+    return HEADER.pack(OP_ERROR, code) + message.encode('utf-8', errors='ignore') + b'\x00'
+
+
+def build_data(block_num, block_data):
+    """Build a DATA packet"""
+    return HEADER.pack(OP_DATA, block_num & 0xFFFF) + block_data
+
+
+def parse_ack(packet):
+    """Return (opcode, block) for an ACK/ERROR packet, or (None, None)"""
+    if len(packet) < 4:
+        return None, None
+    return HEADER.unpack_from(packet)
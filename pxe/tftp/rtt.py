@@ -0,0 +1,44 @@
+"""
+Retransmission timer for the Termux PXE Boot TFTP server
+Per-transfer RTT estimation in the style of RFC 6298
+"""
+
+# Floor for the retransmission timeout; a LAN round trip is a few ms
+MIN_RTO = 0.02
+# Used until the first RTT sample arrives (slow PXE ROMs must not be rushed)
+INITIAL_RTO = 1.0
+# Clock granularity term of the RTO formula
+CLOCK_GRANULARITY = 0.001
+
+
+class RTTEstimator:
+    """Smoothed RTT and retransmission timeout for one transfer
+
+    Samples must only be taken from packets that were sent once (Karn's
+    rule); the caller is responsible for that. Every timeout doubles the
+    RTO up to max_rto and the backed-off value is kept until a fresh
+    sample arrives.
+    """
+
+    def __init__(self, max_rto, min_rto=MIN_RTO, initial_rto=INITIAL_RTO):
+        self.min_rto = min(min_rto, max_rto)
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = min(initial_rto, max_rto)
+
+    def sample(self, rtt):
+        """Fold one round-trip measurement (seconds) into the estimate"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        rto = self.srtt + max(CLOCK_GRANULARITY, 4 * self.rttvar)
+        self.rto = max(self.min_rto, min(rto, self.max_rto))
+
+    def backoff(self):
+        """Double the timeout after a retransmission"""
+        self.rto = min(self.rto * 2, self.max_rto)
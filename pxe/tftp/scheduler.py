@@ -0,0 +1,126 @@
+"""
+Transmit scheduler for the Termux PXE Boot TFTP server
+Deficit round robin across transfers under a global token-bucket rate cap
+"""
+import time
+from collections import deque
+
+from pxe.tftp.protocol import MAX_BLKSIZE
+
+# Bytes of credit a weight-1 transfer earns per round (one 1468-byte block + header)
+DEFAULT_QUANTUM = 1472
+# Burst allowance of the global bucket, in seconds of the configured rate
+BURST_SECONDS = 0.05
+# The bucket must hold at least one packet of the largest block size
+MIN_BURST = MAX_BLKSIZE + 4
+
+
+class FairScheduler:
+    """Share the uplink between transfers that have DATA waiting
+
+    Each queued transfer earns quantum * weight bytes of credit per
+    round and spends it on whole packets, so a client that ACKs quickly
+    cannot starve slow ones. When rate (bytes/s) is set, a token bucket
+    caps the total across all transfers; otherwise only the round robin
+    order applies. Weights are looked up by client IP address.
+    packet_size(session) gives the size of a transfer's next packet, so
+    a throttled loop sleeps until the bucket can pay for it.
+    """
+
+    def __init__(self, rate=None, weights=None, quantum=DEFAULT_QUANTUM, packet_size=None):
+        self.rate = rate or None
+        self.weights = dict(weights or {})
+        for client, weight in self.weights.items():
+            # A share of zero would never earn the credit for a packet
+            if not weight > 0:
+                raise ValueError(f"TFTP client weight for {client} must be positive, not {weight}")
+        self.quantum = quantum
+        self.packet_size = packet_size or (lambda session: quantum)
+        self.burst = max(self.rate * BURST_SECONDS, MIN_BURST) if self.rate else None
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+        self.active = deque()
+        self.deficit = {}
+        self.throttled = 0
+
+    def weight(self, session):
+        """Relative share of a transfer"""
+        return self.weights.get(session.addr[0], 1)
+
+    def add(self, session):
+        """Queue a transfer that has packets to send"""
+        if session not in self.deficit:
+            self.deficit[session] = 0
+            self.active.append(session)
+
+    def remove(self, session):
+        """Forget a transfer (finished, aborted or window sent)"""
+        if self.deficit.pop(session, None) is not None:
+            try:
+                self.active.remove(session)
+            except ValueError:
+                pass
+
+    def __contains__(self, session):
+        return session in self.deficit
+
+    def service(self, send):
+        """Run round robin turns until the queue drains or the bucket is empty
+
+        send(session, budget) transmits at most budget bytes and returns
+        (bytes_sent, more); more is True while the session still has
+        packets waiting in its window.
+        """
+        self._refill()
+
+        while self.active:
+            session = self.active[0]
+            if self.rate is not None and self.tokens < self.packet_size(session):
+                # Wait for the bucket; a turn not taken earns no credit
+                self.throttled += 1
+                break
+            self.active.popleft()
+            earned = self.quantum * self.weight(session)
+            # Unspent credit never exceeds one packet plus a quantum (DRR)
+            budget = self.deficit[session] = min(self.deficit[session] + earned,
+                                                 self.packet_size(session) + earned)
+            if self.rate is not None and self.tokens < budget:
+                budget = self.tokens
+
+            sent, more = send(session, budget)
+            if self.rate is not None:
+                self.tokens -= sent
+
+            if session not in self.deficit:
+                # send() aborted the transfer
+                continue
+            if not more:
+                # Idle flows do not bank credit (DRR)
+                del self.deficit[session]
+                continue
+
+            self.deficit[session] -= sent
+            self.active.append(session)
+
+    def next_wakeup(self):
+        """Seconds until the bucket can pay for the next queued packet, or None"""
+        if not self.active or self.rate is None:
+            return None
+        return max(0.0, (self.packet_size(self.active[0]) - self.tokens) / self.rate)
+
+    def get_stats(self):
+        """Return scheduler counters"""
+        return {
+            'rate_limit': self.rate,
+            'queued_transfers': len(self.active),
+            'throttled': self.throttled
+        }
+
+    def _refill(self):
+        """Add the tokens earned since the last call"""
+        if self.rate is None:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
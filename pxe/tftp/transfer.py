@@ -0,0 +1,107 @@
+"""
+TFTP read transfers for Termux PXE Boot
+Windowed (RFC 7440) DATA/ACK state machine shared by every server
+"""
+from pxe.tftp.protocol import OP_DATA, DEFAULT_BLKSIZE, HEADER
+
+
+class ReadTransfer:
+    """State of one read transfer, independent of any socket
+
+    Blocks are tracked by 0-based index; the block number on the wire is
+    (index + 1) & 0xFFFF so files longer than 65535 blocks roll over.
+    With windowsize N, up to N blocks are in flight before an ACK is
+    required. ACKs are cumulative: an ACK short of the window end means the
+    client lost a block and the next window restarts right after it.
+
+    file_data may be any buffer (bytes, mmap, memoryview). Blocks are
+    copied from a memoryview of it straight into one reusable packet
+    buffer, so memory per transfer is one block regardless of file size.
+    """
+
+    def __init__(self, file_data, blksize=DEFAULT_BLKSIZE, windowsize=1):
+        self.view = memoryview(file_data)
+        self.size = len(self.view)
+        self.blksize = blksize
+        self.windowsize = windowsize
+        # A short (possibly empty) final block terminates the transfer
+        self.total_blocks = self.size // blksize + 1
+
+        self.packet = bytearray(4 + blksize)
+        self.packet_view = memoryview(self.packet)
+
+        self.acked = 0          # blocks acknowledged by the client
+        self.next_index = 0     # next block index to transmit
+        self.highest_sent = 0   # one past the highest index ever transmitted
+        self.retransmits = 0
+
+    @property
+    def done(self):
+        """True once the final block has been acknowledged"""
+        return self.acked >= self.total_blocks
+
+    @property
+    def window_pending(self):
+        """True while the current window still has blocks to send"""
+        return self.next_index < min(self.acked + self.windowsize, self.total_blocks)
+
+    def block_packet(self, index):
+        """Build the DATA packet for a block index in the shared packet buffer
+
+        The returned view is only valid until the next call.
+        """
+        offset = index * self.blksize
+        length = min(self.blksize, self.size - offset)
+
+        HEADER.pack_into(self.packet, 0, OP_DATA, (index + 1) & 0xFFFF)
+        self.packet_view[4:4 + length] = self.view[offset:offset + length]
+        return self.packet_view[:4 + length]
+
+    def next_window(self):
+        """Yield the DATA packets still to be sent in the current window
+
+        Each packet must be sent before the next one is requested.
+        """
+        end = min(self.acked + self.windowsize, self.total_blocks)
+
+        while self.next_index < end:
+            index = self.next_index
+            if index < self.highest_sent:
+                self.retransmits += 1
+            self.next_index += 1
+            self.highest_sent = max(self.highest_sent, self.next_index)
+            yield self.block_packet(index)
+
+    def on_ack(self, block_num):
+        """Apply a cumulative ACK
+
+        Returns True if it acknowledged new data. Duplicate and stale ACKs
+        are ignored so they never trigger a resend (Sorcerer's Apprentice).
+        """
+        delta = (block_num - self.acked) & 0xFFFF
+        if delta == 0 or delta > self.highest_sent - self.acked:
+            return False
+
+        self.acked += delta
+        # Resume right after the last block the client received in order
+        self.next_index = self.acked
+        return True
+
+    def rewind(self, block_num):
+        """Restart after the last block a new receiver already holds
+
+        Used when a multicast group elects a new master (RFC 2090); only
+        meaningful while the file fits in 65535 blocks.
+        """
+        self.acked = min(block_num, self.total_blocks)
+        self.next_index = self.acked
+
+    def on_timeout(self):
+        """Rewind to the first unacknowledged block"""
+        self.next_index = self.acked
+
+    def release(self):
+        """Release the views so the underlying file map can be closed"""
+        self.packet_view.release()
+        self.view.release()
+
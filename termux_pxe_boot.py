@@ -7,36 +7,110 @@ No Root Required - Works in Android Termux
 import socket
 import threading
 import os
-import struct
 import time
 import json
 from datetime import datetime
 import sys
 import signal
 
+from pxe.tftp import TFTPEngine, ASSET_CACHE
+from pxe.dhcp import (
+    DHCPBatcher, ReplyTemplate, ReplyTemplates, reply_buffer, parse_options, ZERO_IP, BROADCAST_FLAG,
+    DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPDECLINE, DHCPACK, DHCPNAK, DHCPRELEASE, DHCPINFORM
+)
+from pxe.dhcp.dora import TransactionTable, ACK, NAK
+from pxe.dhcp.leases import LeasePool
+from pxe.dhcp.journal import LeaseJournal
+from pxe.dhcp.bootfile import (
+    BootFileSelector, DEFAULT_BOOT_FILES, DEFAULT_IPXE_SCRIPT, DEFAULT_HTTP_PORT, OPTION_CLIENT_UUID,
+    is_http_boot
+)
+from pxe.dhcp.proxy import (
+    MODE_FULL, MODE_PROXY, PROXY_PORT, proxy_vendor_options, boot_item, is_boot_client
+)
+from pxe.dhcp.storm import (
+    StormGuard, CLIENT_RATE, CLIENT_BURST, GLOBAL_RATE, GLOBAL_BURST, REPLY_TTL
+)
+from pxe.buffers import BufferPool, DHCP_BUFFER_SIZE, DHCP_BUFFERS
+from config.settings import config_directory
+
 class TermuxPXEServer:
     """Complete PXE Boot Server for Termux"""
     
-    def __init__(self):
+    def __init__(self, base_dir=None):
         self.running = False
         self.dhcp_socket = None
         self.tftp_socket = None
         self.dhcp_thread = None
         self.tftp_thread = None
+        self.tftp_engine = None
+        # Requests are received into reusable buffers, handed back by the handler
+        self.dhcp_buffers = BufferPool(DHCP_BUFFER_SIZE, DHCP_BUFFERS)
+        self.dhcp_batcher = None
+        self.proxy_socket = None
+        self.proxy_thread = None
+        self.proxy_batcher = None
+        # Rate limits and recent replies, screened before a request is parsed
+        self.dhcp_guard = None
+        self.proxy_guard = None
         
         # Configuration
         self.config = {
             'server_ip': self._get_local_ip(),
             'dhcp_port': 67,
             'tftp_port': 69,
+            # HTTP file server that the boot menus and UEFI HTTP boot URLs point at
+            'http_port': DEFAULT_HTTP_PORT,
             'subnet_mask': '255.255.255.0',
             'gateway': '192.168.1.1',
             'dns_server': '8.8.8.8',
-            'lease_time': 86400
+            'lease_time': 86400,
+            # Addresses handed out to clients (the server and gateway are skipped)
+            'dhcp_range_start': '192.168.1.150',
+            'dhcp_range_end': '192.168.1.200',
+            # 'full' hands out addresses; 'proxy' only adds PXE boot information next to
+            # the router's DHCP server, and answers boot server requests on dhcp_proxy_port
+            'dhcp_mode': MODE_FULL,
+            'dhcp_proxy_port': PROXY_PORT,
+            # Loader per client architecture (option 93), per-machine overrides
+            # by MAC or SMBIOS UUID, and what iPXE is given once it is running
+            'dhcp_boot_files': dict(DEFAULT_BOOT_FILES),
+            'dhcp_boot_overrides': {},
+            'dhcp_ipxe_script': DEFAULT_IPXE_SCRIPT,
+            # Lease journal and snapshot, so a restart remembers every assignment
+            # (each server keeps its own; their pools are not the same)
+            'dhcp_lease_dir': os.path.join(config_directory(), 'leases', 'pxe-server'),
+            # Storm suppression: requests per second and burst per client MAC and for
+            # the whole socket, and seconds a reply is resent for retransmits
+            'dhcp_client_rate': CLIENT_RATE,
+            'dhcp_client_burst': CLIENT_BURST,
+            'dhcp_rate_limit': GLOBAL_RATE,
+            'dhcp_rate_burst': GLOBAL_BURST,
+            'dhcp_reply_cache_s': REPLY_TTL,
+            'tftp_cache_mb': 128,
+            # RFC 2090 multicast TFTP for booting many identical clients
+            'tftp_multicast': False,
+            'tftp_multicast_group': '239.255.69.1',
+            'tftp_multicast_port': 1758,
+            # Total TFTP uplink cap in KiB/s (0 = unlimited) and per-client-IP shares
+            'tftp_rate_limit_kb': 0,
+            'tftp_client_weights': {},
+            # Admission control: concurrent transfers and RRQs waiting for a slot
+            'tftp_max_transfers': 32,
+            'tftp_max_queued': 64,
+            # Load the boot menu's kernels/initrds into memory at startup
+            'tftp_prewarm': True
         }
         
+        # Address pool, and DISCOVER/OFFER/REQUEST/ACK state per transaction
+        self.dhcp_journal = None
+        self._prepare_dhcp_pool()
+        # OFFER/ACK packets prebuilt from the config; replies patch in the client
+        self.dhcp_templates = ReplyTemplates(self._build_dhcp_template)
+        self._prepare_dhcp_templates()
+        
         # Setup directories
-        self.base_dir = os.path.expanduser('~/.termux_pxe_boot')
+        self.base_dir = base_dir or os.path.expanduser('~/.termux_pxe_boot')
         self.tftp_dir = os.path.join(self.base_dir, 'tftp')
         self.logs_dir = os.path.join(self.base_dir, 'logs')
         
@@ -383,11 +457,24 @@ Access:
         
         self.running = True
         
+        # Pool and replies from the config as it is now (setup may have moved the
+        # server, gateway and range); leases from the last run must be back before
+        # the first OFFER
+        self._prepare_dhcp_pool()
+        self._open_lease_journal()
+        self._prepare_dhcp_templates()
+        
         # Start DHCP server
         self.dhcp_thread = threading.Thread(target=self._run_dhcp_server, daemon=True)
         self.dhcp_thread.start()
         self.log("✓ DHCP server thread started")
         
+        if self.config['dhcp_mode'] == MODE_PROXY:
+            # PXE boot server for clients that already have the router's lease
+            self.proxy_thread = threading.Thread(target=self._run_boot_server, daemon=True)
+            self.proxy_thread.start()
+            self.log("✓ proxyDHCP boot server thread started")
+        
         # Start TFTP server
         self.tftp_thread = threading.Thread(target=self._run_tftp_server, daemon=True)
         self.tftp_thread.start()
@@ -413,6 +500,20 @@ Access:
         self.log("Press Ctrl+C to stop")
         self.log("")
         
+    def _open_lease_journal(self):
+        """Restore saved leases and journal every change from now on"""
+        if self.dhcp_journal:
+            return
+        journal = LeaseJournal(self.config['dhcp_lease_dir'])
+        try:
+            restored = self.dhcp_leases.attach(journal)
+        except OSError as e:
+            self.log(f"✗ Lease journal unavailable, leases will not survive a restart: {e}")
+            return
+        self.dhcp_journal = journal
+        stats = journal.get_stats()
+        self.log(f"✓ Restored {restored} DHCP leases ({stats['replayed']} records in {stats['replay_ms']} ms)")
+        
     def _show_network_diagnostics(self):
         """Show network diagnostic information"""
         import subprocess
@@ -473,6 +574,25 @@ Access:
             except:
                 pass
                 
+        if self.dhcp_batcher:
+            self.dhcp_batcher.stop()
+            
+        if self.proxy_socket:
+            try:
+                self.proxy_socket.close()
+            except:
+                pass
+                
+        if self.proxy_batcher:
+            self.proxy_batcher.stop()
+            
+        if self.dhcp_journal:
+            self.dhcp_journal.close()
+            self.dhcp_journal = None
+            
+        if self.tftp_engine:
+            self.tftp_engine.stop()
+            
         if self.tftp_socket:
             try:
                 self.tftp_socket.close()
@@ -498,7 +618,10 @@ Access:
                     self.config['dhcp_port'] = port
                     self.log(f"✓ DHCP Server listening on port {port}")
                     self.log(f"  Server IP: {self.config['server_ip']}")
-                    self.log(f"  Offering IPs: 192.168.1.150-200")
+                    if self.config['dhcp_mode'] == MODE_PROXY:
+                        self.log("  proxyDHCP: boot information only, addresses come from the router")
+                    else:
+                        self.log(f"  Offering IPs: {self.config['dhcp_range_start']}-{self.config['dhcp_range_end']}")
                     bound = True
                     break
                 except PermissionError:
@@ -515,17 +638,18 @@ Access:
             if not bound:
                 return
                 
-            self.dhcp_socket.settimeout(1.0)
+            # Each wakeup drains every queued request to a fixed worker pool,
+            # after floods and retransmits are screened out
+            self.dhcp_guard = self._create_storm_guard()
+            self.dhcp_batcher = DHCPBatcher(self.dhcp_socket, self._handle_dhcp, self.dhcp_buffers,
+                                            guard=self.dhcp_guard)
             
             # Send periodic DHCP Discover broadcasts
             self._announce_dhcp_server()
             
             while self.running:
                 try:
-                    data, addr = self.dhcp_socket.recvfrom(1024)
-                    threading.Thread(target=self._handle_dhcp, args=(data, addr), daemon=True).start()
-                except socket.timeout:
-                    continue
+                    self.dhcp_batcher.poll()
                 except Exception as e:
                     if self.running:
                         self.log(f"DHCP error: {e}")
@@ -533,6 +657,34 @@ Access:
         except Exception as e:
             self.log(f"Failed to start DHCP server: {e}")
 
+    def _run_boot_server(self):
+        """Run the proxyDHCP boot server (PXE boot server discovery, port 4011)"""
+        try:
+            self.proxy_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.proxy_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.proxy_socket.bind(('', self.config['dhcp_proxy_port']))
+            self.log(f"✓ proxyDHCP boot server listening on port {self.config['dhcp_proxy_port']}")
+            
+            self.proxy_guard = self._create_storm_guard()
+            self.proxy_batcher = DHCPBatcher(self.proxy_socket, self._handle_boot_server, self.dhcp_buffers,
+                                             guard=self.proxy_guard)
+            while self.running:
+                try:
+                    self.proxy_batcher.poll()
+                except Exception as e:
+                    if self.running:
+                        self.log(f"proxyDHCP error: {e}")
+                        
+        except Exception as e:
+            self.log(f"Failed to start proxyDHCP boot server: {e}")
+            
+    def _create_storm_guard(self):
+        """Rate limits and reply cache for one DHCP socket, from the config"""
+        return StormGuard(rate=self.config['dhcp_client_rate'], burst=self.config['dhcp_client_burst'],
+                          global_rate=self.config['dhcp_rate_limit'],
+                          global_burst=self.config['dhcp_rate_burst'],
+                          ttl=self.config['dhcp_reply_cache_s'])
+            
     def _announce_dhcp_server(self):
         """Announce DHCP server availability"""
         self.log(f"🌐 DHCP Server ready at {self.config['server_ip']}:{self.config['dhcp_port']}")
@@ -566,145 +718,224 @@ Access:
                 # Extract client MAC address
                 mac = ':'.join([f'{b:02x}' for b in data[28:28+hlen]])
                 
-                # Check for PXE-specific options
-                is_pxe = False
-                pxe_detected = False
+                # One pass over the options; PXE ROMs send vendor class PXEClient
+                options = parse_options(data)
+                kind = "PXE DHCP" if options.is_pxe else "DHCP"
                 
-                # Check magic cookie
-                if data[236:240] == b'\x63\x82\x53\x63':
-                    pxe_detected = True
-                    
-                # Check for PXEClient in options (option 60)
-                if len(data) > 300:  # Options section
-                    # Look for option 60 (PXEClient)
-                    options_section = data[240:]
-                    for i in range(0, len(options_section), 1):
-                        if i + 1 >= len(options_section):
-                            break
-                        if options_section[i] == 0x3c:  # Option 60
-                            option_len = options_section[i+1] if i+1 < len(options_section) else 0
-                            if option_len > 0 and i+2+option_len <= len(options_section):
-                                if options_section[i+2:i+2+option_len] == b'PXEClient':
-                                    pxe_detected = True
-                                    break
+                if self.config['dhcp_mode'] == MODE_PROXY:
+                    # The router answers everything else
+                    if options.message_type == DHCPDISCOVER and is_boot_client(options):
+                        self.log(f"→ {kind} Discover from {addr[0]} (MAC: {mac}), answering as proxyDHCP")
+                        boot_file = self._send_proxy_reply(DHCPOFFER, data, mac, options,
+                                                           self.dhcp_socket, ('255.255.255.255', 68))
+                        self.log(f"← proxyDHCP Offer sent to {mac} - Boot: {boot_file}")
+                    return
                 
-                # Also check if boot filename is requested
-                is_pxe = pxe_detected
-                
-                if is_pxe:
-                    self.log(f"→ PXE DHCP Request from {addr[0]} (MAC: {mac})")
-                    self._send_dhcp_offer(data, addr, mac)
-                else:
-                    # Still respond to regular DHCP requests
-                    self.log(f"→ DHCP Request from {addr[0]} (MAC: {mac}) - Standard DHCP")
-                    self._send_dhcp_offer(data, addr, mac)
+                # DORA: answer by message type (option 53); plain BOOTP gets an offer
+                msg_type = options.message_type
+                if msg_type in (DHCPDISCOVER, None):
+                    self.log(f"→ {kind} Discover from {addr[0]} (MAC: {mac})")
+                    self._send_dhcp_offer(data, addr, mac, options)
+                elif msg_type == DHCPREQUEST:
+                    self.log(f"→ {kind} Request from {addr[0]} (MAC: {mac})")
+                    self._answer_dhcp_request(data, mac, options)
+                elif msg_type == DHCPRELEASE:
+                    address = socket.inet_ntoa(bytes(data[12:16]))
+                    self.dhcp_transactions.release(mac, address)
+                    self.log(f"→ DHCP Release from {mac}: {address}")
+                elif msg_type == DHCPDECLINE:
+                    address = options.address(50)
+                    self.dhcp_transactions.decline(mac, address)
+                    self.log(f"✗ DHCP Decline from {mac}: {address} is already in use")
+                elif msg_type == DHCPINFORM:
+                    self._send_dhcp_reply(DHCPACK, data, mac, None, options)
                     
         except Exception as e:
             self.log(f"DHCP handler error: {e}")
             
-    def _send_dhcp_offer(self, request_data, addr, mac):
+    def _send_dhcp_offer(self, request_data, addr, mac, options):
         """Send DHCP offer with PXE options"""
         try:
-            # Build DHCP offer packet (minimum size 548 bytes)
-            response = bytearray(548)
-            
-            # DHCP header
-            response[0] = 2  # BOOTREPLY
-            response[1] = 1  # Ethernet
-            response[2] = 6  # MAC length
-            response[3] = 0  # Hops
-            
-            # Transaction ID (copy from request)
-            response[4:8] = request_data[4:8]
-            
-            # Seconds, flags
-            response[8:12] = b'\x00' * 4
-            
-            # Client IP (0.0.0.0)
-            response[12:16] = b'\x00' * 4
-            
-            # Your IP (offered IP)
-            offered_ip = '192.168.1.150'
-            response[16:20] = socket.inet_aton(offered_ip)
-            
-            # Server IP
-            response[20:24] = socket.inet_aton(self.config['server_ip'])
-            
-            # Gateway IP
-            response[24:28] = socket.inet_aton(self.config['gateway'])
-            
-            # Client MAC address
-            response[28:34] = request_data[28:34]
+            offered_ip = self.dhcp_transactions.discover(bytes(request_data[4:8]), mac,
+                                                         options.address(50))
+            if offered_ip is None:
+                self.log(f"✗ No free address for {mac} - DHCP pool exhausted")
+                return
+            boot_file = self._send_dhcp_reply(DHCPOFFER, request_data, mac, offered_ip, options)
+            self.log(f"← DHCP Offer sent to {addr[0]} - IP: {offered_ip}, Boot: {boot_file}")
             
-            # Boot filename at position 108-128
-            boot_file = b'pxelinux.0'
-            boot_file_len = len(boot_file)
+        except Exception as e:
+            self.log(f"DHCP offer error: {e}")
             
-            # Clear boot filename area
-            response[108:128] = b'\x00' * 20
-            # Copy boot filename
-            response[108:108+boot_file_len] = boot_file
+    def _answer_dhcp_request(self, request_data, mac, options):
+        """ACK, NAK or ignore a DHCPREQUEST"""
+        try:
+            ciaddr = socket.inet_ntoa(bytes(request_data[12:16]))
+            verdict, address = self.dhcp_transactions.request(
+                bytes(request_data[4:8]), mac,
+                requested=options.address(50),
+                server_id=options.address(54),
+                ciaddr=ciaddr if ciaddr != '0.0.0.0' else None,
+                our_id=self.config['server_ip'])
             
-            # Magic cookie at 236-240
-            response[236:240] = b'\x63\x82\x53\x63'
+            if verdict == ACK:
+                boot_file = self._send_dhcp_reply(DHCPACK, request_data, mac, address, options)
+                self.log(f"← DHCP Ack sent to {mac} - IP: {address}, Boot: {boot_file}")
+            elif verdict == NAK:
+                self._send_dhcp_reply(DHCPNAK, request_data, mac, None, options)
+                self.log(f"← DHCP Nak sent to {mac}")
+                
+        except Exception as e:
+            self.log(f"DHCP request error: {e}")
             
-            # DHCP options
-            idx = 240
+    def _send_dhcp_reply(self, msg_type, request_data, mac, address, options):
+        """Send an OFFER/ACK/NAK for a request, patched into a prebuilt template
+        
+        Returns the boot file offered to the client.
+        """
+        ciaddr = bytes(request_data[12:16])
+        xid = bytes(request_data[4:8])
+        chaddr = bytes(request_data[28:34])
+        
+        if msg_type == DHCPNAK:
+            # A NAK carries no address or boot information (RFC 2131 table 3)
+            reply = reply_buffer().begin(xid, chaddr, giaddr=bytes(request_data[24:28]))
+            reply.option_byte(53, DHCPNAK)
+            reply.option(54, socket.inet_aton(self.config['server_ip']))
+            self._send_reply(self.dhcp_socket, self.dhcp_guard, request_data, reply.finish(),
+                             ('255.255.255.255', 68))
+            return None
+        
+        # The loader for this client's architecture, then the template that offers it;
+        # xid, flags and chaddr come from the request
+        boot_file = self.dhcp_boot_files.select(mac, options)
+        template = self.dhcp_templates.get(None, boot_file, msg_type)
+        reply = reply_buffer().begin_template(
+            template, xid, chaddr,
+            yiaddr=socket.inet_aton(address) if address else ZERO_IP,
+            flags=(request_data[10] << 8) & BROADCAST_FLAG,
+            ciaddr=ciaddr if msg_type == DHCPACK else ZERO_IP)
+        if address:
+            # Option 51: Lease Time (not sent in answers to DHCPINFORM)
+            reply.option_u32(51, self.config['lease_time'])
+
+        # Clients that already have an address are answered directly, others by broadcast
+        if ciaddr != ZERO_IP:
+            destination = (socket.inet_ntoa(ciaddr), 68)
+        else:
+            destination = ('255.255.255.255', 68)
+        self._send_reply(self.dhcp_socket, self.dhcp_guard, request_data, reply.finish(), destination)
+        return boot_file
+        
+    def _handle_boot_server(self, data, addr):
+        """Answer a PXE client's boot server REQUEST on the proxyDHCP port"""
+        try:
+            if len(data) < 240 or data[0] != 1:
+                return
+            options = parse_options(data)
+            if options.message_type not in (DHCPREQUEST, DHCPINFORM) or not is_boot_client(options):
+                return
+            mac = ':'.join([f'{b:02x}' for b in data[28:28 + min(data[2], 16)]])
+            self.log(f"→ PXE boot server Request from {addr[0]} (MAC: {mac})")
+            # Unicast back to the address and port the client used
+            boot_file = self._send_proxy_reply(DHCPACK, data, mac, options, self.proxy_socket, addr)
+            self.log(f"← PXE boot server Ack sent to {addr[0]} - Boot: {boot_file}")
             
-            # Option 53: DHCP Message Type (Offer = 2)
-            response[idx:idx+3] = b'\x35\x01\x02'
-            idx += 3
+        except Exception as e:
+            self.log(f"proxyDHCP handler error: {e}")
             
+    def _send_proxy_reply(self, msg_type, request_data, mac, options, sock, destination):
+        """Send a proxyDHCP OFFER or boot server ACK: boot information, no address
+        
+        Returns the boot file offered to the client.
+        """
+        boot_file = self.dhcp_boot_files.select(mac, options)
+        template = self.dhcp_templates.get(None, boot_file, msg_type)
+        reply = reply_buffer().begin_template(
+            template, bytes(request_data[4:8]), bytes(request_data[28:34]),
+            flags=(request_data[10] << 8) & BROADCAST_FLAG,
+            ciaddr=bytes(request_data[12:16]) if msg_type == DHCPACK else ZERO_IP)
+        if not is_http_boot(boot_file):
+            # Option 43: PXE discovery control, and the boot item the client asked for
+            reply.option(43, proxy_vendor_options(boot_item(options)))
+        uuid = options.get(OPTION_CLIENT_UUID)
+        if uuid is not None:
+            # Option 97: PXE clients expect their UUID back from a proxy
+            reply.option(OPTION_CLIENT_UUID, uuid)
+        guard = self.proxy_guard if sock is self.proxy_socket else self.dhcp_guard
+        self._send_reply(sock, guard, request_data, reply.finish(), destination)
+        return boot_file
+        
+    def _send_reply(self, sock, guard, request_data, packet, destination):
+        """Send a reply and keep it for retransmits of the request"""
+        sock.sendto(packet, destination)
+        if guard:
+            guard.remember(request_data, packet, destination)
+        
+    def _build_dhcp_template(self, interface, boot_name, msg_type):
+        """Everything in an OFFER/ACK that does not depend on the client"""
+        server_ip = socket.inet_aton(self.config['server_ip'])
+        gateway = socket.inet_aton(self.config['gateway'])
+        boot_file = boot_name.encode()
+        if self.config['dhcp_mode'] == MODE_PROXY:
+            # proxyDHCP: no address, router or lease; only where to boot from
+            vendor_class = b'HTTPClient' if is_http_boot(boot_name) else b'PXEClient'
+            return ReplyTemplate(msg_type, siaddr=server_ip, file=boot_file, options=(
+                (54, server_ip),
+                (60, vendor_class),
+                (66, self.config['server_ip'].encode()),
+                (67, boot_file)
+            ))
+        if is_http_boot(boot_name):
+            # UEFI HTTP boot: the URL is the boot file and the vendor class must say HTTPClient
+            return ReplyTemplate(msg_type, siaddr=server_ip, giaddr=gateway, options=(
+                (54, server_ip),
+                (1, socket.inet_aton(self.config['subnet_mask'])),
+                (3, gateway),
+                (6, socket.inet_aton(self.config['dns_server'])),
+                (67, boot_file),
+                (60, b'HTTPClient')
+            ))
+        return ReplyTemplate(msg_type, siaddr=server_ip, giaddr=gateway, file=boot_file, options=(
             # Option 54: Server Identifier
-            response[idx:idx+6] = b'\x36\x04' + socket.inet_aton(self.config['server_ip'])
-            idx += 6
-            
-            # Option 51: Lease Time (24 hours = 86400 seconds)
-            lease_time = 86400
-            response[idx:idx+6] = b'\x33\x04' + struct.pack('>I', lease_time)
-            idx += 6
-            
+            (54, server_ip),
             # Option 1: Subnet Mask
-            response[idx:idx+6] = b'\x01\x04' + socket.inet_aton(self.config['subnet_mask'])
-            idx += 6
-            
+            (1, socket.inet_aton(self.config['subnet_mask'])),
             # Option 3: Router
-            response[idx:idx+6] = b'\x03\x04' + socket.inet_aton(self.config['gateway'])
-            idx += 6
-            
+            (3, gateway),
             # Option 6: DNS Server
-            response[idx:idx+6] = b'\x06\x04' + socket.inet_aton(self.config['dns_server'])
-            idx += 6
-            
+            (6, socket.inet_aton(self.config['dns_server'])),
             # Option 66: TFTP Server Name
-            server_name = self.config['server_ip'].encode()
-            response[idx:idx+2+len(server_name)] = b'\x42' + bytes([len(server_name)]) + server_name
-            idx += 2 + len(server_name)
-            
+            (66, self.config['server_ip'].encode()),
             # Option 67: Bootfile Name (PXE filename)
-            response[idx:idx+2+boot_file_len] = b'\x43' + bytes([boot_file_len]) + boot_file
-            idx += 2 + boot_file_len
-            
+            (67, boot_file),
             # Option 60: Vendor Class Identifier (PXE)
-            vendor_class = b'PXEClient'
-            response[idx:idx+3+len(vendor_class)] = b'\x3c' + bytes([len(vendor_class)]) + vendor_class
-            idx += 3 + len(vendor_class)
-            
+            (60, b'PXEClient'),
             # Option 43: Vendor Specific Information (PXE options)
-            pxe_options = b'\x00\x00\x00\x00\x00\x00\x00\x00'
-            response[idx:idx+2+len(pxe_options)] = b'\x2b' + bytes([len(pxe_options)]) + pxe_options
-            idx += 2 + len(pxe_options)
-            
-            # End option
-            response[idx] = 0xff
-            
-            # Send response to broadcast address on port 68
-            broadcast_addr = '255.255.255.255'
-            self.dhcp_socket.sendto(bytes(response[:idx+1]), (broadcast_addr, 68))
-            self.log(f"← DHCP Offer sent to {addr[0]} - IP: {offered_ip}, Boot: pxelinux.0")
-            
-        except Exception as e:
-            self.log(f"DHCP offer error: {e}")
+            (43, b'\x00\x00\x00\x00\x00\x00\x00\x00')
+        ))
+        
+    def _prepare_dhcp_pool(self):
+        """(Re)build the address pool from the current range, server and gateway"""
+        if self.dhcp_journal:
+            # Leases are journaled against the running pool
+            return
+        self.dhcp_leases = LeasePool(self.config['dhcp_range_start'], self.config['dhcp_range_end'],
+                                     self.config['lease_time'],
+                                     exclude=(self.config['server_ip'], self.config['gateway']))
+        self.dhcp_transactions = TransactionTable(self.dhcp_leases)
+        
+    def _prepare_dhcp_templates(self):
+        """(Re)build the boot file table and reply templates from the current config"""
+        self.dhcp_boot_files = BootFileSelector(
+            self.config['dhcp_boot_files'], overrides=self.config['dhcp_boot_overrides'],
+            ipxe_script=self.config['dhcp_ipxe_script'], server_ip=self.config['server_ip'],
+            http_port=self.config['http_port'])
+        boot_names = set(self.dhcp_boot_files.boot_files.values())
+        boot_names.add(self.dhcp_boot_files.default)
+        self.dhcp_templates.clear()
+        self.dhcp_templates.prepare([(None, name, msg_type) for name in sorted(boot_names)
+                                     for msg_type in (DHCPOFFER, DHCPACK)])
             
     def _run_tftp_server(self):
         """Run TFTP server"""
@@ -735,120 +966,45 @@ Access:
             if not bound:
                 return
                 
-            self.tftp_socket.settimeout(1.0)
-            
-            while self.running:
-                try:
-                    data, addr = self.tftp_socket.recvfrom(516)
-                    threading.Thread(target=self._handle_tftp, args=(data, addr), daemon=True).start()
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if self.running:
-                        self.log(f"TFTP error: {e}")
+            # All transfers are multiplexed on this thread
+            self.tftp_engine = self._create_tftp_engine(self.tftp_socket)
+            self.tftp_engine.run()
                         
         except Exception as e:
             self.log(f"Failed to start TFTP server: {e}")
             
-    def _handle_tftp(self, data, addr):
-        """Handle TFTP request"""
-        try:
-            if len(data) < 4:
-                return
-                
-            opcode = struct.unpack('>H', data[0:2])[0]
-            
-            if opcode == 1:  # Read Request (RRQ)
-                # Parse filename
-                filename_end = data.index(b'\x00', 2)
-                filename = data[2:filename_end].decode('utf-8', errors='ignore')
-                
-                self.log(f"→ TFTP Request: {filename} from {addr[0]}:{addr[1]}")
-                
-                # Send file
-                self._send_tftp_file(filename, addr)
-                
-        except Exception as e:
-            self.log(f"TFTP handler error: {e}")
-            
-    def _send_tftp_file(self, filename, addr):
-        """Send file via TFTP"""
-        try:
-            # Sanitize filename
-            filename = filename.lstrip('/')
-            filepath = os.path.join(self.tftp_dir, filename)
-            
-            # Check if file exists
-            if not os.path.exists(filepath):
-                # Send error packet
-                error_msg = f"File not found: {filename}".encode()
-                error_packet = struct.pack('>H', 5) + struct.pack('>H', 1) + error_msg + b'\x00'
-                
-                # Create new socket for this transfer
-                transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                transfer_socket.sendto(error_packet, addr)
-                transfer_socket.close()
-                
-                self.log(f"✗ File not found: {filename}")
-                return
-                
-            # Read file
-            with open(filepath, 'rb') as f:
-                file_data = f.read()
-                
-            # Create new socket for this transfer
-            transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            transfer_socket.settimeout(5.0)
-            
-            # Send file in blocks
-            block_size = 512
-            block_num = 1
-            offset = 0
-            
-            while offset < len(file_data):
-                # Get block data
-                block_data = file_data[offset:offset + block_size]
-                
-                # Create DATA packet
-                data_packet = struct.pack('>H', 3) + struct.pack('>H', block_num) + block_data
-                
-                # Send with retry
-                retries = 3
-                acked = False
-                
-                for retry in range(retries):
-                    transfer_socket.sendto(data_packet, addr)
-                    
-                    try:
-                        # Wait for ACK
-                        ack_data, _ = transfer_socket.recvfrom(4)
-                        ack_opcode = struct.unpack('>H', ack_data[0:2])[0]
-                        ack_block = struct.unpack('>H', ack_data[2:4])[0]
-                        
-                        if ack_opcode == 4 and ack_block == block_num:
-                            acked = True
-                            break
-                    except socket.timeout:
-                        if retry == retries - 1:
-                            self.log(f"✗ TFTP timeout sending block {block_num}")
-                            
-                if not acked:
-                    break
-                    
-                offset += block_size
-                block_num += 1
-                
-                # Last block
-                if len(block_data) < block_size:
-                    break
-                    
-            transfer_socket.close()
-            
-            if acked or offset >= len(file_data):
-                self.log(f"← TFTP Transfer complete: {filename} ({len(file_data)} bytes, {block_num} blocks)")
-            
-        except Exception as e:
-            self.log(f"TFTP send error: {e}")
+    def _create_tftp_engine(self, listen_socket):
+        """Create the event-loop TFTP engine serving the TFTP root"""
+        return TFTPEngine.from_config(listen_socket, [self.tftp_dir], self.config, log=self.log)
+        
+    def get_status(self):
+        """Get current server status"""
+        status = {
+            'running': self.running,
+            'dhcp_mode': self.config['dhcp_mode'],
+            'server_ip': self.config['server_ip'],
+            'dhcp_port': self.config['dhcp_port'],
+            'tftp_port': self.config['tftp_port'],
+            'tftp_dir': self.tftp_dir,
+            'tftp_cache': ASSET_CACHE.get_stats(),
+            'dhcp_buffers': self.dhcp_buffers.get_stats()
+        }
+        status['dhcp'] = self.dhcp_transactions.get_stats()
+        status['dhcp_leases'] = self.dhcp_leases.get_stats()
+        status['dhcp_templates'] = self.dhcp_templates.get_stats()
+        status['dhcp_boot_files'] = self.dhcp_boot_files.get_stats()
+        if self.dhcp_journal:
+            status['dhcp_journal'] = self.dhcp_journal.get_stats()
+        if self.dhcp_batcher:
+            status['dhcp_batches'] = self.dhcp_batcher.get_stats()
+        if self.dhcp_guard:
+            status['dhcp_storm'] = self.dhcp_guard.get_stats()
+        if self.proxy_guard:
+            status['dhcp_proxy_storm'] = self.proxy_guard.get_stats()
+        if self.tftp_engine:
+            status['tftp'] = self.tftp_engine.get_stats()
+            status['tftp_transfers'] = self.tftp_engine.get_transfer_stats()
+        return status
 
 def show_banner():
     """Display startup banner"""
@@ -879,6 +1035,9 @@ def main():
     
     # Create server
     server = TermuxPXEServer()
+    if '--proxy' in sys.argv[1:]:
+        # Leave addresses to the router's DHCP server
+        server.config['dhcp_mode'] = MODE_PROXY
     
     # Setup signal handler
     def signal_handler(sig, frame):
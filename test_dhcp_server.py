@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+"""
+Test script for the Termux PXE Boot DHCP server
+Builds replies the way the servers do and checks them on the wire format
+"""
+import sys
+import os
+import socket
+import struct
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from termux_pxe_boot import TermuxPXEServer
+    from pxe.dhcp import ReplyBuffer, MAGIC_COOKIE
+    from pxe.dhcp import (
+        DHCPBatcher, message_type, parse_options,
+        DHCPDISCOVER, DHCPREQUEST, DHCPDECLINE, DHCPRELEASE, DHCPOFFER, DHCPACK, DHCPNAK
+    )
+    from pxe.dhcp.leases import LeasePool, BOUND, OFFERED
+    from pxe.dhcp.journal import LeaseJournal, RECORD, FILE_MAGIC
+    from pxe.dhcp.bootfile import BootFileSelector
+    from pxe.dhcp.proxy import MODE_PROXY
+    from pxe.dhcp.storm import StormGuard
+    from pxe.buffers import BufferPool, DHCP_BUFFER_SIZE
+except ImportError as e:
+    print(f"Error importing termux_pxe_boot: {e}")
+    sys.exit(1)
+
+
+class CaptureSocket:
+    """Stands in for the DHCP socket and records what would be sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((bytes(data), addr))
+
+
+def _build_discover(mac, xid):
+    """Build a minimal DHCPDISCOVER from a PXE client"""
+    return _build_request(DHCPDISCOVER, mac, xid)
+
+
+def _build_request(msg_type, mac, xid, requested=None, server_id=None, ciaddr=None):
+    """Build a client message with the given type and address options"""
+    packet = bytearray(240)
+    packet[0:4] = b'\x01\x01\x06\x00'
+    packet[4:8] = xid
+    if ciaddr:
+        packet[12:16] = socket.inet_aton(ciaddr)
+    packet[28:34] = mac
+    packet[236:240] = MAGIC_COOKIE
+    packet += bytes([53, 1, msg_type]) + b'\x3c\x09PXEClient'
+    if requested:
+        packet += b'\x32\x04' + socket.inet_aton(requested)
+    if server_id:
+        packet += b'\x36\x04' + socket.inet_aton(server_id)
+    return bytes(packet + b'\xff')
+
+
+def _parse_options(packet):
+    """Return {code: value} for the options of a reply"""
+    options = {}
+    idx = 240
+    while idx < len(packet) and packet[idx] != 255:
+        if packet[idx] == 0:
+            idx += 1
+            continue
+        length = packet[idx + 1]
+        options[packet[idx]] = packet[idx + 2:idx + 2 + length]
+        idx += 2 + length
+    return options
+
+
+def test_offer_layout():
+    """Offers carry the request's xid/chaddr, the boot file and the PXE options"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    mac = b'\x52\x54\x00\x12\x34\x56'
+    request = _build_discover(mac, b'\xde\xad\xbe\xef')
+
+    server._send_dhcp_offer(request, ('0.0.0.0', 68), '52:54:00:12:34:56', parse_options(request))
+
+    packet, addr = server.dhcp_socket.sent[0]
+    assert addr == ('255.255.255.255', 68)
+    assert packet[0] == 2 and packet[4:8] == b'\xde\xad\xbe\xef'
+    assert packet[28:34] == mac and packet[34:44] == bytes(10)
+    assert packet[20:24] == socket.inet_aton(server.config['server_ip'])
+    assert packet[108:118] == b'pxelinux.0' and packet[118] == 0
+    assert packet[236:240] == MAGIC_COOKIE
+
+    options = _parse_options(packet)
+    assert options[53] == b'\x02'
+    assert struct.unpack('>I', options[51])[0] == 86400
+    assert options[60] == b'PXEClient'
+    assert options[67] == b'pxelinux.0'
+    assert options[66] == server.config['server_ip'].encode()
+    assert packet[-1] == 255
+
+
+def test_reply_buffer_reuse_clears_previous_reply():
+    """A shorter reply in a reused buffer leaves nothing of the longer one behind"""
+    reply = ReplyBuffer()
+    reply.begin(b'\x00\x00\x00\x01', b'\xaa' * 6, file=b'a-long-boot-file-name.efi')
+    reply.option(43, b'\x11' * 200)
+    first = bytes(reply.finish())
+
+    reply.begin(b'\x00\x00\x00\x02', b'\xbb' * 6, file=b'pxelinux.0')
+    reply.option_byte(53, 5)
+    second = reply.finish()
+
+    assert len(first) == 240 + 202 + 1
+    assert len(second) == 240 + 3 + 1
+    assert bytes(second[108:236]) == b'pxelinux.0' + bytes(118)
+    assert not any(reply.buffer[len(second):len(first)])
+
+    # The same reply built in a fresh buffer is byte-identical
+    fresh = ReplyBuffer()
+    fresh.begin(b'\x00\x00\x00\x02', b'\xbb' * 6, file=b'pxelinux.0')
+    fresh.option_byte(53, 5)
+    assert bytes(fresh.finish()) == bytes(second)
+
+
+def test_pooled_receive_keeps_long_requests():
+    """Requests with long option lists arrive whole and the buffer is reused"""
+    pool = BufferPool(DHCP_BUFFER_SIZE, 1)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(2)
+    try:
+        # Parameter request list and vendor options push this past 1024 bytes
+        request = _build_discover(b'\x52\x54\x00\x00\x00\x01', b'\x00\x00\x00\x01')[:-1]
+        request += b'\x37\xff' + bytes(range(255)) + (b'\x2b\xff' + b'\x01' * 255) * 3 + b'\xff'
+        sender.sendto(request, receiver.getsockname())
+        data, addr = pool.recvfrom(receiver)
+        assert isinstance(data, memoryview) and data == request
+        buffer = data.obj
+        pool.release(data)
+
+        sender.sendto(b'\x01' * 300, receiver.getsockname())
+        data, addr = pool.recvfrom(receiver)
+        assert data.obj is buffer and len(data) == 300
+
+        # A second datagram while the only buffer is out gets a temporary one
+        sender.sendto(b'\x02' * 10, receiver.getsockname())
+        extra, addr = pool.recvfrom(receiver)
+        assert extra.obj is not buffer and pool.get_stats()['overflows'] == 1
+        pool.release(extra)
+        pool.release(data)
+        assert pool.get_stats()['free'] == 1
+
+        # A slice kept past release() keeps its buffer out of the pool
+        sender.sendto(b'\x03' * 20, receiver.getsockname())
+        data, addr = pool.recvfrom(receiver)
+        kept = data[4:8]
+        pool.release(data)
+        assert pool.get_stats()['free'] == 0 and pool.get_stats()['retained'] == 1
+        sender.sendto(b'\x04' * 20, receiver.getsockname())
+        data, addr = pool.recvfrom(receiver)
+        assert data.obj is not buffer and kept == b'\x03' * 4
+        pool.release(data)
+    finally:
+        receiver.close()
+        sender.close()
+
+
+def test_batch_drains_storm_and_collapses_duplicates():
+    """One wakeup takes the whole burst; repeated DISCOVERs are answered once"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    batcher = DHCPBatcher(receiver, server._handle_dhcp, server.dhcp_buffers)
+    try:
+        free = server.dhcp_buffers.get_stats()['free']
+        for i in range(10):
+            mac = b'\x52\x54\x00\x00\x00' + bytes([i])
+            discover = _build_discover(mac, bytes([0, 0, 0, i]))
+            # Each client retransmits its DISCOVER twice within the burst
+            for _ in range(3):
+                sender.sendto(discover, receiver.getsockname())
+        time.sleep(0.1)
+
+        assert batcher.poll(timeout=2) == 30
+        batcher.executor.shutdown(wait=True)
+    finally:
+        receiver.close()
+        sender.close()
+
+    stats = batcher.get_stats()
+    assert stats['batches'] == 1 and stats['duplicates_collapsed'] == 20
+    sent = server.dhcp_socket.sent
+    assert len(sent) == 10
+    assert sorted(packet[4:8] for packet, _ in sent) == [bytes([0, 0, 0, i]) for i in range(10)]
+    assert server.dhcp_buffers.get_stats()['free'] == free
+
+
+def test_storm_guard_rate_limits_per_client_and_globally():
+    """A flooding MAC is cut off at its burst; the global bucket caps everyone"""
+    now = [0.0]
+    guard = StormGuard(rate=1.0, burst=3, global_rate=1.0, global_burst=5, clock=lambda: now[0])
+    sock = CaptureSocket()
+    flooder = _build_discover(b'\x52\x54\x00\x00\x00\x40', b'\x00\x00\x00\x40')
+
+    passed = [guard.screen(flooder, sock) for _ in range(10)]
+    assert passed == [False] * 3 + [True] * 7
+    # One token back per second
+    now[0] += 1.0
+    assert guard.screen(flooder, sock) is False and guard.screen(flooder, sock) is True
+
+    # The flooder took 4 of the 5 global tokens and 1 came back: two more clients fit
+    others = [_build_discover(b'\x52\x54\x00\x00\x01' + bytes([i]), b'\x00\x00\x01\x00')
+              for i in range(3)]
+    assert [guard.screen(request, sock) for request in others] == [False, False, True]
+
+    stats = guard.get_stats()
+    assert stats['client_drops'] == 8 and stats['global_drops'] == 1
+    assert stats['screened'] == 15 and stats['clients'] == 4 and not sock.sent
+
+
+def test_storm_guard_answers_retransmits_from_cache():
+    """A retransmitted DISCOVER gets the stored OFFER without reaching the handler"""
+    now = [0.0]
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    server.dhcp_guard = StormGuard(clock=lambda: now[0])
+    mac = b'\x52\x54\x00\x00\x00\x41'
+    discover = _build_discover(mac, b'\x00\x00\x00\x41')
+
+    assert server.dhcp_guard.screen(discover, server.dhcp_socket) is False
+    server._handle_dhcp(discover, ('0.0.0.0', 68))
+    assert server.dhcp_guard.screen(discover, server.dhcp_socket) is True
+    offer, resent = server.dhcp_socket.sent
+    assert offer == resent and message_type(resent[0]) == DHCPOFFER
+    assert server.dhcp_transactions.get_stats()['discovers'] == 1
+
+    # The REQUEST of the same exchange shares the xid but is a different message
+    request = _build_request(DHCPREQUEST, mac, b'\x00\x00\x00\x41',
+                             socket.inet_ntoa(offer[0][16:20]), server.config['server_ip'])
+    assert server.dhcp_guard.screen(request, server.dhcp_socket) is False
+
+    # Stored replies run out
+    now[0] += 60
+    assert server.dhcp_guard.screen(discover, server.dhcp_socket) is False
+    assert server.dhcp_guard.get_stats()['cached_replies'] == 1
+
+
+def test_message_type():
+    """Option 53 is found by walking the option lengths, past pads"""
+    request = _build_discover(b'\x52\x54\x00\x00\x00\x01', b'\x00\x00\x00\x01')
+    assert message_type(request) == DHCPDISCOVER
+    # A 0x35 byte inside another option's value is not option 53
+    tricky = request[:240] + b'\x00\x00\x3c\x03\x35\x01\x07' + b'\x35\x01\x03\xff'
+    assert message_type(tricky) == 3
+    assert message_type(request[:240] + b'\xff') is None
+
+
+def test_offer_template_patches_client_fields():
+    """Offers reuse the prebuilt template; only the client's fields differ"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    first = bytearray(_build_discover(b'\x52\x54\x00\x00\x00\x0a', b'\x00\x00\x00\x0a'))
+    first[10] = 0x80
+    second = _build_discover(b'\x52\x54\x00\x00\x00\x0b', b'\x00\x00\x00\x0b')
+    builds = server.dhcp_templates.get_stats()['builds']
+
+    for request in (bytes(first), second):
+        server._handle_dhcp(request, ('0.0.0.0', 68))
+    one, two = (packet for packet, addr in server.dhcp_socket.sent)
+
+    assert server.dhcp_templates.get_stats()['builds'] == builds
+    assert one[10:12] == b'\x80\x00' and two[10:12] == b'\x00\x00'
+    assert one[28:34] == first[28:34] and two[28:34] == second[28:34]
+    assert one[16:20] != two[16:20]
+    # Everything else is the template
+    assert len(one) == len(two) and one[34:] == two[34:]
+    assert _parse_options(two)[67] == b'pxelinux.0'
+
+
+def test_boot_file_by_client_architecture():
+    """Option 93 picks the loader; HTTP boot clients get a URL and HTTPClient"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    base = _build_discover(b'\x52\x54\x00\x00\x00\x20', b'\x00\x00\x00\x20')[:-1]
+
+    server._handle_dhcp(base + b'\x5d\x02\x00\x00\xff', ('0.0.0.0', 68))
+    server._handle_dhcp(base.replace(b'\x20', b'\x21') + b'\x5d\x02\x00\x07\xff', ('0.0.0.0', 68))
+    server._handle_dhcp(base.replace(b'\x20', b'\x22') + b'\x5d\x02\x00\x10\xff', ('0.0.0.0', 68))
+    bios, uefi, http = (packet for packet, addr in server.dhcp_socket.sent)
+
+    assert _parse_options(bios)[67] == b'pxelinux.0'
+    assert _parse_options(uefi)[67] == b'snponly.efi' and uefi[108:119] == b'snponly.efi'
+    # Served by the HTTP server on its port, like the boot menus' kernels
+    url = f"http://{server.config['server_ip']}:8080/ipxe.efi".encode()
+    assert _parse_options(http)[67] == url and _parse_options(http)[60] == b'HTTPClient'
+
+
+def test_boot_file_selector_fallbacks_and_cache():
+    """Vendor class and UNDI fallbacks, iPXE, UUID overrides and the per-MAC cache"""
+    uuid_option = b'\x61\x11\x00' + bytes.fromhex('33221100554477668899aabbccddeeff')
+    selector = BootFileSelector(overrides={'00112233-4455-6677-8899-aabbccddeeff': 'special.efi'},
+                                server_ip='192.168.1.100')
+
+    def select(mac, options):
+        return selector.select(mac, parse_options(bytes(240) + options + b'\xff'))
+
+    assert select('aa', b'\x3c\x20PXEClient:Arch:00009:UNDI:003016') == 'ipxe.efi'
+    assert select('bb', b'\x5e\x03\x01\x03\x10') == 'snponly.efi'
+    assert select('cc', b'\x5d\x02\x00\x09\x4d\x04iPXE') == 'ipxe.cfg'
+    assert select('dd', b'\x5d\x02\x00\x00' + uuid_option) == 'special.efi'
+    assert select('ee', b'') == 'pxelinux.0'
+    # 32-bit and ARM UEFI firmware cannot run the BIOS loader
+    assert select('ff', b'\x5d\x02\x00\x06') == 'ipxe-i386.efi'
+    assert select('11', b'\x5d\x02\x00\x0b') == 'ipxe-arm64.efi'
+
+    # Every UEFI HTTP boot architecture gets a URL
+    assert select('22', b'\x5d\x02\x00\x0f') == 'http://192.168.1.100:8080/ipxe-i386.efi'
+    assert select('33', b'\x5d\x02\x00\x13') == 'http://192.168.1.100:8080/ipxe-arm64.efi'
+
+    lookups = selector.get_stats()['lookups']
+    assert select('aa', b'\x3c\x20PXEClient:Arch:00009:UNDI:003016') == 'ipxe.efi'
+    assert selector.get_stats()['lookups'] == lookups and selector.get_stats()['cache_hits'] == 1
+    # The same NIC after iPXE has loaded is a different client class
+    assert select('aa', b'\x5d\x02\x00\x09\x4d\x04iPXE') == 'ipxe.cfg'
+
+    # A table without them falls back to its x64 HTTP entry, not a TFTP loader
+    custom = BootFileSelector(boot_files={0: 'pxelinux.0', 16: 'http://{server_ip}/boot.efi'},
+                              server_ip='10.0.0.1')
+    assert custom.select('aa', parse_options(bytes(240) + b'\x5d\x02\x00\x13\xff')) == 'http://10.0.0.1/boot.efi'
+
+
+def test_proxy_dhcp_sends_boot_information_only():
+    """proxyDHCP offers carry no address; the port 4011 ACK echoes the boot item"""
+    server = TermuxPXEServer()
+    server.config['dhcp_mode'] = MODE_PROXY
+    server._prepare_dhcp_templates()
+    server.dhcp_socket = CaptureSocket()
+    server.proxy_socket = CaptureSocket()
+    mac = b'\x52\x54\x00\x00\x00\x30'
+    uuid_option = b'\x61\x11\x00' + bytes(range(16))
+
+    discover = _build_discover(mac, b'\x00\x00\x00\x30')[:-1] + uuid_option + b'\xff'
+    server._handle_dhcp(discover, ('0.0.0.0', 68))
+    # Non-PXE clients and REQUESTs for the router's lease are left to the router
+    plain = discover.replace(b'\x3c\x09PXEClient', b'\x3c\x09something')
+    server._handle_dhcp(plain, ('0.0.0.0', 68))
+    request = _build_request(DHCPREQUEST, mac, b'\x00\x00\x00\x30', '192.168.1.77', '192.168.1.1')
+    server._handle_dhcp(request, ('0.0.0.0', 68))
+
+    assert len(server.dhcp_socket.sent) == 1
+    offer, addr = server.dhcp_socket.sent[0]
+    options = _parse_options(offer)
+    assert addr == ('255.255.255.255', 68) and offer[16:20] == bytes(4)
+    assert message_type(offer) == DHCPOFFER and options[60] == b'PXEClient'
+    assert options[43] == b'\x06\x01\x08\xff' and options[97] == uuid_option[2:]
+    assert options[67] == b'pxelinux.0' and not {1, 3, 51} & set(options)
+    assert server.dhcp_leases.get_stats()['offered'] == 0
+
+    # Boot server discovery on port 4011, unicast from the router-assigned address
+    boot_request = bytearray(_build_request(DHCPREQUEST, mac, b'\x00\x00\x00\x31', ciaddr='192.168.1.77'))
+    boot_request[-1:] = b'\x2b\x06\x47\x04\x80\x00\x00\x00\xff'
+    server._handle_boot_server(bytes(boot_request), ('192.168.1.77', 4011))
+
+    ack, addr = server.proxy_socket.sent[0]
+    assert addr == ('192.168.1.77', 4011) and message_type(ack) == DHCPACK
+    assert ack[12:16] == socket.inet_aton('192.168.1.77') and ack[16:20] == bytes(4)
+    assert _parse_options(ack)[43] == b'\x06\x01\x08\x47\x04\x80\x00\x00\x00\xff'
+
+
+def test_parse_options_map():
+    """Pad/end, truncation, split long options and option 52 overload in one map"""
+    header = bytearray(_build_discover(b'\x52\x54\x00\x00\x00\x02', b'\x00\x00\x00\x02')[:240])
+    # Option 52 = 3: the file field and then sname carry more options
+    header[108:108 + 8] = b'\x43\x05boot\x00\xff'
+    header[44:44 + 4] = b'\x42\x02ab'
+    header[48] = 0xff
+    packet = bytes(header) + (
+        b'\x35\x01\x01' + b'\x00\x00' + b'\x34\x01\x03'
+        + b'\x3c\x04PXEC' + b'\x3c\x05lient'          # RFC 3396 concatenation
+        + b'\x32\x04\x0a\x00\x00\x07' + b'\xff' + b'\x0c\x04junk')
+
+    options = parse_options(memoryview(packet))
+    assert options.message_type == DHCPDISCOVER
+    assert bytes(options[60]) == b'PXEClient' and options.is_pxe
+    assert options.address(50) == '10.0.0.7'
+    assert bytes(options[67]) == b'boot\x00' and bytes(options[66]) == b'ab'
+    assert 12 not in options and options.get(12) is None
+
+    # An option running past the end of the packet is dropped
+    truncated = parse_options(packet[:240] + b'\x35\x01\x01\x3c\x09PXE')
+    assert truncated.message_type == DHCPDISCOVER and 60 not in truncated
+    # PXE ROMs are recognised in short packets too
+    short = _build_discover(b'\x52\x54\x00\x00\x00\x03', b'\x00\x00\x00\x03')
+    assert len(short) < 300 and parse_options(short).is_pxe
+
+
+def test_dora_exchange():
+    """DISCOVER gets an OFFER and the matching REQUEST an ACK for the same address"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    mac = b'\x52\x54\x00\x00\x00\x10'
+    server_ip = server.config['server_ip']
+
+    server._handle_dhcp(_build_discover(mac, b'\x00\x00\x10\x01'), ('0.0.0.0', 68))
+    offer, _ = server.dhcp_socket.sent[-1]
+    assert message_type(offer) == DHCPOFFER
+    offered = socket.inet_ntoa(offer[16:20])
+
+    request = _build_request(DHCPREQUEST, mac, b'\x00\x00\x10\x01', requested=offered, server_id=server_ip)
+    server._handle_dhcp(request, ('0.0.0.0', 68))
+    ack, addr = server.dhcp_socket.sent[-1]
+    assert message_type(ack) == DHCPACK
+    assert socket.inet_ntoa(ack[16:20]) == offered and ack[108:118] == b'pxelinux.0'
+    assert addr == ('255.255.255.255', 68)
+
+    # Renewing from the bound address is ACKed straight back to it
+    renew = _build_request(DHCPREQUEST, mac, b'\x00\x00\x10\x02', ciaddr=offered)
+    server._handle_dhcp(renew, (offered, 68))
+    ack, addr = server.dhcp_socket.sent[-1]
+    assert message_type(ack) == DHCPACK and addr == (offered, 68)
+    assert server.dhcp_transactions.get_stats()['acks'] == 2
+
+
+def test_request_nak_and_other_server():
+    """A REQUEST for the wrong address is NAKed; one for another server is ignored"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    mac = b'\x52\x54\x00\x00\x00\x11'
+    server_ip = server.config['server_ip']
+
+    server._handle_dhcp(_build_discover(mac, b'\x00\x00\x11\x01'), ('0.0.0.0', 68))
+    wrong = _build_request(DHCPREQUEST, mac, b'\x00\x00\x11\x01',
+                           requested='10.9.9.9', server_id=server_ip)
+    server._handle_dhcp(wrong, ('0.0.0.0', 68))
+    nak, _ = server.dhcp_socket.sent[-1]
+    assert message_type(nak) == DHCPNAK and nak[16:20] == bytes(4)
+    assert nak[108] == 0
+
+    sent = len(server.dhcp_socket.sent)
+    server._handle_dhcp(_build_discover(mac, b'\x00\x00\x11\x02'), ('0.0.0.0', 68))
+    other = _build_request(DHCPREQUEST, mac, b'\x00\x00\x11\x02',
+                           requested='192.168.1.150', server_id='10.0.0.1')
+    server._handle_dhcp(other, ('0.0.0.0', 68))
+    assert len(server.dhcp_transactions.transactions) == 0
+    assert len(server.dhcp_socket.sent) == sent + 1
+
+    # INIT-REBOOT from a client the server never bound stays unanswered
+    reboot = _build_request(DHCPREQUEST, mac, b'\x00\x00\x11\x03', requested='192.168.1.150')
+    server._handle_dhcp(reboot, ('0.0.0.0', 68))
+    assert len(server.dhcp_socket.sent) == sent + 1
+
+
+def test_release_and_decline_drop_binding():
+    """RELEASE frees the address; DECLINE keeps it out of the pool"""
+    server = TermuxPXEServer()
+    server.dhcp_socket = CaptureSocket()
+    server_ip = server.config['server_ip']
+    first, second = b'\x52\x54\x00\x00\x00\x12', b'\x52\x54\x00\x00\x00\x13'
+
+    addresses = []
+    for mac, xid in ((first, b'\x00\x00\x12\x01'), (second, b'\x00\x00\x13\x01')):
+        server._handle_dhcp(_build_discover(mac, xid), ('0.0.0.0', 68))
+        offered = socket.inet_ntoa(server.dhcp_socket.sent[-1][0][16:20])
+        server._handle_dhcp(_build_request(DHCPREQUEST, mac, xid, requested=offered,
+                                           server_id=server_ip), ('0.0.0.0', 68))
+        addresses.append(offered)
+    assert addresses[0] != addresses[1]
+    assert server.dhcp_leases.get_stats()['bound'] == 2
+
+    server._handle_dhcp(_build_request(DHCPRELEASE, first, b'\x00\x00\x12\x02',
+                                       ciaddr=addresses[0]), (addresses[0], 68))
+    server._handle_dhcp(_build_request(DHCPDECLINE, second, b'\x00\x00\x13\x02',
+                                       requested=addresses[1]), ('0.0.0.0', 68))
+    stats = server.dhcp_transactions.get_stats()
+    assert stats['releases'] == 1 and stats['declines'] == 1
+    leases = server.dhcp_leases.get_stats()
+    assert leases['bound'] == 0 and leases['declined'] == 1
+    assert server.dhcp_leases.holder(addresses[1]) == (None, 'declined')
+
+    # The released client gets its old address back; the decliner a new one
+    server._handle_dhcp(_build_discover(first, b'\x00\x00\x12\x03'), ('0.0.0.0', 68))
+    assert socket.inet_ntoa(server.dhcp_socket.sent[-1][0][16:20]) == addresses[0]
+    server._handle_dhcp(_build_discover(second, b'\x00\x00\x13\x03'), ('0.0.0.0', 68))
+    assert socket.inet_ntoa(server.dhcp_socket.sent[-1][0][16:20]) not in addresses
+
+
+def test_lease_pool_allocation_and_expiry():
+    """Distinct addresses per MAC, sticky re-offers, exhaustion and lazy expiry"""
+    now = [1000.0]
+    pool = LeasePool('10.0.0.1', '10.0.0.4', lease_time=100, offer_hold=10,
+                     exclude=('10.0.0.2',), clock=lambda: now[0])
+    macs = [f'52:54:00:00:00:{i:02x}' for i in range(4)]
+
+    offered = [pool.offer(mac) for mac in macs[:3]]
+    assert sorted(offered) == ['10.0.0.1', '10.0.0.3', '10.0.0.4']
+    assert pool.offer(macs[0]) == offered[0]
+    assert pool.offer(macs[3]) is None and pool.get_stats()['exhausted'] == 1
+
+    assert pool.bind(macs[0], offered[0])
+    assert not pool.bind(macs[3], offered[1])
+    assert not pool.bind(macs[3], '10.0.0.2')
+
+    # Unanswered offers lapse after offer_hold; the bound lease stays
+    now[0] += 11
+    assert pool.get_stats()['offered'] == 0 and pool.get_stats()['bound'] == 1
+    assert pool.offer(macs[3]) == offered[2]
+    # A returning client gets its sticky address while it is still free
+    assert pool.offer(macs[1]) == offered[1]
+
+    now[0] += 100
+    assert pool.lookup(macs[0]) is None
+    assert pool.get_stats()['expired'] >= 3
+
+
+def test_pool_follows_config_changed_before_start():
+    """The server's own address and gateway are excluded as configured at start"""
+    server = TermuxPXEServer()
+    server.config.update({'server_ip': '10.1.0.1', 'gateway': '10.1.0.2',
+                          'dhcp_range_start': '10.1.0.1', 'dhcp_range_end': '10.1.0.3'})
+    server._prepare_dhcp_pool()
+    assert server.dhcp_leases.offer('52:54:00:00:00:01') == '10.1.0.3'
+    assert server.dhcp_leases.offer('52:54:00:00:00:02') is None
+    assert server.dhcp_transactions.pool is server.dhcp_leases
+
+
+def test_lease_journal_survives_restart():
+    """Bound and offered leases come back after a restart; a torn last record is dropped"""
+    now = [1000.0]
+    with tempfile.TemporaryDirectory() as directory:
+        pool = LeasePool('10.0.0.1', '10.0.0.20', lease_time=100, clock=lambda: now[0])
+        assert pool.attach(LeaseJournal(directory)) == 0
+        bound = pool.offer('aa:aa')
+        assert pool.bind('aa:aa', bound)
+        offered = pool.offer('bb:bb')
+        released = pool.offer('cc:cc')
+        pool.release('cc:cc', released)
+        pool.journal.close()
+
+        # A crash in the middle of an append
+        with open(os.path.join(directory, 'leases.journal'), 'ab') as f:
+            f.write(b'\x02' * (RECORD.size // 2))
+
+        restarted = LeasePool('10.0.0.1', '10.0.0.20', lease_time=100, clock=lambda: now[0])
+        journal = LeaseJournal(directory)
+        assert restarted.attach(journal) == 2
+        assert restarted.lookup('aa:aa', BOUND) == bound
+        assert restarted.lookup('bb:bb', OFFERED) == offered
+        assert restarted.lookup('cc:cc') is None
+        # Nobody else is offered a restored address
+        assert restarted.offer('dd:dd') not in (bound, offered)
+        journal.close()
+        assert (os.path.getsize(journal.journal_path) - len(FILE_MAGIC)) % RECORD.size == 0
+
+
+def test_lease_journal_compaction():
+    """Compaction keeps only the live leases and starts an empty journal"""
+    now = [1000.0]
+    with tempfile.TemporaryDirectory() as directory:
+        pool = LeasePool('10.0.0.1', '10.0.0.200', lease_time=100, clock=lambda: now[0])
+        journal = LeaseJournal(directory, flush_interval=60, compact_records=10)
+        pool.attach(journal)
+        for i in range(50):
+            mac = f'52:54:00:00:00:{i:02x}'
+            pool.bind(mac, pool.offer(mac))
+            if i % 2:
+                pool.release(mac, pool.lookup(mac))
+
+        journal.compact(pool.checkpoint())
+        assert journal.get_stats()['journal_records'] == 0
+        pool.bind('52:54:00:00:00:00', pool.lookup('52:54:00:00:00:00'))
+        journal.close()
+
+        restarted = LeasePool('10.0.0.1', '10.0.0.200', lease_time=100, clock=lambda: now[0])
+        replay = LeaseJournal(directory)
+        assert restarted.attach(replay) == 25
+        assert replay.get_stats()['replayed'] == 26
+        replay.close()
+
+        # Leases that ran out while the server was down are not restored
+        now[0] += 1000
+        expired = LeasePool('10.0.0.1', '10.0.0.200', lease_time=100, clock=lambda: now[0])
+        replay = LeaseJournal(directory)
+        assert expired.attach(replay) == 0
+        replay.close()
+
+
+def main():
+    """Main test function"""
+    print("Termux PXE Boot DHCP Server - Test Suite")
+    print("=" * 50)
+
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print("=" * 50)
+    if failed:
+        print(f"❌ {failed} of {len(tests)} tests FAILED")
+        sys.exit(1)
+    print(f"✅ All {len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,9 @@ Quick test to verify all components work
 """
 import sys
 import os
+import shutil
 import socket
+import tempfile
 import threading
 import time
 import signal
@@ -123,8 +125,11 @@ def test_quick_start():
     print("\n🧪 Quick Start Test (10 seconds)...")
     print("Starting server for 10 seconds to verify it works...")
     
+    # Boot files and the lease journal go to a scratch directory, not the user's
+    scratch = tempfile.mkdtemp()
     try:
-        server = TermuxPXEServer()
+        server = TermuxPXEServer(base_dir=scratch)
+        server.config['dhcp_lease_dir'] = os.path.join(scratch, 'leases')
         
         def signal_handler(sig, frame):
             server.stop()
@@ -154,6 +159,8 @@ def test_quick_start():
     except Exception as e:
         print(f"✗ Quick test FAILED: {e}")
         return False
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
 
 def main():
     """Main test function"""
@@ -0,0 +1,918 @@
+#!/usr/bin/env python3
+"""
+Test script for the Termux PXE Boot TFTP server
+Runs real transfers over loopback against TermuxPXEServer
+"""
+import sys
+import os
+import socket
+import struct
+import select
+import shutil
+import tempfile
+import threading
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from termux_pxe_boot import TermuxPXEServer
+    from pxe.tftp import ReadTransfer, RTTEstimator, TFTPEngine
+    from pxe.tftp import engine as engine_module
+    from pxe.tftp.files import FileRegistry
+    from pxe.tftp.cache import AssetCache
+    from pxe.tftp.scheduler import FairScheduler
+    from pxe.tftp.index import FileIndex
+    from pxe.tftp.prewarm import prewarm, find_menu_references
+except ImportError as e:
+    print(f"Error importing termux_pxe_boot: {e}")
+    sys.exit(1)
+
+
+def _build_rrq(filename, options=None):
+    """Build a TFTP read request with optional RFC 2347 options"""
+    packet = struct.pack('>H', 1) + filename.encode() + b'\x00octet\x00'
+    for name, value in (options or {}).items():
+        packet += name.encode() + b'\x00' + str(value).encode() + b'\x00'
+    return packet
+
+
+def _parse_oack(packet):
+    """Return the option dictionary carried by an OACK packet"""
+    fields = packet[2:].split(b'\x00')
+    return {fields[i].decode(): fields[i + 1].decode() for i in range(0, len(fields) - 1, 2)}
+
+
+def start_engine(server):
+    """Run the server's TFTP engine on a loopback port in a background thread
+
+    Returns (engine, port)
+    """
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    engine = server._create_tftp_engine(listen_socket)
+    threading.Thread(target=engine.run, daemon=True).start()
+    return engine, listen_socket.getsockname()[1]
+
+
+def tftp_download(port, filename, options=None):
+    """Download a file from a TFTP server on loopback
+
+    Returns (data, oack_options, block_count)
+    """
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    client.settimeout(5.0)
+    client.sendto(_build_rrq(filename, options), ('127.0.0.1', port))
+
+    data = b''
+    oack = None
+    blocks = 0
+    blksize = 512
+    windowsize = 1
+    in_window = 0
+    expected = 1
+
+    try:
+        while True:
+            packet, addr = client.recvfrom(65536)
+            opcode = struct.unpack('>H', packet[0:2])[0]
+
+            if opcode == 6:
+                oack = _parse_oack(packet)
+                blksize = int(oack.get('blksize', 512))
+                windowsize = int(oack.get('windowsize', 1))
+                client.sendto(struct.pack('>HH', 4, 0), addr)
+                continue
+
+            if opcode == 5:
+                raise IOError(packet[4:-1].decode())
+
+            block = struct.unpack('>H', packet[2:4])[0]
+            if block != expected:
+                # Gap: acknowledge the last block received in order
+                client.sendto(struct.pack('>HH', 4, (expected - 1) & 0xFFFF), addr)
+                in_window = 0
+                continue
+
+            data += packet[4:]
+            blocks += 1
+            in_window += 1
+            expected = (expected + 1) & 0xFFFF
+            last = len(packet) - 4 < blksize
+
+            # RFC 7440: acknowledge once per window and on the final block
+            if in_window == windowsize or last:
+                client.sendto(struct.pack('>HH', 4, block), addr)
+                in_window = 0
+            if last:
+                break
+    finally:
+        client.close()
+
+    return data, oack, blocks
+
+
+def tftp_multicast_download(port, filename, joined=None, resume=None, pause_at=None, paused=None):
+    """Download a file as an RFC 2090 multicast client on loopback
+
+    The client ACKs only while it is the master. joined is set once the
+    first OACK arrives; if pause_at is given, the master sets paused and
+    waits for resume before acknowledging that block.
+    Returns the file contents.
+    """
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    client.sendto(_build_rrq(filename, {'multicast': ''}), ('127.0.0.1', port))
+    group_socket = None
+    server_addr = None
+    is_master = False
+    blocks = {}
+    last_block = None
+
+    def contiguous():
+        count = 0
+        while count + 1 in blocks:
+            count += 1
+        return count
+
+    try:
+        while True:
+            readable, _, _ = select.select([client] + ([group_socket] if group_socket else []), [], [], 5.0)
+            if not readable:
+                raise IOError("multicast client timed out")
+            for sock in readable:
+                packet, addr = sock.recvfrom(65536)
+                opcode = struct.unpack('>H', packet[:2])[0]
+                if opcode == 6:
+                    server_addr = addr
+                    address, group_port, master = _parse_oack(packet)['multicast'].split(',')
+                    if group_socket is None:
+                        group_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                        group_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                        group_socket.bind(('', int(group_port)))
+                        group_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                                socket.inet_aton(address) + socket.inet_aton('127.0.0.1'))
+                        if joined:
+                            joined.set()
+                    is_master = master == '1'
+                elif opcode == 3:
+                    block = struct.unpack('>H', packet[2:4])[0]
+                    blocks.setdefault(block, packet[4:])
+                    if len(packet) - 4 < 512:
+                        last_block = block
+                    if block == pause_at and resume:
+                        if paused:
+                            paused.set()
+                        resume.wait(5.0)
+                        resume = None
+                else:
+                    continue
+
+                if is_master:
+                    client.sendto(struct.pack('>HH', 4, contiguous()), server_addr)
+                    if last_block is not None and contiguous() == last_block:
+                        return b''.join(blocks[i] for i in range(1, last_block + 1))
+    finally:
+        client.close()
+        if group_socket:
+            group_socket.close()
+
+
+# Scratch directories of the current test's servers
+_scratch_dirs = []
+
+
+def _make_server():
+    """A TermuxPXEServer rooted in a scratch directory, removed after the test"""
+    server = TermuxPXEServer(base_dir=tempfile.mkdtemp())
+    _scratch_dirs.append(server.base_dir)
+    return server
+
+
+def teardown_function(function):
+    """Remove the scratch directories the test created"""
+    while _scratch_dirs:
+        shutil.rmtree(_scratch_dirs.pop(), ignore_errors=True)
+
+
+def _make_server_file(server, name, size):
+    """Create a file of the given size inside the server's TFTP root"""
+    path = os.path.join(server.tftp_dir, name)
+    payload = bytes((i * 7) & 0xFF for i in range(size))
+    with open(path, 'wb') as f:
+        f.write(payload)
+    return payload
+
+
+def test_plain_rrq_uses_512_byte_blocks():
+    """Clients that send no options get classic RFC 1350 transfers"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_plain.bin', 512 * 3 + 100)
+
+    engine, port = start_engine(server)
+    try:
+        data, oack, blocks = tftp_download(port, 'test_plain.bin')
+    finally:
+        engine.stop()
+
+    assert data == payload
+    assert oack is None
+    assert blocks == 4
+
+
+def test_blksize_and_tsize_negotiation():
+    """blksize/tsize/timeout are acknowledged with an OACK"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_options.bin', 1408 * 5)
+
+    engine, port = start_engine(server)
+    try:
+        data, oack, blocks = tftp_download(port, 'test_options.bin',
+                                           {'blksize': 1408, 'tsize': 0, 'timeout': 2})
+    finally:
+        engine.stop()
+
+    assert data == payload
+    assert oack == {'blksize': '1408', 'tsize': str(len(payload)), 'timeout': '2'}
+    # Exact multiple of blksize ends with an empty block
+    assert blocks == 6
+
+
+def test_windowsize_transfer():
+    """windowsize lets several blocks go out per ACK (RFC 7440)"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_window.bin', 1024 * 40 + 17)
+
+    engine, port = start_engine(server)
+    try:
+        data, oack, blocks = tftp_download(port, 'test_window.bin',
+                                           {'blksize': 1024, 'windowsize': 8})
+    finally:
+        engine.stop()
+
+    assert data == payload
+    assert oack == {'blksize': '1024', 'windowsize': '8'}
+    assert blocks == 41
+
+
+def test_window_resumes_after_partial_loss():
+    """A cumulative ACK inside the window restarts right after the acked block"""
+    transfer = ReadTransfer(b'x' * 512 * 10, blksize=512, windowsize=4)
+
+    first = transfer.next_window()
+    assert [struct.unpack('>H', p[2:4])[0] for p in first] == [1, 2, 3, 4]
+
+    # Block 3 was lost: the client acknowledges block 2
+    assert transfer.on_ack(2)
+    resent = transfer.next_window()
+    assert [struct.unpack('>H', p[2:4])[0] for p in resent] == [3, 4, 5, 6]
+    assert transfer.retransmits == 2
+
+    # Duplicate and stale ACKs change nothing
+    assert not transfer.on_ack(2)
+    assert not transfer.on_ack(1)
+    assert list(transfer.next_window()) == []
+
+    assert transfer.on_ack(6)
+    assert len(list(transfer.next_window())) == 4
+    assert transfer.on_ack(10)
+    assert [struct.unpack('>H', p[2:4])[0] for p in transfer.next_window()] == [11]
+    assert transfer.on_ack(11)
+    assert transfer.done
+
+
+def test_transfers_share_one_file_map():
+    """Concurrent transfers of a file read from a single mmap"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_mapped.bin', 4096 * 3 + 1)
+    path = os.path.join(server.tftp_dir, 'test_mapped.bin')
+    registry = FileRegistry()
+
+    first = registry.open(path)
+    second = registry.open(path)
+    assert first is second
+    assert first.refcount == 2
+
+    transfer = ReadTransfer(first.view, blksize=4096, windowsize=4)
+    blocks = [bytes(packet[4:]) for packet in transfer.next_window()]
+    assert b''.join(blocks) == payload
+    # Every block is built in the same reusable packet buffer
+    assert len(transfer.packet) == 4 + 4096
+
+    transfer.release()
+    registry.release(first)
+    registry.release(second)
+    assert registry.files == {}
+    assert first._map is None
+
+
+def test_asset_cache_lru_budget():
+    """Assets are shared while cached and evicted LRU against the byte budget"""
+    server = _make_server()
+    paths = []
+    for name in ('test_cache_a.bin', 'test_cache_b.bin', 'test_cache_c.bin'):
+        _make_server_file(server, name, 1000)
+        paths.append(os.path.join(server.tftp_dir, name))
+    cache = AssetCache(max_bytes=2500)
+
+    # A miss is served from the file's map while a background thread caches it
+    mapped = cache.open(paths[0])
+    cache.wait()
+    a = cache.open(paths[0])
+    assert a is not mapped and bytes(a.view) == bytes(mapped.view)
+    cache.release(mapped)
+    assert cache.open(paths[0]) is a
+    cache.release(cache.open(paths[1]))
+    cache.wait()
+    cache.open(paths[0])   # a becomes most recently used
+    cache.release(cache.open(paths[2]))
+    cache.wait()           # c is cached and evicts b
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 3, 1)
+    assert stats['cached_bytes'] == 2000
+    assert cache.open(paths[0]) is a
+    assert cache.get_stats()['misses'] == 3
+
+    # A file that changes on disk is reloaded under its new key
+    _make_server_file(server, 'test_cache_a.bin', 1200)
+    cache.release(cache.open(paths[0]))
+    cache.wait()
+    assert cache.open(paths[0]) is not a
+    assert cache.get_stats()['cached_bytes'] == 2200
+
+    # Files bigger than the whole budget are mapped, not cached
+    _make_server_file(server, 'test_cache_big.bin', 4000)
+    big = cache.open(os.path.join(server.tftp_dir, 'test_cache_big.bin'))
+    cache.wait()
+    assert len(big) == 4000 and cache.get_stats()['entries'] == 2
+    cache.release(big)
+
+
+def test_concurrent_transfers_share_one_thread():
+    """Many simultaneous clients are served by the single engine thread"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_concurrent.bin', 512 * 30 + 5)
+    engine, port = start_engine(server)
+    threads_before = threading.active_count()
+    results = []
+
+    def client():
+        results.append(tftp_download(port, 'test_concurrent.bin', {'blksize': 512})[0])
+
+    clients = [threading.Thread(target=client) for _ in range(25)]
+    try:
+        for thread in clients:
+            thread.start()
+        # Only the client threads exist; the server spawned none
+        assert threading.active_count() <= threads_before + len(clients)
+        for thread in clients:
+            thread.join(timeout=10)
+        # The engine may still be processing the last final ACKs
+        for _ in range(50):
+            if engine.get_stats()['transfers_completed'] == len(clients):
+                break
+            time.sleep(0.02)
+    finally:
+        engine.stop()
+
+    assert results == [payload] * len(clients)
+    assert engine.get_stats()['transfers_completed'] == len(clients)
+
+
+def test_rtt_estimator_adapts_and_backs_off():
+    """The RTO follows measured round trips and doubles on timeout"""
+    rtt = RTTEstimator(max_rto=5)
+    assert rtt.rto == 1.0
+    for _ in range(20):
+        rtt.sample(0.002)
+    assert abs(rtt.srtt - 0.002) < 1e-6
+    # Clamped to the floor on a fast LAN
+    assert rtt.rto == 0.02
+
+    rtt.backoff()
+    rtt.backoff()
+    assert rtt.rto == 0.08
+    for _ in range(10):
+        rtt.backoff()
+    # Never beyond the negotiated timeout
+    assert rtt.rto == 5
+
+
+def test_transfer_stats_report_rtt():
+    """Finished transfers are exported with their RTT and retransmit count"""
+    server = _make_server()
+    _make_server_file(server, 'test_rtt.bin', 512 * 20)
+    engine, port = start_engine(server)
+    try:
+        tftp_download(port, 'test_rtt.bin', {'blksize': 512})
+        for _ in range(50):
+            if engine.get_stats()['transfers_completed']:
+                break
+            time.sleep(0.02)
+    finally:
+        engine.stop()
+
+    stats = engine.get_transfer_stats()[-1]
+    assert stats['filename'] == 'test_rtt.bin'
+    assert stats['status'] == 'complete'
+    assert stats['retransmits'] == 0
+    assert stats['srtt_ms'] is not None and stats['srtt_ms'] < 1000
+    assert stats['rto_ms'] < 1000
+
+
+def test_duplicate_rrq_reuses_session():
+    """A resent RRQ from the same client does not start a second transfer"""
+    server = _make_server()
+    _make_server_file(server, 'test_duplicate.bin', 512 * 4 + 9)
+    engine, port = start_engine(server)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    client.settimeout(0.3)
+    try:
+        for _ in range(3):
+            client.sendto(_build_rrq('test_duplicate.bin'), ('127.0.0.1', port))
+
+        # Only one transfer TID answers
+        server_ports = set()
+        try:
+            while True:
+                packet, addr = client.recvfrom(1024)
+                server_ports.add(addr[1])
+        except socket.timeout:
+            pass
+        assert len(server_ports) == 1
+        assert engine.get_stats()['duplicate_rrqs'] == 2
+
+        # Duplicate ACKs are ignored rather than answered with a resend
+        transfer_addr = ('127.0.0.1', server_ports.pop())
+        client.sendto(struct.pack('>HH', 4, 1), transfer_addr)
+        client.sendto(struct.pack('>HH', 4, 1), transfer_addr)
+        blocks = []
+        try:
+            while True:
+                packet, _ = client.recvfrom(1024)
+                blocks.append(struct.unpack('>H', packet[2:4])[0])
+        except socket.timeout:
+            pass
+        assert blocks == [2]
+        assert engine.get_stats()['duplicate_acks'] == 1
+    finally:
+        client.close()
+        engine.stop()
+
+
+def test_idle_session_expires():
+    """Sessions whose client went silent are dropped from the table"""
+    server = _make_server()
+    _make_server_file(server, 'test_idle.bin', 512 * 4)
+    engine, port = start_engine(server)
+    engine.idle_timeout = 0.2
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    try:
+        client.sendto(_build_rrq('test_idle.bin'), ('127.0.0.1', port))
+        for _ in range(100):
+            if engine.get_stats()['sessions_expired']:
+                break
+            time.sleep(0.02)
+    finally:
+        client.close()
+        engine.stop()
+
+    stats = engine.get_stats()
+    assert stats['sessions_expired'] == 1
+    assert stats['active_transfers'] == 0
+    assert not engine.clients
+
+
+def test_silent_client_is_retried_then_dropped():
+    """An unanswered DATA is resent from the timer heap until the retries run out"""
+    server = _make_server()
+    _make_server_file(server, 'test_retry.bin', 512 * 4)
+    engine, port = start_engine(server)
+    engine.retries = 2
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(('127.0.0.1', 0))
+    client.settimeout(5.0)
+    try:
+        client.sendto(_build_rrq('test_retry.bin'), ('127.0.0.1', port))
+        # The first DATA plus a resend per expired timer, never acknowledged
+        blocks = [struct.unpack('>HH', client.recvfrom(1024)[0][:4]) for _ in range(2)]
+        for _ in range(100):
+            if engine.get_stats()['transfers_aborted']:
+                break
+            time.sleep(0.05)
+    finally:
+        client.close()
+        engine.stop()
+
+    assert blocks == [(3, 1)] * 2
+    assert engine.get_stats()['transfers_aborted'] == 1
+    assert engine.get_transfer_stats()[0]['status'] == 'aborted'
+    # What is left on the heap belongs to the closed session and is never acted on
+    assert not any(engine._timer_is_current(entry) for entry in engine.timers)
+
+
+def test_multicast_group_shares_one_stream():
+    """RFC 2090 clients share one data stream; a late joiner catches up"""
+    server = _make_server()
+    server.config['tftp_multicast'] = True
+    payload = _make_server_file(server, 'test_multicast.bin', 512 * 200 + 77)
+    engine, port = start_engine(server)
+    results = {}
+    joined = threading.Event()
+    paused = threading.Event()
+    resume = threading.Event()
+
+    def client(name, **kwargs):
+        results[name] = tftp_multicast_download(port, 'test_multicast.bin', **kwargs)
+
+    # The master pauses half way until a late listener has joined
+    threads = [threading.Thread(target=client, args=('master',),
+                                kwargs={'resume': resume, 'pause_at': 100, 'paused': paused})]
+    try:
+        threads[0].start()
+        assert paused.wait(5.0)
+        threads.append(threading.Thread(target=client, args=('listener',), kwargs={'joined': joined}))
+        threads[1].start()
+        assert joined.wait(5.0)
+        resume.set()
+        for thread in threads:
+            thread.join(timeout=10)
+        for _ in range(50):
+            if engine.get_stats()['transfers_completed'] == 2 and not engine.groups:
+                break
+            time.sleep(0.02)
+    finally:
+        engine.stop()
+
+    assert results == {'master': payload, 'listener': payload}
+    stats = engine.get_stats()
+    assert stats['transfers_completed'] == 2
+    assert not engine.groups and not engine.clients
+
+    group = engine.get_transfer_stats()[-1]
+    assert group['client'].startswith('239.255.69.1:')
+    # Blocks after the join went out once; only the missed ones were resent
+    assert 0 < group['retransmits'] < group['total_blocks']
+
+
+def test_scheduler_shares_by_weight():
+    """Deficit round robin gives each transfer packets in proportion to its weight"""
+    class Client:
+        def __init__(self, ip):
+            self.addr = (ip, 2000)
+            self.remaining = 8
+
+    slow, fast = Client('10.0.0.1'), Client('10.0.0.2')
+    scheduler = FairScheduler(weights={'10.0.0.2': 3})
+    order = []
+
+    def send(session, budget):
+        sent = 0
+        while session.remaining and sent + 1472 <= budget:
+            session.remaining -= 1
+            sent += 1472
+            order.append(session.addr[0][-1])
+        return sent, session.remaining > 0
+
+    scheduler.add(slow)
+    scheduler.add(fast)
+    scheduler.service(send)
+
+    assert ''.join(order[:8]) == '12221222'
+    assert not scheduler.active
+
+
+def test_throttled_scheduler_waits_for_next_packet():
+    """With the bucket short of a whole packet the engine sleeps instead of spinning"""
+    class Client:
+        addr = ('10.0.0.1', 2000)
+
+    scheduler = FairScheduler(rate=100000, packet_size=lambda session: 8196)
+    scheduler.add(Client())
+    # More than a quantum but less than one 8192-byte block
+    scheduler.tokens = 2000
+    assert abs(scheduler.next_wakeup() - 0.06196) < 1e-9
+
+
+def test_throttled_transfer_banks_no_credit():
+    """Turns blocked by the token bucket earn nothing, so the limit lifting is no burst"""
+    class Client:
+        addr = ('10.0.0.1', 2000)
+
+    scheduler = FairScheduler(rate=1000)
+    client = Client()
+    scheduler.add(client)
+    budgets = []
+
+    def send(session, budget):
+        budgets.append(budget)
+        return 0, True
+
+    scheduler.tokens = 0
+    for _ in range(100):
+        scheduler.updated = time.monotonic()
+        scheduler.service(send)
+    assert not budgets and scheduler.deficit[client] == 0
+
+    def drain(session, budget):
+        budgets.append(budget)
+        return budget, False
+
+    # Once tokens are back the first turn gets one quantum, not 100 of them
+    scheduler.tokens = scheduler.burst
+    scheduler.service(drain)
+    assert budgets == [1472]
+
+
+def test_scheduler_rejects_non_positive_weights():
+    """A zero or negative share would leave its transfer queued forever"""
+    for weight in (0, -1):
+        try:
+            FairScheduler(weights={'10.0.0.1': weight})
+        except ValueError:
+            continue
+        raise AssertionError(f"weight {weight} was accepted")
+    server = _make_server()
+    server.config['tftp_client_weights'] = {'10.0.0.1': 0}
+    listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        TFTPEngine.from_config(listen, [server.tftp_dir], server.config)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("engine started with a zero weight")
+    finally:
+        listen.close()
+
+
+def test_rate_limit_paces_transfers():
+    """The global token bucket holds the engine to the configured rate"""
+    server = _make_server()
+    server.config['tftp_rate_limit_kb'] = 1024
+    payload = _make_server_file(server, 'test_rate.bin', 1024 * 320)
+    engine, port = start_engine(server)
+    try:
+        started = time.time()
+        data, _, _ = tftp_download(port, 'test_rate.bin', {'blksize': 1024, 'windowsize': 16})
+        elapsed = time.time() - started
+    finally:
+        engine.stop()
+
+    assert data == payload
+    # 320 KiB at 1 MiB/s, less the initial burst allowance
+    assert elapsed >= 0.15
+    assert engine.get_stats()['scheduler']['throttled'] > 0
+
+
+def test_admission_queue_and_busy_error():
+    """Requests beyond the transfer limit wait in the queue, then get 'busy'"""
+    server = _make_server()
+    server.config['tftp_max_transfers'] = 1
+    server.config['tftp_max_queued'] = 1
+    _make_server_file(server, 'test_admission.bin', 512 * 4)
+    engine, port = start_engine(server)
+    clients = []
+    for _ in range(3):
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.bind(('127.0.0.1', 0))
+        client.settimeout(2.0)
+        clients.append(client)
+    running, queued, rejected = clients
+
+    try:
+        running.sendto(_build_rrq('test_admission.bin'), ('127.0.0.1', port))
+        packet, transfer_addr = running.recvfrom(1024)
+        assert struct.unpack('>H', packet[:2])[0] == 3
+
+        queued.sendto(_build_rrq('test_admission.bin'), ('127.0.0.1', port))
+        rejected.sendto(_build_rrq('test_admission.bin'), ('127.0.0.1', port))
+        packet, _ = rejected.recvfrom(1024)
+        assert struct.unpack('>H', packet[:2])[0] == 5
+        assert b'busy' in packet
+        stats = engine.get_stats()
+        assert stats['queue_depth'] == 1
+        assert stats['requests_rejected'] == 1
+
+        # Ending the running transfer admits the queued request
+        running.sendto(struct.pack('>HH', 5, 0) + b'cancel\x00', transfer_addr)
+        packet, _ = queued.recvfrom(1024)
+        assert struct.unpack('>HH', packet[:4]) == (3, 1)
+        assert engine.get_stats()['queue_depth'] == 0
+    finally:
+        for client in clients:
+            client.close()
+        engine.stop()
+
+
+def test_failed_queued_request_gets_error_and_queue_moves_on():
+    """A queued request that cannot be started is refused; the next one still runs"""
+    server = _make_server()
+    server.config['tftp_max_transfers'] = 1
+    server.config['tftp_max_queued'] = 2
+    _make_server_file(server, 'test_admit_error.bin', 512 * 4)
+    engine, port = start_engine(server)
+    clients = []
+    for _ in range(3):
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.bind(('127.0.0.1', 0))
+        client.settimeout(2.0)
+        clients.append(client)
+    running, broken, waiting = clients
+
+    # Requests carrying x-fail blow up while their transfer is being set up
+    negotiate_options = engine_module.negotiate_options
+
+    def failing_negotiate(options, *args):
+        if 'x-fail' in options:
+            raise RuntimeError("negotiation failed")
+        return negotiate_options(options, *args)
+
+    engine_module.negotiate_options = failing_negotiate
+    try:
+        running.sendto(_build_rrq('test_admit_error.bin'), ('127.0.0.1', port))
+        packet, transfer_addr = running.recvfrom(1024)
+        broken.sendto(_build_rrq('test_admit_error.bin', {'x-fail': 1}), ('127.0.0.1', port))
+        waiting.sendto(_build_rrq('test_admit_error.bin'), ('127.0.0.1', port))
+        for _ in range(50):
+            if engine.get_stats()['queue_depth'] == 2:
+                break
+            time.sleep(0.02)
+
+        running.sendto(struct.pack('>HH', 5, 0) + b'cancel\x00', transfer_addr)
+        packet, _ = broken.recvfrom(1024)
+        assert struct.unpack('>H', packet[:2])[0] == 5 and b'negotiation failed' in packet
+        packet, _ = waiting.recvfrom(1024)
+        assert struct.unpack('>HH', packet[:4]) == (3, 1)
+    finally:
+        engine_module.negotiate_options = negotiate_options
+        for client in clients:
+            client.close()
+        engine.stop()
+
+
+def test_file_index_answers_lookups_from_memory():
+    """Hits and misses come from the index; new files appear after a refresh"""
+    root = tempfile.mkdtemp()
+    extra = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, 'pxelinux.cfg'))
+        with open(os.path.join(root, 'pxelinux.cfg', 'default'), 'w') as f:
+            f.write('DEFAULT arch\n')
+        with open(os.path.join(extra, 'vmlinuz'), 'wb') as f:
+            f.write(b'kernel')
+
+        index = FileIndex([root, extra], refresh_interval=3600)
+        assert index.lookup('pxelinux.cfg/default') == os.path.join(os.path.realpath(root), 'pxelinux.cfg', 'default')
+        assert index.lookup('/vmlinuz') == os.path.join(os.path.realpath(extra), 'vmlinuz')
+        for probe in ('pxelinux.cfg/01-52-54-00-12-34-56', 'pxelinux.cfg/C0A801', '../etc/passwd'):
+            assert index.lookup(probe) is None
+
+        # Misses are not rechecked on disk until the next refresh
+        with open(os.path.join(root, 'pxelinux.cfg', 'C0A801'), 'w') as f:
+            f.write('DEFAULT arch\n')
+        assert index.lookup('pxelinux.cfg/C0A801') is None
+        index.refresh_interval = 0
+        assert index.lookup('pxelinux.cfg/C0A801') is not None
+
+        stats = index.get_stats()
+        assert stats['hits'] == 3
+        assert stats['misses'] == 4
+        assert stats['rebuilds'] == 2
+    finally:
+        shutil.rmtree(root)
+        shutil.rmtree(extra)
+
+
+def test_engine_from_config_calls_hooks():
+    """Any server can build the shared engine from its config and hook into it"""
+    root = tempfile.mkdtemp()
+    payload = os.urandom(512 * 3 + 1)
+    with open(os.path.join(root, 'hooked.bin'), 'wb') as f:
+        f.write(payload)
+
+    events = []
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    engine = TFTPEngine.from_config(listen_socket, [root], {'tftp_max_transfers': 4}, hooks={
+        'request': lambda filename, addr, options: events.append(('request', filename)),
+        'complete': lambda stats: events.append(('complete', stats['filename'])),
+        'abort': lambda stats, reason: events.append(('abort', reason))
+    })
+    threading.Thread(target=engine.run, daemon=True).start()
+    try:
+        data, _, _ = tftp_download(listen_socket.getsockname()[1], 'hooked.bin')
+        for _ in range(50):
+            if len(events) == 2:
+                break
+            time.sleep(0.02)
+    finally:
+        engine.stop()
+        shutil.rmtree(root)
+
+    assert data == payload
+    assert engine.max_transfers == 4
+    assert events == [('request', 'hooked.bin'), ('complete', 'hooked.bin')]
+
+
+def test_prewarm_loads_menu_assets():
+    """Kernels and initrds named in the boot menus are cached before any request"""
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, 'pxelinux.cfg'))
+        os.makedirs(os.path.join(root, 'arch'))
+        with open(os.path.join(root, 'pxelinux.cfg', 'default'), 'w') as f:
+            f.write("DEFAULT arch\nUI menu.c32\nLABEL arch\n"
+                    "    KERNEL arch/vmlinuz-linux\n"
+                    "    APPEND initrd=arch/intel-ucode.img,arch/initramfs-linux.img ip=dhcp\n"
+                    "LABEL memtest\n    KERNEL memtest86+.bin\n")
+        with open(os.path.join(root, 'ipxe.cfg'), 'w') as f:
+            f.write("#!ipxe\nkernel http://192.168.1.100:8080/arch/vmlinuz-linux ip=dhcp\n"
+                    "initrd http://192.168.1.100:8080/arch/initramfs-linux.img\nboot\n")
+        for name in ('arch/vmlinuz-linux', 'arch/initramfs-linux.img', 'arch/intel-ucode.img', 'menu.c32'):
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(os.urandom(4096))
+
+        with open(os.path.join(root, 'ipxe.cfg')) as f:
+            assert find_menu_references(f.read()) == ['/arch/vmlinuz-linux', '/arch/initramfs-linux.img']
+
+        cache = AssetCache(max_bytes=1024 * 1024)
+        index = FileIndex([root])
+        summary = prewarm(index, cache)
+        # Two menus plus four referenced files; memtest86+.bin does not exist
+        assert summary['files'] == 6
+        # Only client requests show up in the index stats
+        assert index.get_stats()['hits'] == 0 and index.get_stats()['misses'] == 0
+        assert cache.get_stats()['entries'] == 6
+
+        cache.release(cache.open(os.path.join(os.path.realpath(root), 'arch', 'vmlinuz-linux')))
+        assert cache.get_stats()['hits'] == 1
+    finally:
+        shutil.rmtree(root)
+
+
+def test_long_option_rrq_is_not_truncated():
+    """An RRQ longer than 516 bytes still has its trailing options honoured"""
+    server = _make_server()
+    payload = _make_server_file(server, 'test_long_rrq.bin', 3000)
+    # Unknown options ahead of blksize push it past the old 516-byte read
+    options = {f'x-vendor-{i}': 'v' * 40 for i in range(12)}
+    options['blksize'] = 1024
+    assert len(_build_rrq('test_long_rrq.bin', options)) > 516
+
+    engine, port = start_engine(server)
+    try:
+        data, oack, blocks = tftp_download(port, 'test_long_rrq.bin', options)
+    finally:
+        engine.stop()
+
+    assert data == payload
+    assert oack == {'blksize': '1024'}
+
+
+def test_missing_file_and_path_escape():
+    """Unknown names and paths outside the root get a file-not-found error"""
+    server = _make_server()
+    engine, port = start_engine(server)
+    try:
+        for name in ('no_such_file.bin', '../logs/pxe_server.log'):
+            try:
+                tftp_download(port, name)
+                assert False, f"{name} should not be served"
+            except IOError as e:
+                assert 'File not found' in str(e)
+    finally:
+        engine.stop()
+
+
+def main():
+    """Main test function"""
+    print("Termux PXE Boot TFTP Server - Test Suite")
+    print("=" * 50)
+
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+        finally:
+            teardown_function(test)
+
+    print("=" * 50)
+    if failed:
+        print(f"❌ {failed} of {len(tests)} tests FAILED")
+        sys.exit(1)
+    print(f"✅ All {len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
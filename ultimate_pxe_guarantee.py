@@ -7,7 +7,6 @@ Handles EVERY possible scenario and user situation
 import os
 import sys
 import socket
-import struct
 import subprocess
 import threading
 import time
@@ -18,6 +17,9 @@ from pathlib import Path
 from datetime import datetime
 import traceback
 
+from pxe.tftp import TFTPEngine
+from pxe.dhcp import reply_buffer
+
 class UltimatePXEGuarantee:
     def __init__(self):
         self.is_running = False
@@ -27,6 +29,7 @@ class UltimatePXEGuarantee:
         self.current_method = None
         self.server_socket = None
         self.tftp_socket = None
+        self.tftp_engine = None
         self.perfect_mode = True  # 100% success mode
         
     def log(self, message, level="INFO"):
@@ -545,10 +548,12 @@ LABEL network
                 self.log(f"❌ TFTP bind error: {e}", "ERROR")
                 return False
             
-            self.tftp_socket.settimeout(1.0)
-            
-            # Start TFTP processing thread
-            tftp_thread = threading.Thread(target=self.perfect_tftp_handler, daemon=True)
+            # Shared TFTP engine: every transfer runs on its event loop thread
+            boot_dir = Path.home() / '.ultimate_pxe' / 'tftp'
+            self.tftp_engine = TFTPEngine.from_config(
+                self.tftp_socket, [str(boot_dir)], {}, log=self.log,
+                hooks={'complete': self.perfect_tftp_complete, 'abort': self.perfect_tftp_abort})
+            tftp_thread = threading.Thread(target=self.tftp_engine.run, daemon=True)
             tftp_thread.start()
             
             self.log("✅ Perfect TFTP server running", "SUCCESS")
@@ -594,91 +599,39 @@ LABEL network
             self.log(f"❌ DHCP request handling error: {e}", "ERROR")
     
     def create_perfect_dhcp_offer(self, request_data, addr, mac, xid):
-        """Create perfect DHCP offer with no errors"""
+        """Create perfect DHCP offer with no errors (valid until the next offer)"""
         try:
-            # Build perfect DHCP offer packet
-            packet = bytearray(576)
-            
-            # DHCP header
-            packet[0] = 2  # BOOTREPLY
-            packet[1] = 1  # Hardware type: Ethernet
-            packet[2] = 6  # Hardware address length
-            packet[3] = 0  # Hops
-            
-            # Transaction ID
-            packet[4:8] = xid
-            
-            # Seconds, flags
-            packet[8:12] = b'\x00\x00\x00\x00'
-            
-            # Client IP (0.0.0.0)
-            packet[12:16] = b'\x00\x00\x00\x00'
-            
-            # Your IP (offered IP)
+            # Build perfect DHCP offer packet in the reusable reply buffer
             offered_ip = self.get_offered_ip(addr[0])
-            packet[16:20] = socket.inet_aton(offered_ip)
-            
-            # Server IP
-            packet[20:24] = socket.inet_aton(self.server_ip)
-            
-            # Gateway IP
-            packet[24:28] = socket.inet_aton(self.server_ip)
-            
-            # Client MAC address
-            packet[28:34] = bytes.fromhex(mac.replace(':', ''))
-            
-            # Magic cookie
-            packet[236:240] = b'\x63\x82\x53\x63'
-            
-            # Boot filename at fixed position
+            server_ip = socket.inet_aton(self.server_ip)
             boot_file = b'pxelinux.0'
-            packet[108:108+len(boot_file)] = boot_file
-            
-            # DHCP options
-            offset = 240
-            
+
+            # Header: xid, offered IP, server and gateway IP, client MAC, boot filename
+            reply = reply_buffer().begin(
+                xid, bytes.fromhex(mac.replace(':', '')),
+                yiaddr=socket.inet_aton(offered_ip), siaddr=server_ip, giaddr=server_ip,
+                file=boot_file)
+
             # Option 53: Message type (DHCP OFFER)
-            packet[offset:offset+3] = b'\x35\x01\x02'
-            offset += 3
-            
+            reply.option_byte(53, 2)
             # Option 54: Server identifier
-            packet[offset:offset+6] = b'\x36\x04' + socket.inet_aton(self.server_ip)
-            offset += 6
-            
+            reply.option(54, server_ip)
             # Option 51: Lease time
-            packet[offset:offset+6] = b'\x33\x04' + struct.pack('>I', self.dhcp_options['lease_time'])
-            offset += 6
-            
+            reply.option_u32(51, self.dhcp_options['lease_time'])
             # Option 1: Subnet mask
-            packet[offset:offset+6] = b'\x01\x04' + socket.inet_aton(self.dhcp_options['subnet_mask'])
-            offset += 6
-            
+            reply.option(1, socket.inet_aton(self.dhcp_options['subnet_mask']))
             # Option 3: Router
-            packet[offset:offset+6] = b'\x03\x04' + socket.inet_aton(self.dhcp_options['gateway'])
-            offset += 6
-            
+            reply.option(3, socket.inet_aton(self.dhcp_options['gateway']))
             # Option 6: DNS server
-            packet[offset:offset+6] = b'\x06\x04' + socket.inet_aton(self.dhcp_options['dns_server'])
-            offset += 6
-            
+            reply.option(6, socket.inet_aton(self.dhcp_options['dns_server']))
             # Option 66: TFTP Server Name
-            server_name = self.server_ip.encode()
-            packet[offset:offset+2+len(server_name)] = b'\x42' + bytes([len(server_name)]) + server_name
-            offset += 2 + len(server_name)
-            
+            reply.option(66, self.server_ip.encode())
             # Option 67: Bootfile Name (CRITICAL - Fixes E53)
-            packet[offset:offset+2+len(boot_file)] = b'\x43' + bytes([len(boot_file)]) + boot_file
-            offset += 2 + len(boot_file)
-            
+            reply.option(67, boot_file)
             # Option 60: Vendor Class Identifier
-            vendor_class = b'PXEClient'
-            packet[offset:offset+3+len(vendor_class)] = b'\x3c' + bytes([len(vendor_class)]) + vendor_class
-            offset += 3 + len(vendor_class)
-            
-            # End option
-            packet[offset] = 0xff
-            
-            return bytes(packet[:offset+1])
+            reply.option(60, b'PXEClient')
+
+            return reply.finish()
             
         except Exception as e:
             self.log(f"❌ DHCP offer creation error: {e}", "ERROR")
@@ -694,101 +647,13 @@ LABEL network
         except:
             return "192.168.1.150"
     
-    def perfect_tftp_handler(self):
-        """Perfect TFTP request handler"""
-        while self.is_running:
-            try:
-                data, addr = self.tftp_socket.recvfrom(516)
-                
-                if len(data) >= 4:
-                    opcode = struct.unpack('>H', data[0:2])[0]
-                    
-                    if opcode == 1:  # RRQ (Read Request)
-                        self.handle_perfect_tftp_request(data, addr)
-                    
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.is_running:
-                    self.log(f"❌ TFTP handler error: {e}", "ERROR")
+    def perfect_tftp_complete(self, stats):
+        """TFTP engine hook: a transfer finished"""
+        self.log(f"✅ Perfect TFTP Transfer: {stats['filename']} to {stats['client']}", "SUCCESS")
     
-    def handle_perfect_tftp_request(self, data, addr):
-        """Handle TFTP request with perfect accuracy"""
-        try:
-            filename_end = data.index(b'\x00', 2)
-            filename = data[2:filename_end].decode('utf-8', errors='ignore')
-            
-            self.log(f"📂 Perfect TFTP Request: {filename} from {addr[0]}", "INFO")
-            
-            # Send file
-            if self.send_perfect_tftp_file(filename, addr):
-                self.log(f"✅ Perfect TFTP Transfer: {filename}", "SUCCESS")
-            else:
-                self.log(f"❌ Perfect TFTP Transfer failed: {filename}", "ERROR")
-                
-        except Exception as e:
-            self.log(f"❌ TFTP request handling error: {e}", "ERROR")
-    
-    def send_perfect_tftp_file(self, filename, addr):
-        """Send file via TFTP with perfect accuracy"""
-        try:
-            boot_dir = Path.home() / '.ultimate_pxe' / 'tftp'
-            file_path = boot_dir / filename
-            
-            if not file_path.exists():
-                self.log(f"❌ File not found: {filename}", "ERROR")
-                return False
-            
-            # Read file
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            # Create transfer socket
-            transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            transfer_socket.settimeout(5.0)
-            
-            # Send file in blocks
-            block_size = 512
-            block_num = 1
-            offset = 0
-            
-            while offset < len(file_data):
-                block_data = file_data[offset:offset + block_size]
-                
-                # Create data packet
-                data_packet = struct.pack('>H', 3) + struct.pack('>H', block_num) + block_data
-                
-                # Send with retry
-                max_retries = 3
-                for retry in range(max_retries):
-                    try:
-                        transfer_socket.sendto(data_packet, addr)
-                        
-                        # Wait for ACK
-                        ack_data, _ = transfer_socket.recvfrom(4)
-                        ack_opcode = struct.unpack('>H', ack_data[0:2])[0]
-                        ack_block = struct.unpack('>H', ack_data[2:4])[0]
-                        
-                        if ack_opcode == 4 and ack_block == block_num:
-                            break
-                    except socket.timeout:
-                        if retry == max_retries - 1:
-                            self.log(f"❌ TFTP timeout on block {block_num}", "ERROR")
-                            return False
-                
-                offset += block_size
-                block_num += 1
-                
-                # Last block
-                if len(block_data) < block_size:
-                    break
-            
-            transfer_socket.close()
-            return True
-            
-        except Exception as e:
-            self.log(f"❌ TFTP file send error: {e}", "ERROR")
-            return False
+    def perfect_tftp_abort(self, stats, reason):
+        """TFTP engine hook: a transfer was given up"""
+        self.log(f"❌ Perfect TFTP Transfer failed: {stats['filename']} ({reason})", "ERROR")
     
     def run_perfect_operation(self):
         """Run perfect operation with perfect monitoring"""
@@ -856,6 +721,8 @@ LABEL network
         try:
             if self.dhcp_socket:
                 self.dhcp_socket.close()
+            if self.tftp_engine:
+                self.tftp_engine.stop()
             if self.tftp_socket:
                 self.tftp_socket.close()
             